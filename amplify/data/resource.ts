@@ -233,29 +233,71 @@ const schema = a.schema({
   getAnalytics: a.query().arguments({
     projectId: a.id().required(),
     viewId: a.id().required(),
+    // "rows" (default) or "columnar": tables as data_columns instead of data_rows; "artifacts": data overview
+    // tables written to one .npz artifact in storage and returned as references (no long format, see artifacts.py)
+    responseEncoding: a.string(),
+    // Optional subset of outputs ("data_overview", "krippendorff_alpha", ...); only the needed stages run.
+    // "temporal" and "consensus" are computed only when listed
+    sections: a.string().array(),
+    // Optional run names limiting per-run gold evaluations and pairwise crosstabs
+    runs: a.string().array(),
+    // "auto" (default), "dense" or "sparse": confusion tables as L x L matrices or as their nonzero cells plus
+    // per-label metrics tables; "auto" is sparse above ANALYTICS_DENSE_CONFUSION_MAX_LABELS labels (default 50)
+    confusionFormat: a.string(),
+    // Number of most frequent confusions reported per evaluation with sparse confusion output (default 10)
+    topConfusions: a.integer(),
+    // "first" (default), "last" or "abstain": majority decision of tied votes (first/last label in sort order, or none)
+    majorityTieBreak: a.string(),
+    // Agreement over time: as-of timestamps (ISO 8601), or a bucket width such as "1D" or "6h" for fixed buckets
+    asOf: a.string().array(),
+    timeBucket: a.string(),
+    // Keep per-view statistics in the warm function and apply only results newer than the last call
+    incremental: a.boolean(),
+    // Adds per-stage timings and input dimensions as the profile section (bypasses the result cache)
+    profile: a.boolean(),
   }).returns(a.ref("LambdaAnalyticsOutput")).handler([a.handler.function(evaluationWrangler), a.handler.function(getAnalytics)]).authorization((allow) => [allow.authenticated()]),
 
   DataRow: a.customType({
     values: a.string().array().required()
   }),
 
+  // Columnar cells: plain values, or dictionary + codes (-1 = null) for string columns
+  DataColumn: a.customType({
+    values: a.string().array(),
+    dictionary: a.string().array(),
+    codes: a.integer().array()
+  }),
+
+  // Table cells stored in an artifact (responseEncoding "artifacts"): file key, format and table name in it
+  TableArtifact: a.customType({
+    key: a.string().required(),
+    format: a.string(),
+    table: a.string(),
+    rows: a.integer()
+  }),
+
   DataFrameStructured: a.customType({
     columns: a.string().array().required(),
     index: a.string().array().required(),
-    data_rows: a.ref("DataRow").array().required()
+    data_rows: a.ref("DataRow").array().required(),
+    data_columns: a.ref("DataColumn").array(),
+    artifact: a.ref("TableArtifact")
   }),
 
   SeriesStructured: a.customType({
     name: a.string(),
     index: a.string().array().required(),
-    data: a.string().array().required()
+    data: a.string().array().required(),
+    artifact: a.ref("TableArtifact")
   }),
 
   PairwiseRunContingencyEntry: a.customType({
     compared_runs: a.string().required(),
     run_1_name: a.string().required(),
     run_2_name: a.string().required(),
-    contingency_matrix: a.ref("DataFrameStructured")
+    contingency_matrix: a.ref("DataFrameStructured"),
+    // Nonzero cells (run 1 label, run 2 label, Count) in place of contingency_matrix with sparse confusion output
+    contingency_triples: a.ref("DataFrameStructured")
   }),
 
   DataOverview: a.customType({
@@ -263,6 +305,7 @@ const schema = a.schema({
     annotations_long_format: a.ref("DataFrameStructured"),
     inter_coder_contingency_matrix: a.ref("DataFrameStructured"),
     majority_decision_annotations: a.ref("SeriesStructured"),
+    majority_decision_confidence: a.ref("DataFrameStructured"),
     gold_standard_labels: a.ref("DataFrameStructured"),
     combined_comparison_table: a.ref("DataFrameStructured"),
     pairwise_run_contingency_matrices: a.ref("PairwiseRunContingencyEntry").array()
@@ -294,7 +337,11 @@ const schema = a.schema({
     metrics_summary: a.ref("DataFrameStructured").required(),
     per_class_metrics: a.ref("PerClassPerformanceEntry").array().required(),
     confusion_matrix: a.ref("DataFrameStructured").required(),
-    log_messages: a.string().array().required()
+    log_messages: a.string().array().required(),
+    // Sparse confusion output only (per_class_metrics and confusion_matrix are then empty)
+    per_class_metrics_table: a.ref("DataFrameStructured"),
+    confusion_triples: a.ref("DataFrameStructured"),
+    top_confusions: a.ref("DataFrameStructured")
   }),
 
   AnnotationRunEvaluationResult: a.customType({
@@ -302,18 +349,57 @@ const schema = a.schema({
     metrics_summary: a.ref("DataFrameStructured").required(),
     per_class_metrics: a.ref("PerClassPerformanceEntry").array().required(),
     confusion_matrix: a.ref("DataFrameStructured").required(),
-    log_messages: a.string().array().required()
+    log_messages: a.string().array().required(),
+    // Sparse confusion output only (per_class_metrics and confusion_matrix are then empty)
+    per_class_metrics_table: a.ref("DataFrameStructured"),
+    confusion_triples: a.ref("DataFrameStructured"),
+    top_confusions: a.ref("DataFrameStructured")
+  }),
+
+  // One row per as-of checkpoint: annotations, Krippendorff alpha, pairwise kappa and accuracy against gold
+  TemporalAnalysis: a.customType({
+    agreement_over_time: a.ref("DataFrameStructured")
   }),
 
   ModelEvaluations: a.customType({
     majority_decision_vs_gold_standard: a.ref("SingleModelEvaluationResult"),
-    annotation_runs_vs_gold_standard: a.ref("AnnotationRunEvaluationResult").array()
+    annotation_runs_vs_gold_standard: a.ref("AnnotationRunEvaluationResult").array(),
+    // Each run against the majority decision of the other runs (sections "consensus"; not computed by default)
+    annotation_runs_vs_consensus: a.ref("AnnotationRunEvaluationResult").array()
+  }),
+
+  // One profiling span: wall/CPU seconds, peak RSS growth and tracemalloc peak (null unless tracing)
+  ProfileSpan: a.customType({
+    name: a.string().required(),
+    depth: a.integer().required(),
+    output: a.string(),
+    wall_s: a.float(),
+    cpu_s: a.float(),
+    rss_peak_delta_kb: a.integer(),
+    tracemalloc_peak_kb: a.integer()
+  }),
+
+  ProfileDimensions: a.customType({
+    files: a.integer(),
+    runs: a.integer(),
+    run_columns: a.integer(),
+    labels: a.integer(),
+    annotations: a.integer(),
+    results: a.integer(),
+    code_storage: a.string()
+  }),
+
+  AnalyticsProfile: a.customType({
+    spans: a.ref("ProfileSpan").array(),
+    dimensions: a.ref("ProfileDimensions")
   }),
 
   LambdaAnalyticsOutput: a.customType({
     data_overview: a.ref("DataOverview"),
     inter_rater_reliability: a.ref("InterRaterReliability"),
     model_evaluations: a.ref("ModelEvaluations"),
+    temporal: a.ref("TemporalAnalysis"),
+    profile: a.ref("AnalyticsProfile"),
     logs: a.string().array().required()
   })
 
@@ -0,0 +1,277 @@
+"""
+Annotation table (Python)
+ - Integer-coded latest label per file and run, plus gold labels, over one shared label vocabulary
+ - Built once per analysis; every stage works on the codes
+ - String DataFrames are only materialized for the response (to_*_frame); pandas is imported there only
+ - Codes are stored dense (files x run columns) or, for views where runs annotate small subsets, as
+   SparseCodes; plan_code_storage picks by fill ratio (ANALYTICS_CODE_STORAGE forces 'dense' or 'sparse',
+   ANALYTICS_SPARSE_MAX_FILL sets the threshold)
+"""
+from __future__ import annotations
+import logging
+import os
+from dataclasses import dataclass
+from functools import cached_property
+from typing import TYPE_CHECKING
+import numpy as np
+from fklearn import encode_labels, factorize, index_of, is_missing_value, PairwiseContingency, SparseCodes
+from parallel import analysis_executor
+from profiling import record_dimensions, span
+from view_input import DecodedView, decode_view
+if TYPE_CHECKING:
+    import pandas as pd
+
+MISSING_FILE_NAME = "N/A - Not in main files list"
+CODE_STORAGE_ENV = "ANALYTICS_CODE_STORAGE"
+SPARSE_MAX_FILL_ENV = "ANALYTICS_SPARSE_MAX_FILL"
+CODE_STORAGES = ('auto', 'dense', 'sparse')
+# Fill ratio (annotations / (files x run columns)) up to which the sparse layout is used (see benchmarks/bench_pipeline.py).
+DEFAULT_SPARSE_MAX_FILL = 0.25
+
+def run_column_name(run_name: str) -> str:
+    """Wide-table column for a run: 'label_' + run name with spaces and dashes as underscores."""
+    return f'label_{run_name.replace(" ", "_").replace("-", "_")}'
+
+def coder_name(run_column: str) -> str:
+    """Coder name used by the long format and inter-coder matrix for a wide-table column."""
+    return run_column.replace('label_', '').replace('_', ' ')
+
+def run_column_positions(run_names: list, run_columns: list) -> np.ndarray:
+    """Run column position per run code. Runs whose names collide after sanitizing share a column; the last
+    one (input order) fills it and the others get -1."""
+    source_run_by_column = {run_column_name(run_name): run_code for run_code, run_name in enumerate(run_names)}
+    column_by_run = np.full(len(run_names), -1, dtype=np.intp)
+    for column_position, col in enumerate(run_columns):
+        column_by_run[source_run_by_column[col]] = column_position
+    return column_by_run
+
+def select_latest_annotations(columns: dict) -> dict:
+    """Keeps the latest annotation per (run, file) with one sort and a group-boundary dedupe.
+    Ties on createdAt keep the first result; for repeated run names the later classification wins.
+    """
+    n_results = len(columns['file_id'])
+    if n_results == 0: return columns
+    file_codes, _ = factorize(columns['file_id'])
+    ts_ranks, _ = factorize(columns['created_at'], sort=True)
+    # lexsort: last key is primary; within a (run, file) group the winner sorts last.
+    order = np.lexsort((-np.arange(n_results), ts_ranks, columns['classification'], file_codes, columns['run']))
+    group_keys = columns['run'][order] * (file_codes.max() + 1) + file_codes[order]
+    is_group_end = np.append(group_keys[1:] != group_keys[:-1], True)
+    latest_idx = order[is_group_end]
+    return {name: values[latest_idx] for name, values in columns.items()}
+
+def plan_code_storage(n_files: int, n_columns: int, n_annotations: int, storage: str = None) -> str:
+    """'dense' or 'sparse' layout for a files x run columns code matrix holding n_annotations codes.
+    storage (default: ANALYTICS_CODE_STORAGE, else 'auto') forces a layout; 'auto' goes sparse when the fill
+    ratio is at most ANALYTICS_SPARSE_MAX_FILL.
+    """
+    storage = storage or os.environ.get(CODE_STORAGE_ENV) or 'auto'
+    if storage not in CODE_STORAGES:
+        logging.warning(f"Unknown code storage '{storage}', falling back to 'auto'.")
+        storage = 'auto'
+    if storage != 'auto': return storage
+    n_cells = n_files * n_columns
+    if not n_cells: return 'dense'
+    max_fill = float(os.environ.get(SPARSE_MAX_FILL_ENV, DEFAULT_SPARSE_MAX_FILL))
+    return 'sparse' if n_annotations / n_cells <= max_fill else 'dense'
+
+def dense_codes(codes) -> np.ndarray:
+    """codes as a dense array (-1 = no label), converting SparseCodes."""
+    return codes.to_dense() if isinstance(codes, SparseCodes) else codes
+
+@dataclass
+class AnnotationTable:
+    """Integer-coded annotations shared by all analysis stages.
+    Rows are the sorted union of annotated/listed files and gold-labelled files; in_overview marks
+    the files of the wide overview. Columns are the distinct wide-table run columns, sorted.
+    codes[f, c] and gold_codes[f] index into labels; -1 means no label. codes is a dense array or
+    SparseCodes (see plan_code_storage); the count builders accept both, the accessors below hide the layout.
+    """
+    file_ids: np.ndarray
+    file_names: np.ndarray
+    in_overview: np.ndarray
+    run_names: list
+    run_columns: list
+    labels: list
+    codes: np.ndarray | SparseCodes
+    gold_codes: np.ndarray
+    has_gold: bool
+
+    @property
+    def n_labels(self) -> int:
+        return len(self.labels)
+
+    @property
+    def storage(self) -> str:
+        return 'sparse' if isinstance(self.codes, SparseCodes) else 'dense'
+
+    @property
+    def n_annotations(self) -> int:
+        return self.codes.nnz if isinstance(self.codes, SparseCodes) else int((self.codes >= 0).sum())
+
+    @cached_property
+    def coders(self) -> list:
+        return [coder_name(col) for col in self.run_columns]
+
+    @cached_property
+    def coder_order(self) -> np.ndarray:
+        """Column positions in inter-coder (sorted coder name) order."""
+        return np.array(sorted(range(len(self.coders)), key=self.coders.__getitem__), dtype=np.intp)
+
+    def run_column_index(self, run_name: str) -> int:
+        return self.run_columns.index(run_column_name(run_name))
+
+    def coder_column_index(self, coder: str) -> int:
+        """Column position for a coder name, or -1 if no run column maps to it."""
+        return self.coders.index(coder) if coder in self.coders else -1
+
+    def decode(self, codes: np.ndarray, missing=np.nan) -> np.ndarray:
+        """Object array of label values for codes; -1 becomes `missing`."""
+        lookup = np.empty(self.n_labels + 1, dtype=object)
+        lookup[:-1] = self.labels
+        lookup[-1] = missing
+        return lookup[codes]
+
+    def row_codes(self, file_rows: np.ndarray) -> np.ndarray | SparseCodes:
+        """Codes of the given table rows, in the table's layout."""
+        if isinstance(self.codes, SparseCodes): return self.codes.take_rows(file_rows)
+        return self.codes[file_rows]
+
+    def column_codes(self, column: int) -> np.ndarray:
+        """Dense codes of one run column over all table files."""
+        if isinstance(self.codes, SparseCodes): return self.codes.column(column)
+        return self.codes[:, column]
+
+    def cell_codes(self, file_rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+        if isinstance(self.codes, SparseCodes): return self.codes.lookup(file_rows, columns)
+        return self.codes[file_rows, columns]
+
+    @cached_property
+    def overview_codes(self) -> np.ndarray | SparseCodes:
+        return self.row_codes(np.flatnonzero(self.in_overview))
+
+    @cached_property
+    def inter_coder_codes(self) -> np.ndarray | SparseCodes:
+        """Overview files x coders, columns in inter-coder order."""
+        if isinstance(self.codes, SparseCodes): return self.overview_codes.take_columns(self.coder_order)
+        return self.overview_codes[:, self.coder_order]
+
+    def overview_column_codes(self, column: int) -> np.ndarray:
+        return self.column_codes(column)[self.in_overview]
+
+    @cached_property
+    def run_pair_contingency(self) -> PairwiseContingency:
+        """Contingency tables (labels plus a missing slot) for all run column pairs over the overview files."""
+        return PairwiseContingency.from_codes(self.overview_codes, self.n_labels, executor=analysis_executor())
+
+    def update_codes(self, file_rows: np.ndarray, columns: np.ndarray, new_codes: np.ndarray):
+        """Sets codes[file_rows, columns] in place and drops the derived overview code copies.
+        run_pair_contingency is kept; callers updating codes must update its counts themselves.
+        """
+        if isinstance(self.codes, SparseCodes):
+            self.codes = self.codes.with_cells(file_rows, columns, new_codes)
+        else:
+            self.codes[file_rows, columns] = new_codes
+        for derived in ('overview_codes', 'inter_coder_codes'):
+            self.__dict__.pop(derived, None)
+
+    def _overview_label_columns(self) -> list:
+        """Label columns of the wide overview, one per run name (so colliding names repeat), sorted."""
+        return sorted(run_column_name(run_name) for run_name in self.run_names)
+
+    def to_overview_frame(self) -> pd.DataFrame:
+        import pandas as pd
+        if not self.in_overview.any(): return pd.DataFrame()
+        overview_columns = {'file_id': self.file_ids[self.in_overview], 'file_name': self.file_names[self.in_overview]}
+        label_columns = self._overview_label_columns()
+        for col in label_columns:
+            overview_columns[col] = self.decode(self.overview_column_codes(self.run_columns.index(col)))
+        overview_df = pd.DataFrame(overview_columns).infer_objects()
+        return overview_df[['file_id', 'file_name'] + label_columns]
+
+    def to_long_frame(self, task_name: str = "Primary_Annotation_Task") -> pd.DataFrame:
+        import pandas as pd
+        label_columns = self._overview_label_columns()
+        if not self.in_overview.any(): return pd.DataFrame()
+        if not label_columns:
+            logging.warning("No label columns found in overview_df for long format.")
+            return pd.DataFrame()
+        n_files = int(self.in_overview.sum())
+        column_idx = [self.run_columns.index(col) for col in label_columns]
+        values = self.decode(np.concatenate([self.overview_column_codes(i) for i in column_idx]))
+        long_df = pd.DataFrame({
+            'file_id': np.tile(self.file_ids[self.in_overview], len(label_columns)),
+            'file_name': np.tile(self.file_names[self.in_overview], len(label_columns)),
+            'coder': np.repeat(np.array([coder_name(col) for col in label_columns], dtype=object), n_files),
+            'from_name': task_name,
+            'value': values,
+        })
+        return long_df.infer_objects()
+
+    def to_inter_coder_frame(self) -> pd.DataFrame:
+        import pandas as pd
+        if not self.in_overview.any() or not self.run_columns: return pd.DataFrame()
+        return pd.DataFrame(self.decode(dense_codes(self.inter_coder_codes), missing=None),
+                            index=pd.Index(self.file_ids[self.in_overview], name='file_id'),
+                            columns=pd.Index([self.coders[i] for i in self.coder_order], name='coder'))
+
+def build_annotation_table(data: dict | DecodedView, gold_standard_df: pd.DataFrame = None,
+                           file_id_col_name: str = 'file_id',
+                           gold_label_col_name: str = 'Gold_Standard_Label',
+                           gold_labels: list = None, code_storage: str = None) -> AnnotationTable:
+    """Encodes the normalized view payload or its DecodedView (latest label per run/file) and optional gold labels.
+    Gold labels come from gold_standard_df, or without pandas from gold_labels: (file_id, label) pairs in
+    file order, label None if missing. The first pair of a file id wins; any pair marks the view as having gold.
+    code_storage forces the codes layout ('dense'/'sparse'); by default plan_code_storage decides.
+    """
+    with span('ingestion'):
+        view = decode_view(data)
+        file_id_to_name, columns, run_names = view.file_names, view.columns, view.run_names
+        latest = select_latest_annotations(columns)
+        record_dimensions(results=len(columns['file_id']))
+
+    with span('matrix_build'):
+        run_columns = sorted(set(run_column_name(run_name) for run_name in run_names))
+        column_by_run = run_column_positions(run_names, run_columns)
+        latest_columns = column_by_run[latest['run']] if len(run_names) else np.zeros(0, dtype=np.intp)
+        kept = latest_columns >= 0
+        latest_file_ids, latest_labels = latest['file_id'][kept], latest['label'][kept]
+        latest_columns = latest_columns[kept]
+
+        overview_file_ids = set(file_id_to_name.keys()).union(latest['file_id'].tolist())
+        if (gold_labels is None and gold_standard_df is not None and not gold_standard_df.empty
+                and file_id_col_name in gold_standard_df.columns and gold_label_col_name in gold_standard_df.columns):
+            gold_labels = list(zip(gold_standard_df[file_id_col_name], gold_standard_df[gold_label_col_name]))
+        has_gold = bool(gold_labels)
+        gold_by_file = {}
+        for file_id, label in gold_labels or []:
+            if file_id not in gold_by_file and not is_missing_value(file_id): gold_by_file[file_id] = label
+        file_ids = np.array(sorted(overview_file_ids.union(gold_by_file.keys())), dtype=object)
+
+        labels = sorted(set(latest_labels.tolist()).union(label for label in gold_by_file.values()
+                                                          if not is_missing_value(label)))
+        label_to_ind = {label: i for i, label in enumerate(labels)}
+        code_dtype = np.int32 if len(labels) < np.iinfo(np.int32).max else np.int64
+
+        latest_rows = index_of(latest_file_ids, file_ids)
+        latest_codes = encode_labels(latest_labels, labels=labels)[0].astype(code_dtype) if len(latest_labels) else []
+        shape = (len(file_ids), len(run_columns))
+        if plan_code_storage(*shape, len(latest_rows), code_storage) == 'sparse':
+            codes = SparseCodes.from_coo(latest_rows, latest_columns, np.asarray(latest_codes, dtype=code_dtype), shape)
+        else:
+            codes = np.full(shape, -1, dtype=code_dtype)
+            codes[latest_rows, latest_columns] = latest_codes
+        gold_codes = np.full(len(file_ids), -1, dtype=code_dtype)
+        gold_items = [(file_id, label_to_ind[label]) for file_id, label in gold_by_file.items()
+                      if not is_missing_value(label)]
+        if gold_items:
+            gold_file_ids, gold_label_codes = zip(*gold_items)
+            gold_codes[index_of(list(gold_file_ids), file_ids)] = gold_label_codes
+
+        in_overview = np.fromiter((file_id in overview_file_ids for file_id in file_ids.tolist()), dtype=bool,
+                                  count=len(file_ids))
+        file_names = np.array([file_id_to_name.get(file_id, MISSING_FILE_NAME) if is_listed else np.nan
+                               for file_id, is_listed in zip(file_ids, in_overview)], dtype=object)
+        return AnnotationTable(file_ids=file_ids, file_names=file_names, in_overview=in_overview,
+                               run_names=sorted(run_names), run_columns=run_columns, labels=labels,
+                               codes=codes, gold_codes=gold_codes, has_gold=has_gold)
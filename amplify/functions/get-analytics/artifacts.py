@@ -0,0 +1,88 @@
+"""
+Table artifacts (Python)
+ - responseEncoding 'artifacts' writes the large tables of a response once, into one compressed .npz file in
+   storage, and returns references plus small summaries (columns, row count) in place of their cells
+ - The local directory ANALYTICS_ARTIFACT_DIR stands in for storage; files are named by a hash of their
+   contents, so repeated responses reuse the same artifact
+ - Arrays of table t: 't.index' and 't.columns', then per column position j either 't.j.codes' (int32, -1 = null)
+   with 't.j.dictionary' for string columns, or 't.j.values' for numeric ones (float columns use NaN for null).
+   Strings are fixed-width unicode, so the file loads without pickle (np.load(..., allow_pickle=False))
+"""
+from __future__ import annotations
+import hashlib
+import io
+import logging
+import os
+from typing import TYPE_CHECKING
+import numpy as np
+from fklearn import factorize
+if TYPE_CHECKING:
+    import pandas as pd
+
+ARTIFACT_DIR_ENV = "ANALYTICS_ARTIFACT_DIR"
+ARTIFACT_FORMAT = "npz"
+
+def artifact_dir() -> str:
+    """Configured artifact directory, or None when offloading is unavailable."""
+    return os.environ.get(ARTIFACT_DIR_ENV) or None
+
+def _string_array(values: list) -> np.ndarray:
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype='<U1')
+
+def column_arrays(prefix: str, values: list) -> dict:
+    """npz arrays of one column of formatted cell values (None = null; see index.format_column_values)."""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        if len(present) == len(values) and all(isinstance(value, int) for value in present):
+            return {f"{prefix}.values": np.array(values, dtype=np.int64)}
+        return {f"{prefix}.values": np.array([np.nan if value is None else value for value in values], dtype=float)}
+    codes, dictionary = factorize(np.array([None if value is None else str(value) for value in values], dtype=object))
+    return {f"{prefix}.codes": np.asarray(codes, dtype=np.int32), f"{prefix}.dictionary": _string_array(list(dictionary))}
+
+class TableArtifactWriter:
+    """Collects the tables of one response and writes them as a single .npz artifact."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._arrays = {}
+        self._summaries = []
+
+    def add_frame(self, table_name: str, df: pd.DataFrame, column_values: list) -> dict:
+        """
+        Stores a DataFrame (column_values: its formatted cells per column) under table_name. Returns the
+        DataFrameStructured summary for the response: columns, no cells, and an artifact reference that
+        write() completes with the artifact key.
+        """
+        columns = [str(col) for col in df.columns.tolist()]
+        self._arrays[f"{table_name}.index"] = _string_array([str(idx) for idx in df.index.tolist()])
+        self._arrays[f"{table_name}.columns"] = _string_array(columns)
+        for col_idx, values in enumerate(column_values):
+            self._arrays.update(column_arrays(f"{table_name}.{col_idx}", values))
+        summary = {"columns": columns, "index": [], "data_rows": [],
+                   "artifact": {"key": None, "format": ARTIFACT_FORMAT, "table": table_name, "rows": len(df)}}
+        self._summaries.append(summary)
+        return summary
+
+    def write(self) -> str:
+        """Writes the collected tables (unless an identical artifact exists) and returns its key; None if empty."""
+        if not self._arrays: return None
+        # Hash the arrays rather than the zip bytes, which carry write timestamps.
+        digest = hashlib.sha256()
+        for name in sorted(self._arrays):
+            array = self._arrays[name]
+            digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        key = f"{digest.hexdigest()[:32]}.{ARTIFACT_FORMAT}"
+        path = os.path.join(self.directory, key)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **self._arrays)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as artifact_file:
+                artifact_file.write(buffer.getvalue())
+            os.replace(tmp_path, path)
+            logging.info(f"Table artifact written: {key} ({buffer.tell()} bytes, {len(self._summaries)} tables).")
+        for summary in self._summaries:
+            summary["artifact"]["key"] = key
+        return key
@@ -0,0 +1,62 @@
+"""
+Cold-start benchmark: `import index` and the first handler call in a fresh interpreter
+ - Each measurement runs in a new Python process (as a cold Lambda container would)
+ - Reports the import time, the first handler call with all outputs and with a pandas-free request
+   (sections=['krippendorff_alpha']), and whether pandas was loaded
+ - Result cache disabled, so every first call computes
+Usage: python benchmarks/bench_cold_start.py [--files 2000] [--runs 4] [--labels 8] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from workloads import make_view_payload
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import index
+import_s = time.perf_counter() - start
+with open(sys.argv[1]) as payload_file:
+    event = json.load(payload_file)
+start = time.perf_counter()
+index.handler(event, None)
+print(json.dumps({"import_s": import_s, "first_call_s": time.perf_counter() - start,
+                  "pandas_loaded": "pandas" in sys.modules}))
+"""
+
+def run_child(payload_path: str) -> dict:
+    env = {**os.environ, "ANALYTICS_CACHE_MAX_ENTRIES": "0", "ANALYTICS_CACHE_DIR": ""}
+    completed = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, payload_path], cwd=FUNCTION_DIR, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=4)
+    parser.add_argument("--labels", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = make_view_payload(args.files, args.runs, args.labels)
+    requests = {"all outputs": {}, "alpha only": {"sections": ["krippendorff_alpha"]}}
+    print(f"{'request':>12} {'import [s]':>11} {'first call [s]':>15} {'total [s]':>10} {'pandas':>7}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, arguments in requests.items():
+            payload_path = os.path.join(tmp_dir, "event.json")
+            with open(payload_path, "w") as payload_file:
+                json.dump({"prev": payload, "arguments": arguments}, payload_file)
+            runs = [run_child(payload_path) for _ in range(args.repeat)]
+            import_s = statistics.median(run["import_s"] for run in runs)
+            first_call_s = statistics.median(run["first_call_s"] for run in runs)
+            print(f"{name:>12} {import_s:>11.3f} {first_call_s:>15.3f} {import_s + first_call_s:>10.3f} "
+                  f"{'yes' if runs[0]['pandas_loaded'] else 'no':>7}")
+
+if __name__ == "__main__":
+    main()
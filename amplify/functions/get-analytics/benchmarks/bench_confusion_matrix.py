@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: fklearn.confusion_matrix
+ - Compares the bincount kernel against the former per-row loop
+ - Checks both produce identical matrices before timing
+Usage: python benchmarks/bench_confusion_matrix.py [--sizes 10000 100000 ...] [--labels 12]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fklearn import confusion_matrix, _get_labels  # noqa: E402
+
+def confusion_matrix_loop(y_true, y_pred, *, labels=None):
+    """Per-row reference implementation (previous fklearn.confusion_matrix)."""
+    y_true_arr = np.asarray(y_true)
+    y_pred_arr = np.asarray(y_pred)
+    current_labels = _get_labels(y_true_arr, y_pred_arr, labels_param=labels)
+    n_labels = len(current_labels)
+    label_to_ind = {label: i for i, label in enumerate(current_labels)}
+    cm = np.zeros((n_labels, n_labels), dtype=int)
+    for true_label_val, pred_label_val in zip(y_true_arr, y_pred_arr):
+        if pd.isna(true_label_val) or pd.isna(pred_label_val):
+            continue
+        true_idx = label_to_ind.get(true_label_val)
+        pred_idx = label_to_ind.get(pred_label_val)
+        if true_idx is not None and pred_idx is not None:
+            cm[true_idx, pred_idx] += 1
+    return cm
+
+def make_labels(n_rows: int, n_labels: int, nan_ratio: float, rng: np.random.Generator) -> np.ndarray:
+    """Object array of string labels with a share of missing values, like the aligned pandas columns."""
+    vocabulary = np.array([f"label_{i}" for i in range(n_labels)], dtype=object)
+    values = vocabulary[rng.integers(0, n_labels, size=n_rows)]
+    values[rng.random(n_rows) < nan_ratio] = np.nan
+    return values
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument("--labels", type=int, default=12)
+    parser.add_argument("--nan-ratio", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loop-max-rows", type=int, default=10 ** 6,
+                        help="Skip the per-row reference above this size (it takes minutes at 10^7).")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'kernel [s]':>12} {'loop [s]':>12} {'speedup':>9} {'explicit labels [s]':>20}")
+    for n_rows in args.sizes:
+        y_true = make_labels(n_rows, args.labels, args.nan_ratio, rng)
+        y_pred = make_labels(n_rows, args.labels, args.nan_ratio, rng)
+        explicit = [f"label_{i}" for i in range(0, args.labels, 2)]
+
+        kernel_s = best_of(lambda: confusion_matrix(y_true, y_pred), args.repeat)
+        explicit_s = best_of(lambda: confusion_matrix(y_true, y_pred, labels=explicit), args.repeat)
+        if n_rows <= args.loop_max_rows:
+            if not (np.array_equal(confusion_matrix(y_true, y_pred), confusion_matrix_loop(y_true, y_pred)) and
+                    np.array_equal(confusion_matrix(y_true, y_pred, labels=explicit),
+                                   confusion_matrix_loop(y_true, y_pred, labels=explicit))):
+                raise SystemExit(f"Mismatch between kernel and reference loop at {n_rows} rows.")
+            loop_s = best_of(lambda: confusion_matrix_loop(y_true, y_pred), 1)
+            print(f"{n_rows:>10} {kernel_s:>12.4f} {loop_s:>12.4f} {loop_s / kernel_s:>8.1f}x {explicit_s:>20.4f}")
+        else:
+            print(f"{n_rows:>10} {kernel_s:>12.4f} {'-':>12} {'-':>9} {explicit_s:>20.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark: parallel.AnalysisExecutor on the per-pair and per-run count builders
+ - Times PairwiseContingency.from_codes (all run pairs) and batched_confusion_matrices (all runs vs gold)
+   serially and through thread/process pools of --workers workers
+ - Checks the parallel counts equal the serial ones before timing
+ - Reports the crossover: the smallest size where a pool beats serial (a starting point for
+   ANALYTICS_PARALLEL_MIN_ROWS on the measured machine)
+ - With one worker the pools fall back to serial calls, so only serial is timed and no crossover is reported
+Usage: python benchmarks/bench_executor.py [--sizes 10000 100000 ...] [--runs 12] [--labels 20] [--workers 4]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fklearn import PairwiseContingency, batched_confusion_matrices  # noqa: E402
+from parallel import AnalysisExecutor, available_cpus  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+def count_all(codes: np.ndarray, gold_codes: np.ndarray, n_labels: int, executor=None):
+    pair_counts = PairwiseContingency.from_codes(codes, n_labels, executor=executor).counts
+    return pair_counts, batched_confusion_matrices(gold_codes, codes, n_labels, executor=executor)
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 5 * 10 ** 4, 10 ** 5, 10 ** 6])
+    parser.add_argument("--runs", type=int, default=12)
+    parser.add_argument("--labels", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=available_cpus())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pool_kinds = ('thread', 'process')
+    # One worker means AnalysisExecutor.parallel is False: a "pool" timing would be serial again, i.e. noise.
+    executors = ({kind: AnalysisExecutor(kind, max_workers=args.workers, min_rows=0) for kind in pool_kinds}
+                 if args.workers > 1 else {})
+    print(f"available CPUs: {available_cpus()}, workers: {args.workers}")
+    if not executors:
+        print("one worker: pools run serially, so only serial is timed (pass --workers N > 1 on a multi-CPU machine)")
+    elif available_cpus() < 2:
+        print("one CPU available: the pool workers share it, so any crossover below is noise")
+    print(f"{'rows':>10} {'serial [s]':>11} {'thread [s]':>11} {'process [s]':>12}")
+    crossover = {kind: None for kind in executors}
+    try:
+        for n_rows in args.sizes:
+            codes = rng.integers(-1, args.labels, size=(n_rows, args.runs)).astype(np.int32)
+            gold_codes = rng.integers(-1, args.labels, size=n_rows).astype(np.int32)
+            serial_counts = count_all(codes, gold_codes, args.labels)
+            serial_s = best_of(lambda: count_all(codes, gold_codes, args.labels), args.repeat)
+            timings = {}
+            for kind, executor in executors.items():
+                parallel_counts = count_all(codes, gold_codes, args.labels, executor)
+                if any((a != b).any() for a, b in zip(serial_counts, parallel_counts)):
+                    raise SystemExit(f"Mismatch between serial and {kind} counts at {n_rows} rows.")
+                timings[kind] = best_of(lambda: count_all(codes, gold_codes, args.labels, executor), args.repeat)
+                if crossover[kind] is None and timings[kind] < serial_s: crossover[kind] = n_rows
+            thread_s, process_s = (f"{timings[kind]:.4f}" if kind in timings else "-" for kind in pool_kinds)
+            print(f"{n_rows:>10} {serial_s:>11.4f} {thread_s:>11} {process_s:>12}")
+    finally:
+        for executor in executors.values():
+            executor.shutdown()
+    for kind, n_rows in crossover.items():
+        print(f"{kind} crossover: " + (f"{n_rows} rows" if n_rows else "none in the measured sizes"))
+
+if __name__ == "__main__":
+    main()
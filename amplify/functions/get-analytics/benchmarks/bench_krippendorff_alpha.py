@@ -0,0 +1,93 @@
+"""
+Benchmark and parity check: fklearn.krippendorff_alpha_nominal
+ - Compares against krippendorff.alpha(level_of_measurement='nominal') on random coded data
+ - The krippendorff package is only needed here (pip install krippendorff), not at runtime
+Usage: python benchmarks/bench_krippendorff_alpha.py [--units 1000 100000] [--coders 5] [--labels 8]
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fklearn import krippendorff_alpha_nominal  # noqa: E402
+
+def make_codes(n_units: int, n_coders: int, n_labels: int, missing_ratio: float,
+               rng: np.random.Generator) -> np.ndarray:
+    """units x coders codes with some agreement structure and -1 for missing values."""
+    truth = rng.integers(0, n_labels, size=(n_units, 1))
+    noise = rng.integers(0, n_labels, size=(n_units, n_coders))
+    codes = np.where(rng.random((n_units, n_coders)) < 0.6, truth, noise)
+    codes[rng.random((n_units, n_coders)) < missing_ratio] = -1
+    return codes
+
+def reference_alpha(codes: np.ndarray) -> float:
+    import krippendorff
+    reliability_data = np.where(codes >= 0, codes, np.nan).T
+    return krippendorff.alpha(reliability_data=reliability_data, level_of_measurement='nominal')
+
+def check_parity(rng: np.random.Generator, trials: int) -> float:
+    max_diff = 0.0
+    for _ in range(trials):
+        n_units, n_coders, n_labels = rng.integers(2, 200), rng.integers(2, 8), rng.integers(2, 12)
+        codes = make_codes(n_units, n_coders, n_labels, rng.random() * 0.8, rng)
+        if len(np.unique(codes[codes >= 0])) < 2:
+            continue
+        # The reference only sees labels that occur; re-code densely like encode_labels does.
+        _, dense = np.unique(codes[codes >= 0], return_inverse=True)
+        dense_codes = np.full(codes.shape, -1)
+        dense_codes[codes >= 0] = dense
+        try:
+            theirs = reference_alpha(dense_codes)
+        except ValueError:
+            try:
+                krippendorff_alpha_nominal(dense_codes, int(dense.max()) + 1)
+            except ValueError:
+                continue
+            raise SystemExit("Parity check failed: krippendorff raised ValueError, native alpha did not.")
+        ours = krippendorff_alpha_nominal(dense_codes, int(dense.max()) + 1)
+        if np.isnan(ours) and np.isnan(theirs):
+            continue
+        max_diff = max(max_diff, abs(ours - theirs))
+    return max_diff
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--units", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5])
+    parser.add_argument("--coders", type=int, default=5)
+    parser.add_argument("--labels", type=int, default=8)
+    parser.add_argument("--missing-ratio", type=float, default=0.3)
+    parser.add_argument("--parity-trials", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    warnings.simplefilter("ignore", RuntimeWarning)
+    try:
+        max_diff = check_parity(rng, args.parity_trials)
+    except ImportError:
+        print("krippendorff not installed: skipping parity check and reference timings.")
+        has_reference = False
+    else:
+        print(f"parity over {args.parity_trials} random inputs: max |diff| = {max_diff:.3e}")
+        if max_diff > args.tolerance:
+            raise SystemExit(f"Parity check failed: {max_diff} > {args.tolerance}")
+        has_reference = True
+
+    print(f"{'units':>10} {'native [s]':>12} {'krippendorff [s]':>18} {'alpha':>10}")
+    for n_units in args.units:
+        codes = make_codes(n_units, args.coders, args.labels, args.missing_ratio, rng)
+        start = time.perf_counter()
+        alpha = krippendorff_alpha_nominal(codes, args.labels)
+        native_s = time.perf_counter() - start
+        reference_s = "-"
+        if has_reference:
+            start = time.perf_counter()
+            reference_alpha(codes)
+            reference_s = f"{time.perf_counter() - start:.4f}"
+        print(f"{n_units:>10} {native_s:>12.4f} {reference_s:>18} {alpha:>10.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Pipeline benchmark: index.handler over a grid of synthetic views (see workloads.make_view_payload)
+ - One fresh process per grid point, so peak RSS is that point's own
+ - Times the whole handler and each profiling stage (ingestion, matrix_build, majority, kappa, alpha,
+   crosstabs, gold_evals, frames, serialization); best of --repeat calls, pandas imported beforehand
+ - --code-storage forces the dense or sparse codes layout (default: the fill-ratio planner)
+ - --save-baseline writes the measurements with the environment they were taken in (machine, CPUs, Python and
+   library versions, code storage mode, repeat, analytics code version); --baseline compares against stored ones
+   and exits with status 1 when a time or the peak memory grows beyond the thresholds. Absolute timings only
+   compare within one environment: a baseline from another one is reported and not compared (re-save it there)
+Usage: python benchmarks/bench_pipeline.py [--files 1000 10000 ...] [--runs 4 12] [--labels 12]
+       [--density 0.6] [--duplicates 0.1] [--gold 0.5] [--repeat 3] [--code-storage auto|dense|sparse]
+       [--save-baseline benchmarks/baselines/bench_pipeline.json | --baseline benchmarks/baselines/bench_pipeline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from importlib import metadata
+
+FUNCTION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, FUNCTION_DIR)
+from parallel import available_cpus  # noqa: E402
+from result_cache import code_version  # noqa: E402
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("ingestion", "matrix_build", "majority", "kappa", "alpha", "crosstabs", "gold_evals", "frames",
+          "serialization")
+
+CHILD_SCRIPT = """
+import json, logging, resource, sys, time
+sys.path.insert(0, sys.argv[2])
+import pandas  # noqa: F401  (import cost belongs to bench_cold_start)
+import index
+from workloads import make_view_payload
+logging.disable(logging.CRITICAL)
+config = json.loads(sys.argv[1])
+payload = make_view_payload(config["files"], config["runs"], config["labels"], config["density"],
+                            config["duplicates"], config["gold"])
+rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+best = None
+for _ in range(config["repeat"]):
+    start = time.perf_counter()
+    body = index.handler({"prev": payload, "arguments": {"profile": True}}, None)
+    measured = {"handler_s": time.perf_counter() - start}
+    for record in body["profile"]["spans"]:
+        key = record["name"] + "_s"
+        measured[key] = measured.get(key, 0.0) + record["wall_s"]
+    best = measured if best is None else {key: min(value, measured.get(key, value)) for key, value in best.items()}
+best["peak_rss_mb"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024
+best["results"] = body["profile"]["dimensions"].get("results")
+best["code_storage"] = body["profile"]["dimensions"].get("code_storage")
+print(json.dumps(best))
+"""
+
+def run_point(config: dict, code_storage: str = "auto") -> dict:
+    env = {**os.environ, "ANALYTICS_CACHE_MAX_ENTRIES": "0", "ANALYTICS_CACHE_DIR": "", "ANALYTICS_PROFILE": "",
+           "ANALYTICS_CODE_STORAGE": code_storage}
+    completed = subprocess.run([sys.executable, "-c", CHILD_SCRIPT, json.dumps(config), BENCHMARK_DIR],
+                               cwd=FUNCTION_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def point_key(config: dict) -> str:
+    return (f"files={config['files']},runs={config['runs']},labels={config['labels']},density={config['density']},"
+            f"duplicates={config['duplicates']},gold={config['gold']}")
+
+def installed_version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+def environment_record(code_storage: str, repeat: int) -> dict:
+    """Machine and configuration the measurements were taken with; code_version is informational only."""
+    return {"machine": platform.machine(), "system": platform.system(), "processor": platform.processor() or None,
+            "cpus": available_cpus(), "python": platform.python_version(),
+            **{package: installed_version(package) for package in ("numpy", "pandas", "orjson")},
+            "code_storage": code_storage, "repeat": repeat, "code_version": code_version()}
+
+def environment_differences(baseline_environment: dict, environment: dict) -> list:
+    """(key, baseline, current) for the environment keys that make timings incomparable."""
+    return [(key, baseline_environment.get(key), value) for key, value in environment.items()
+            if key != "code_version" and baseline_environment.get(key) != value]
+
+def find_regressions(measurements: dict, baseline: dict, time_threshold: float, memory_threshold: float,
+                     min_seconds: float, min_mb: float) -> list:
+    """(point, metric, baseline, current) for metrics above baseline * (1 + threshold) and the absolute floor."""
+    regressions = []
+    for key, current in measurements.items():
+        previous = baseline.get(key)
+        if previous is None: continue
+        for metric, value in current.items():
+            old = previous.get(metric)
+            if old is None or value is None or not metric.endswith(("_s", "_mb")): continue
+            is_memory = metric == "peak_rss_mb"
+            threshold, floor = (memory_threshold, min_mb) if is_memory else (time_threshold, min_seconds)
+            if value > old * (1 + threshold) and value - old > floor:
+                regressions.append((key, metric, old, value))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--runs", type=int, nargs="+", default=[4, 12])
+    parser.add_argument("--labels", type=int, default=12)
+    parser.add_argument("--density", type=float, default=0.6)
+    parser.add_argument("--duplicates", type=float, default=0.1)
+    parser.add_argument("--gold", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--code-storage", choices=("auto", "dense", "sparse"), default="auto")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="Allowed relative slowdown.")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed relative peak RSS growth.")
+    parser.add_argument("--min-seconds", type=float, default=0.02, help="Ignore slowdowns below this many seconds.")
+    parser.add_argument("--min-mb", type=float, default=8.0, help="Ignore memory growth below this many MB.")
+    args = parser.parse_args()
+
+    header = f"{'files':>8} {'runs':>5} {'results':>9} {'handler':>8} " + " ".join(f"{stage[:9]:>9}" for stage in STAGES)
+    print(header + f" {'peak MB':>8} {'storage':>8}")
+    measurements = {}
+    for n_files in args.files:
+        for n_runs in args.runs:
+            config = {"files": n_files, "runs": n_runs, "labels": args.labels, "density": args.density,
+                      "duplicates": args.duplicates, "gold": args.gold, "repeat": args.repeat}
+            measured = run_point(config, args.code_storage)
+            measurements[point_key(config)] = measured
+            stage_columns = " ".join(f"{measured.get(stage + '_s', 0.0):>9.4f}" for stage in STAGES)
+            print(f"{n_files:>8} {n_runs:>5} {measured['results']:>9} {measured['handler_s']:>8.3f} {stage_columns} "
+                  f"{measured['peak_rss_mb']:>8.1f} {measured['code_storage']:>8}")
+
+    environment = environment_record(args.code_storage, args.repeat)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump({"environment": environment, "points": measurements}, baseline_file, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}.")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        if "environment" not in stored:
+            print("The baseline has no environment record; save a baseline here with --save-baseline.")
+            return
+        differences = environment_differences(stored["environment"], environment)
+        if differences:
+            for key, old, new in differences:
+                print(f"Environment differs from the baseline: {key} {old} -> {new}")
+            print("Timings are not compared across environments; save a baseline here with --save-baseline.")
+            return
+        baseline = stored["points"]
+        missing = [key for key in measurements if key not in baseline]
+        if missing: print(f"No baseline for {len(missing)} grid point(s); they are not compared.")
+        regressions = find_regressions(measurements, baseline, args.time_threshold, args.memory_threshold,
+                                       args.min_seconds, args.min_mb)
+        for key, metric, old, new in regressions:
+            print(f"REGRESSION {key} {metric}: {old:.4f} -> {new:.4f}")
+        if regressions: raise SystemExit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
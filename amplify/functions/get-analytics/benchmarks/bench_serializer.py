@@ -0,0 +1,80 @@
+"""
+Micro-benchmark: index.format_dataframe_for_schema
+ - Compares the column-wise serializer against the former per-cell iloc loop
+ - Checks both produce identical data_rows before timing
+ - Reports JSON payload size for the 'rows' and 'columnar' encodings
+Usage: python benchmarks/bench_serializer.py [--sizes 1000 10000 ...] [--labels 12]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from index import format_data_value, format_dataframe_for_schema  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+def format_dataframe_loop(df: pd.DataFrame):
+    """Per-cell reference implementation (previous format_dataframe_for_schema)."""
+    columns_as_strings = [str(col) for col in df.columns.tolist()]
+    index_as_strings = [str(idx) for idx in df.index.tolist()]
+    data_rows_list = [{"values": [format_data_value(df.iloc[i, col_idx]) for col_idx in range(len(df.columns))]} for i
+                      in range(len(df))]
+    return {"columns": columns_as_strings, "index": index_as_strings, "data_rows": data_rows_list}
+
+def make_long_frame(n_rows: int, n_labels: int, nan_ratio: float, rng: np.random.Generator) -> pd.DataFrame:
+    """Frame shaped like annotations_long_format: string ids/names/coders and a label column with gaps."""
+    vocabulary = np.array([f"label_{i}" for i in range(n_labels)], dtype=object)
+    values = vocabulary[rng.integers(0, n_labels, size=n_rows)]
+    values[rng.random(n_rows) < nan_ratio] = np.nan
+    file_numbers = rng.integers(0, max(n_rows // 4, 1), size=n_rows)
+    return pd.DataFrame({
+        'file_id': [f"file-{i:08d}" for i in file_numbers],
+        'file_name': [f"image_{i}.png" for i in file_numbers],
+        'coder': np.array([f"run {i}" for i in range(4)], dtype=object)[rng.integers(0, 4, size=n_rows)],
+        'from_name': "Primary_Annotation_Task",
+        'value': values,
+        'score': np.where(rng.random(n_rows) < nan_ratio, np.nan, rng.random(n_rows)),
+    })
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10 ** 3, 10 ** 4, 10 ** 5])
+    parser.add_argument("--labels", type=int, default=12)
+    parser.add_argument("--nan-ratio", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loop-max-rows", type=int, default=10 ** 5,
+                        help="Skip the per-cell reference above this size.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>10} {'columns [s]':>12} {'loop [s]':>12} {'speedup':>9} {'rows [KB]':>10} {'columnar [KB]':>14}")
+    for n_rows in args.sizes:
+        df = make_long_frame(n_rows, args.labels, args.nan_ratio, rng)
+        columns_s = best_of(lambda: format_dataframe_for_schema(df), args.repeat)
+        rows_kb = len(json.dumps(format_dataframe_for_schema(df))) / 1024
+        columnar_kb = len(json.dumps(format_dataframe_for_schema(df, 'columnar'))) / 1024
+        if n_rows <= args.loop_max_rows:
+            if format_dataframe_for_schema(df) != format_dataframe_loop(df):
+                raise SystemExit(f"Mismatch between column-wise serializer and reference loop at {n_rows} rows.")
+            loop_s = best_of(lambda: format_dataframe_loop(df), 1)
+            print(f"{n_rows:>10} {columns_s:>12.4f} {loop_s:>12.4f} {loop_s / columns_s:>8.1f}x "
+                  f"{rows_kb:>10.0f} {columnar_kb:>14.0f}")
+        else:
+            print(f"{n_rows:>10} {columns_s:>12.4f} {'-':>12} {'-':>9} {rows_kb:>10.0f} {columnar_kb:>14.0f}")
+
+if __name__ == "__main__":
+    main()
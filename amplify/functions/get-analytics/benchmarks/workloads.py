@@ -0,0 +1,46 @@
+"""
+Synthetic workloads for the analytics benchmarks
+ - make_view_payload builds a normalized {'result': {'files', 'classifications'}} payload
+ - Parameterized by files, runs, labels, annotation density, duplicate re-annotations and gold coverage
+ - Labels follow a skewed (Zipf-like) distribution; runs agree with the hidden true label with a given
+   accuracy, so agreement metrics are in a realistic range
+ - Deterministic for a given seed
+"""
+import numpy as np
+
+def make_view_payload(n_files: int, n_runs: int, n_labels: int, density: float = 1.0, duplicates: float = 0.0,
+                      gold_coverage: float = 0.5, accuracy: float = 0.7, seed: int = 0) -> dict:
+    """
+    density: share of files each run annotates; duplicates: share of a run's annotations re-annotated once
+    more (later createdAt, possibly another label); gold_coverage: share of files with a gold label.
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"label_{i}" for i in range(n_labels)], dtype=object)
+    label_weights = 1.0 / np.arange(1, n_labels + 1)
+    label_weights /= label_weights.sum()
+    true_codes = rng.choice(n_labels, size=n_files, p=label_weights)
+    file_ids = [f"file-{i:08d}" for i in range(n_files)]
+
+    files = []
+    has_gold = rng.random(n_files) < gold_coverage
+    for i in range(n_files):
+        file_entry = {"file": {"id": file_ids[i], "name": f"image_{i}.png"}}
+        if has_gold[i]: file_entry["label"] = {"name": labels[true_codes[i]]}
+        files.append(file_entry)
+
+    classifications = []
+    for run in range(n_runs):
+        annotated = np.flatnonzero(rng.random(n_files) < density)
+        repeated = annotated[rng.random(len(annotated)) < duplicates]
+        result_files = np.concatenate([annotated, repeated])
+        correct = rng.random(len(result_files)) < accuracy
+        result_codes = np.where(correct, true_codes[result_files],
+                                rng.choice(n_labels, size=len(result_files), p=label_weights))
+        # Re-annotations come later than the first pass.
+        seconds = np.concatenate([rng.integers(0, 43200, size=len(annotated)),
+                                  rng.integers(43200, 86400, size=len(repeated))])
+        results = [{"fileId": file_ids[file_position], "label": {"name": labels[code]},
+                    "createdAt": f"2025-01-01T{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}Z"}
+                   for file_position, code, second in zip(result_files.tolist(), result_codes.tolist(), seconds.tolist())]
+        classifications.append({"name": f"run {run}", "results": results})
+    return {"result": {"files": files, "classifications": classifications}}
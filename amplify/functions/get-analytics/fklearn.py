@@ -1,16 +1,71 @@
-import pandas as pd
+import sys
 import numpy as np
 import logging
+from functools import cached_property
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _loaded_pandas():
+    """pandas if some caller already imported it (its hash tables beat the pure Python fallbacks), else None.
+    This module never imports pandas itself, so array-only callers do not pay its import time.
+    """
+    return sys.modules.get('pandas')
+
+def is_missing_value(value) -> bool:
+    """None or NaN (the values pd.isna treats as missing for label and id inputs)."""
+    return value is None or (isinstance(value, float) and value != value)
+
+def factorize(values, sort=False):
+    """
+    (codes, uniques) of a 1-d input like pd.factorize(values, sort=sort, use_na_sentinel=True):
+    missing values (None/NaN) get code -1. Uses pandas when it is loaded, else one dict pass.
+    """
+    values_arr = np.asarray(values).reshape(-1)
+    pd = _loaded_pandas()
+    if pd is not None:
+        return pd.factorize(values_arr, sort=sort, use_na_sentinel=True)
+    if values_arr.dtype.kind in 'biu':
+        uniques, codes = np.unique(values_arr, return_inverse=True)
+        return codes.astype(np.intp, copy=False), uniques
+    code_by_value = {}
+    codes = np.fromiter((-1 if is_missing_value(value) else code_by_value.setdefault(value, len(code_by_value))
+                         for value in values_arr.tolist()), dtype=np.intp, count=values_arr.size)
+    uniques = np.empty(len(code_by_value), dtype=object)
+    uniques[:] = list(code_by_value)
+    if sort and len(uniques):
+        order = np.argsort(uniques, kind='stable')
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        codes = np.where(codes >= 0, rank[codes], -1)
+        uniques = uniques[order]
+    return codes, uniques
+
+def index_of(values, vocabulary):
+    """Position of each value in a vocabulary of distinct values (-1 if absent), like pd.Index.get_indexer."""
+    pd = _loaded_pandas()
+    if pd is not None:
+        return pd.Index(vocabulary).get_indexer(values)
+    position = {value: i for i, value in enumerate(np.asarray(vocabulary).tolist())}
+    values_list = np.asarray(values).reshape(-1).tolist()
+    return np.fromiter((position.get(value, -1) for value in values_list), dtype=np.intp, count=len(values_list))
+
+def _present_labels(values):
+    """Distinct non-missing values of a 1-d input (hash-based, no per-row Python work)."""
+    values_arr = np.asarray(values)
+    if values_arr.size == 0:
+        return []
+    return list(factorize(values_arr)[1])
+
+def _is_label_sequence(values) -> bool:
+    return isinstance(values, (list, np.ndarray)) or hasattr(values, 'to_numpy')
+
 def _get_labels(y_true, y_pred, labels_param=None):
-""Helper function to determine the set of labels, sorted."""
+    """Helper function to determine the set of labels, sorted."""
     if labels_param is None:
         present_labels_set = set()
-        if isinstance(y_true, (list, np.ndarray, pd.Series)):
-            present_labels_set.update(y for y in y_true if pd.notna(y))
-        if isinstance(y_pred, (list, np.ndarray, pd.Series)):
-            present_labels_set.update(y for y in y_pred if pd.notna(y))
+        if _is_label_sequence(y_true):
+            present_labels_set.update(_present_labels(y_true))
+        if _is_label_sequence(y_pred):
+            present_labels_set.update(_present_labels(y_pred))
         determined_labels = sorted(list(present_labels_set))
     else:
         if isinstance(labels_param, np.ndarray):
@@ -19,33 +74,190 @@ def _get_labels(y_true, y_pred, labels_param=None):
             determined_labels = sorted(list(set(labels_param)))
     return determined_labels
 
-def confusion_matrix(y_true, y_pred, *, labels=None):
-""
-    Computes the confusion matrix.
-    C[i, j] is the number of observations known to be in group i and predicted to be in group j.
-    Parameter 'labels' is keyword-only as in sklearn.
-""
+def _remap_codes(codes, uniques, label_to_ind):
+    """Maps factorized codes onto a label index; -1 for missing values and values outside of it."""
+    lookup = np.full(len(uniques) + 1, -1, dtype=np.intp)
+    lookup[:-1] = [label_to_ind.get(u, -1) for u in uniques]
+    return lookup[codes]
+
+def encode_labels(values, labels=None):
+    """
+    Integer-encodes an array of labels of any shape against a sorted label vocabulary.
+    Returns (codes, labels); codes has the input's shape and is -1 for missing or unknown values.
+    """
+    values_arr = np.asarray(values)
+    codes, uniques = factorize(values_arr)
+    current_labels = sorted(set(uniques)) if labels is None else _get_labels(None, None, labels_param=labels)
+    label_to_ind = {label: i for i, label in enumerate(current_labels)}
+    return _remap_codes(codes, uniques, label_to_ind).reshape(values_arr.shape), current_labels
+
+def _labelled_confusion_matrix(y_true, y_pred, labels=None):
+    """Confusion matrix together with the sorted labels indexing its rows and columns."""
     y_true_arr = np.asarray(y_true)
     y_pred_arr = np.asarray(y_pred)
 
-    current_labels = _get_labels(y_true_arr, y_pred_arr, labels_param=labels)
+    true_codes, true_uniques = factorize(y_true_arr)
+    pred_codes, pred_uniques = factorize(y_pred_arr)
+    if labels is None:
+        current_labels = sorted(set(true_uniques) | set(pred_uniques))
+    else:
+        current_labels = _get_labels(y_true_arr, y_pred_arr, labels_param=labels)
     n_labels = len(current_labels)
     label_to_ind = {label: i for i, label in enumerate(current_labels)}
 
-    cm = np.zeros((n_labels, n_labels), dtype=int)
+    true_idx = _remap_codes(true_codes, true_uniques, label_to_ind)
+    pred_idx = _remap_codes(pred_codes, pred_uniques, label_to_ind)
+    valid_mask = (true_idx >= 0) & (pred_idx >= 0)
 
-    for true_label_val, pred_label_val in zip(y_true_arr, y_pred_arr):
-        if pd.isna(true_label_val) or pd.isna(pred_label_val):
-            continue
-        true_idx = label_to_ind.get(true_label_val)
-        pred_idx = label_to_ind.get(pred_label_val)
+    flat_idx = true_idx[valid_mask] * n_labels + pred_idx[valid_mask]
+    cm = np.bincount(flat_idx, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+    return cm.astype(int, copy=False), current_labels
 
-        if true_idx is not None and pred_idx is not None:
-            cm[true_idx, pred_idx] += 1
+def confusion_matrix(y_true, y_pred, *, labels=None):
+    """
+    Computes the confusion matrix.
+    C[i, j] is the number of observations known to be in group i and predicted to be in group j.
+    Parameter 'labels' is keyword-only as in sklearn.
+    Labels are integer-encoded once and counted with a single bincount over true_idx * L + pred_idx;
+    pairs with a missing value (NaN mask) or a label outside 'labels' are not counted.
+    """
+    cm, _ = _labelled_confusion_matrix(y_true, y_pred, labels=labels)
     return cm
 
+def batched_confusion_matrices(true_codes, pred_codes, n_labels, *, executor=None):
+    """
+    Confusion matrices of one integer-coded reference vector against every column of a units x predictors
+    code matrix (-1 = missing), counted with a single bincount over predictor * L * L + true * L + pred.
+    Returns a predictors x L x L array; C[r, i, j] counts units with reference i predicted j by predictor r.
+    With an executor (see parallel.AnalysisExecutor), row blocks are counted in parallel and summed;
+    SparseCodes predictions are counted serially over their assigned codes.
+    """
+    true_codes = np.asarray(true_codes)
+    if isinstance(pred_codes, SparseCodes):
+        true_at = true_codes[pred_codes.row_ids]
+        valid = true_at >= 0
+        flat_idx = (pred_codes.indices[valid] * n_labels + true_at[valid]) * n_labels + pred_codes.data[valid]
+        cm = np.bincount(flat_idx, minlength=pred_codes.shape[1] * n_labels * n_labels)
+        return cm.reshape(pred_codes.shape[1], n_labels, n_labels).astype(int, copy=False)
+    if executor is not None:
+        return executor.sum_row_blocks(batched_confusion_matrices, (true_codes, pred_codes), n_labels)
+    pred_codes = np.asarray(pred_codes)
+    n_predictors = pred_codes.shape[1]
+    valid = (true_codes[:, None] >= 0) & (pred_codes >= 0)
+    predictor_idx = np.broadcast_to(np.arange(n_predictors), pred_codes.shape)[valid]
+    true_idx = np.broadcast_to(true_codes[:, None], pred_codes.shape)[valid]
+    flat_idx = (predictor_idx * n_labels + true_idx) * n_labels + pred_codes[valid]
+    cm = np.bincount(flat_idx, minlength=n_predictors * n_labels * n_labels)
+    return cm.reshape(n_predictors, n_labels, n_labels).astype(int, copy=False)
+
+class ConfusionStats:
+    """
+    Confusion matrix built once; accuracy, per-class and averaged P/R/F1 are derived views of it.
+    Values match precision_recall_fscore_support for the same labels and zero_division.
+    """
+
+    def __init__(self, matrix, labels, *, zero_division=0):
+        self.matrix = np.asarray(matrix)
+        self.labels = list(labels)
+        self.zero_division = 0.0 if zero_division == 'warn' else float(zero_division)
+
+    @classmethod
+    def from_labels(cls, y_true, y_pred, *, labels=None, zero_division=0):
+        """Builds the stats from two aligned label sequences (missing values are ignored)."""
+        cm, current_labels = _labelled_confusion_matrix(y_true, y_pred, labels=labels)
+        return cls(cm, current_labels, zero_division=zero_division)
+
+    @classmethod
+    def from_triples(cls, true_idx, pred_idx, counts, labels, *, zero_division=0):
+        """Builds the stats from the nonzero cells (true, pred, count) of the matrix over labels, without the
+        matrix itself (matrix is None); per-class counts are bincounts over the cells."""
+        stats = cls(None, labels, zero_division=zero_division)
+        stats.matrix = None
+        n_labels = len(stats.labels)
+        counts = np.asarray(counts)
+        on_diagonal = true_idx == pred_idx
+        stats.tp = np.bincount(true_idx[on_diagonal], weights=counts[on_diagonal], minlength=n_labels).astype(counts.dtype)
+        stats.support = np.bincount(true_idx, weights=counts, minlength=n_labels).astype(counts.dtype)
+        stats.predicted = np.bincount(pred_idx, weights=counts, minlength=n_labels).astype(counts.dtype)
+        stats.total = counts.sum()
+        return stats
+
+    def _safe_divide(self, numerator, denominator):
+        result = np.full(len(denominator), self.zero_division, dtype=float)
+        np.divide(numerator, denominator, out=result, where=denominator != 0)
+        return result
+
+    @cached_property
+    def tp(self):
+        return np.diag(self.matrix)
+
+    @cached_property
+    def support(self):
+        return np.sum(self.matrix, axis=1)
+
+    @cached_property
+    def predicted(self):
+        return np.sum(self.matrix, axis=0)
+
+    @cached_property
+    def total(self):
+        return np.sum(self.matrix)
+
+    @property
+    def accuracy(self):
+        """Share of counted pairs on the diagonal; 0.0 when nothing was counted."""
+        if self.total == 0:
+            return 0.0
+        return np.sum(self.tp) / self.total
+
+    @cached_property
+    def precision(self):
+        return self._safe_divide(self.tp, self.predicted)
+
+    @cached_property
+    def recall(self):
+        return self._safe_divide(self.tp, self.support)
+
+    @cached_property
+    def fscore(self):
+        return self._safe_divide(2 * self.precision * self.recall, self.precision + self.recall)
+
+    def average(self, average):
+        """(precision, recall, fscore, support) for 'micro', 'macro' or 'weighted'."""
+        zero_division_value = self.zero_division
+        support_total = np.sum(self.support)
+        if average == 'micro':
+            if self.total == 0:
+                return zero_division_value, zero_division_value, zero_division_value, support_total
+            acc_score = np.sum(self.tp) / self.total
+            return acc_score, acc_score, acc_score, support_total
+        elif average == 'macro':
+            if len(self.labels) == 0:
+                return zero_division_value, zero_division_value, zero_division_value, support_total
+            return np.mean(self.precision), np.mean(self.recall), np.mean(self.fscore), support_total
+        elif average == 'weighted':
+            if support_total == 0 or len(self.labels) == 0:
+                return zero_division_value, zero_division_value, zero_division_value, support_total
+            return (np.average(self.precision, weights=self.support),
+                    np.average(self.recall, weights=self.support),
+                    np.average(self.fscore, weights=self.support),
+                    support_total)
+        raise ValueError(f"Unsupported average type: {average}")
+
+    @property
+    def micro(self):
+        return self.average('micro')
+
+    @property
+    def macro(self):
+        return self.average('macro')
+
+    @property
+    def weighted(self):
+        return self.average('weighted')
+
 def accuracy_score(y_true, y_pred):
-""Computes the accuracy classification score."""
+    """Computes the accuracy classification score."""
     y_true_arr = np.asarray(y_true)
     y_pred_arr = np.asarray(y_pred)
 
@@ -55,19 +267,13 @@ def accuracy_score(y_true, y_pred):
     correct_predictions = np.sum(y_true_arr == y_pred_arr)
     return correct_predictions / len(y_true_arr)
 
-def _handle_metric_zero_division(value, zero_division_val):
-""Handles division by zero for P/R/F1 metrics by returning a specific value."""
-    if np.isinf(value) or np.isnan(value):
-        return float(zero_division_val)
-    return float(value)
-
 def precision_recall_fscore_support(y_true, y_pred, *, labels=None, pos_label=None, average=None,
                                     zero_division='warn'):
-""
+    """
     Computes precision, recall, F-measure and support for each class.
-labels', 'pos_label', 'average', 'zero_division' are keyword-only.
+    'labels', 'pos_label', 'average', 'zero_division' are keyword-only.
     Note: Script uses zero_division=0, sklearn default is 'warn'. This function respects passed 'zero_division'.
-""
+    """
     y_true_arr = np.asarray(y_true)
     y_pred_arr = np.asarray(y_pred)
 
@@ -82,83 +288,31 @@ labels', 'pos_label', 'average', 'zero_division' are keyword-only.
             return float(actual_zero_division_value), float(actual_zero_division_value), float(
                 actual_zero_division_value), 0
 
-    cm_val = confusion_matrix(y_true_arr, y_pred_arr, labels=present_labels)
+    stats = ConfusionStats.from_labels(y_true_arr, y_pred_arr, labels=present_labels,
+                                       zero_division=actual_zero_division_value)
     n_present_labels = len(present_labels)
+    precision_arr, recall_arr, fscore_arr, support = stats.precision, stats.recall, stats.fscore, stats.support
 
-    tp = np.diag(cm_val)
-    fp = np.sum(cm_val, axis=0) - tp
-    fn = np.sum(cm_val, axis=1) - tp
-    support = np.sum(cm_val, axis=1)
-
-    precision_arr = np.zeros(n_present_labels, dtype=float)
-    recall_arr = np.zeros(n_present_labels, dtype=float)
-    fscore_arr = np.zeros(n_present_labels, dtype=float)
-
-    for i in range(n_present_labels):
-        tp_i = tp[i]
-        denominator_precision = tp_i + fp[i]
-        if denominator_precision == 0:
-            precision_arr[i] = actual_zero_division_value
-        else:
-            precision_arr[i] = tp_i / denominator_precision
-        denominator_recall = support[i]
-        if denominator_recall == 0:
-            recall_arr[i] = actual_zero_division_value
-        else:
-            recall_arr[i] = tp_i / denominator_recall
-        denominator_fscore = precision_arr[i] + recall_arr[i]
-        if denominator_fscore == 0:
-            fscore_arr[i] = actual_zero_division_value
-        else:
-            fscore_arr[i] = (2 * precision_arr[i] * recall_arr[i]) / denominator_fscore
     if average == 'binary':
         if pos_label is None:
             if n_present_labels == 2:
                 pos_label_to_use = present_labels[1] if 1 not in present_labels or present_labels.index(1) == -1 else 1
             else:
                 raise ValueError(
-pos_label=None is not supported for multiclass; explicitly set pos_label for binary-like cases with >2 labels.")
+                    "pos_label=None is not supported for multiclass; explicitly set pos_label for binary-like cases with >2 labels.")
         else:
             pos_label_to_use = pos_label
 
         if pos_label_to_use not in present_labels:
             logging.warning(
-pos_label '{pos_label_to_use}' not found in actual labels {present_labels}. Metrics for it will be {actual_zero_division_value}.")
+                f"pos_label '{pos_label_to_use}' not found in actual labels {present_labels}. Metrics for it will be {actual_zero_division_value}.")
             return actual_zero_division_value, actual_zero_division_value, actual_zero_division_value, 0
 
         idx = present_labels.index(pos_label_to_use)
         return precision_arr[idx], recall_arr[idx], fscore_arr[idx], support[idx]
 
-    elif average == 'micro':
-        sum_cm_val = np.sum(cm_val)
-        if sum_cm_val == 0:
-            acc_score = actual_zero_division_value
-        else:
-            acc_score = np.sum(tp) / sum_cm_val
-        if sum_cm_val == 0:
-            acc_score = actual_zero_division_value
-        else:
-            acc_score_raw = np.sum(tp) / sum_cm_val
-            if np.isnan(acc_score_raw):
-                acc_score = actual_zero_division_value
-            else:
-                acc_score = acc_score_raw
-
-        return acc_score, acc_score, acc_score, np.sum(support)
-
-    elif average == 'macro':
-        if len(precision_arr) == 0:
-            return actual_zero_division_value, actual_zero_division_value, actual_zero_division_value, np.sum(
-                support)
-        return np.mean(precision_arr), np.mean(recall_arr), np.mean(fscore_arr), np.sum(support)
-
-    elif average == 'weighted':
-        if np.sum(support) == 0 or len(precision_arr) == 0:
-            return actual_zero_division_value, actual_zero_division_value, actual_zero_division_value, np.sum(support)
-        return (np.average(precision_arr, weights=support),
-                np.average(recall_arr, weights=support),
-                np.average(fscore_arr, weights=support),
-                np.sum(support))
+    elif average in ('micro', 'macro', 'weighted'):
+        return stats.average(average)
 
     elif average is None:
         return precision_arr, recall_arr, fscore_arr, support
@@ -184,7 +338,7 @@ def f1_score(y_true, y_pred, *, labels=None, pos_label=1, average='binary', zero
     return f1
 
 def cohen_kappa_score(y1, y2, *, labels=None):
-""Computes Cohen's kappa, a score that measures inter-rater agreement."""
+    """Computes Cohen's kappa, a score that measures inter-rater agreement."""
     y1_arr = np.asarray(y1)
     y2_arr = np.asarray(y2)
 
@@ -212,4 +366,301 @@ def cohen_kappa_score(y1, y2, *, labels=None):
         return 1.0 if abs(p_o - p_e) < 1e-12 else 0.0
 
     kappa = (p_o - p_e) / (1 - p_e)
-    return kappa
\ No newline at end of file
+    return kappa
+
+def confusion_triples(matrix):
+    """Nonzero cells of a confusion matrix as (true, pred, count) arrays, in row-major order."""
+    matrix = np.asarray(matrix)
+    true_idx, pred_idx = np.nonzero(matrix)
+    return true_idx, pred_idx, matrix[true_idx, pred_idx]
+
+def top_confusions(true_idx, pred_idx, counts, k):
+    """Positions of the k largest off-diagonal cells among confusion triples (ties by true, then predicted index)."""
+    off_diagonal = np.flatnonzero(true_idx != pred_idx)
+    order = np.lexsort((pred_idx[off_diagonal], true_idx[off_diagonal], -counts[off_diagonal]))
+    return off_diagonal[order[:k]]
+
+def cohen_kappa_from_confusion(matrices):
+    """
+    Cohen's kappa and overlap for a stack of ... x L x L confusion matrices (rater 1 on rows, rater 2 on columns).
+    Matches cohen_kappa_score on the counted units; kappa is NaN for empty matrices.
+    """
+    labelled = np.asarray(matrices, dtype=float)
+    overlap = labelled.sum(axis=(-2, -1))
+    agreement = np.trace(labelled, axis1=-2, axis2=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = np.asarray(overlap)[..., None]
+        p_o = agreement / overlap
+        p_e = np.sum((labelled.sum(axis=-1) / n) * (labelled.sum(axis=-2) / n), axis=-1)
+        kappa = np.asarray((p_o - p_e) / (1 - p_e))
+    degenerate = np.abs(1.0 - p_e) < 1e-12
+    kappa[degenerate] = np.where(np.abs(p_o - p_e) < 1e-12, 1.0, 0.0)[degenerate]
+    kappa[overlap == 0] = np.nan
+    return kappa, np.asarray(overlap).astype(int)
+
+class SparseCodes:
+    """
+    CSR layout of an integer-coded units x coders array that stores only assigned codes (no -1 cells).
+    Entries are sorted by unit, then coder; unit u owns entries indptr[u]:indptr[u + 1], with coder
+    indices[k] and code data[k]. Count builders accept it in place of the dense array and run in
+    O(assigned codes) instead of O(units x coders).
+    """
+
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = np.asarray(indptr, dtype=np.intp)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.data = np.asarray(data)
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_coo(cls, rows, cols, codes, shape):
+        """From (unit, coder, code) triples with unique (unit, coder) cells and codes >= 0."""
+        rows, cols = np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(shape[0] + 1, dtype=np.intp)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, cols[order], np.asarray(codes)[order], shape)
+
+    @classmethod
+    def from_dense(cls, codes):
+        codes = np.asarray(codes)
+        rows, cols = np.nonzero(codes >= 0)
+        return cls.from_coo(rows, cols, codes[rows, cols], codes.shape)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @property
+    def dtype(self):
+        return self.data.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    @cached_property
+    def row_ids(self):
+        """Unit of each entry."""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def to_dense(self):
+        dense = np.full(self.shape, -1, dtype=self.dtype)
+        dense[self.row_ids, self.indices] = self.data
+        return dense
+
+    def column(self, coder):
+        """Dense code vector of one coder over all units (-1 = missing)."""
+        in_column = self.indices == coder
+        column = np.full(self.shape[0], -1, dtype=self.dtype)
+        column[self.row_ids[in_column]] = self.data[in_column]
+        return column
+
+    def take_rows(self, rows):
+        """SparseCodes of the given units, in the given order."""
+        rows = np.asarray(rows, dtype=np.intp)
+        lengths = np.diff(self.indptr)[rows]
+        indptr = np.zeros(len(rows) + 1, dtype=np.intp)
+        np.cumsum(lengths, out=indptr[1:])
+        entries = np.repeat(self.indptr[rows] - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return SparseCodes(indptr, self.indices[entries], self.data[entries], (len(rows), self.shape[1]))
+
+    def take_columns(self, columns):
+        """SparseCodes with coder columns[j] as coder j (columns is a permutation of all coders)."""
+        new_index = np.empty(self.shape[1], dtype=np.intp)
+        new_index[np.asarray(columns, dtype=np.intp)] = np.arange(self.shape[1])
+        return SparseCodes.from_coo(self.row_ids, new_index[self.indices], self.data, self.shape)
+
+    def lookup(self, rows, cols):
+        """Codes at the given (unit, coder) cells, -1 where none is assigned."""
+        keys = self.row_ids * self.shape[1] + self.indices
+        query = np.asarray(rows, dtype=np.intp) * self.shape[1] + np.asarray(cols, dtype=np.intp)
+        position = np.minimum(np.searchsorted(keys, query), max(self.nnz - 1, 0))
+        found = (keys[position] == query) if self.nnz else np.zeros(len(query), dtype=bool)
+        return np.where(found, self.data[position] if self.nnz else -1, -1).astype(self.dtype, copy=False)
+
+    def with_cells(self, rows, cols, codes):
+        """New SparseCodes with the given cells set (overriding assigned ones); code -1 clears a cell."""
+        rows, cols, codes = (np.asarray(values, dtype=np.intp) for values in (rows, cols, codes))
+        keys = self.row_ids * self.shape[1] + self.indices
+        kept = ~np.isin(keys, rows * self.shape[1] + cols)
+        assigned = codes >= 0
+        return SparseCodes.from_coo(np.concatenate([self.row_ids[kept], rows[assigned]]),
+                                    np.concatenate([self.indices[kept], cols[assigned]]),
+                                    np.concatenate([self.data[kept], codes[assigned].astype(self.dtype)]), self.shape)
+
+class PairwiseContingency:
+    """
+    Contingency tables for every coder pair i <= j of an integer-coded units x coders array (-1 = missing),
+    counted in one bincount pass over chunks of units. counts[p, a, b] is the number of units where coder
+    rows[p] has slot a and coder cols[p] has slot b; slot n_labels stands for a missing label.
+    Cohen's kappa and overlap for all pairs are derived from the labelled block of the same counts.
+    """
+
+    def __init__(self, counts, rows, cols, n_coders, n_labels):
+        self.counts = np.asarray(counts)
+        self.rows = np.asarray(rows)
+        self.cols = np.asarray(cols)
+        self.n_coders = n_coders
+        self.n_labels = n_labels
+        self._pair_index = np.full((n_coders, n_coders), -1, dtype=np.intp)
+        self._pair_index[self.rows, self.cols] = np.arange(len(self.rows))
+        self._pair_index[self.cols, self.rows] = np.arange(len(self.rows))
+
+    @classmethod
+    def from_codes(cls, codes, n_labels, *, chunk_size=4096, executor=None):
+        """Counts all pairs; with an executor (see parallel.AnalysisExecutor), row blocks are counted in parallel.
+        codes may be SparseCodes, counted serially in O(assigned codes x coders per unit).
+        """
+        n_coders = codes.shape[1]
+        rows, cols = np.triu_indices(n_coders)
+        if isinstance(codes, SparseCodes):
+            return cls(_sparse_pair_counts(codes, n_labels), rows, cols, n_coders, n_labels)
+        codes = np.asarray(codes)
+        if executor is not None:
+            counts = executor.sum_row_blocks(_pair_counts, (codes,), n_labels, chunk_size)
+        else:
+            counts = _pair_counts(codes, n_labels, chunk_size)
+        return cls(counts, rows, cols, n_coders, n_labels)
+
+    def update(self, delta_counts):
+        """Adds a pairs x slots x slots count delta in place (e.g. rows re-counted after an edit)."""
+        self.counts += delta_counts
+        for derived in ('_pair_kappa', 'kappa', 'overlap'):
+            self.__dict__.pop(derived, None)
+
+    def pair(self, i, j):
+        """(n_labels + 1) x (n_labels + 1) table with coder i on the rows and coder j on the columns."""
+        table = self.counts[self._pair_index[i, j]]
+        return table if i <= j else table.T
+
+    @cached_property
+    def _pair_kappa(self):
+        return cohen_kappa_from_confusion(self.counts[:, :self.n_labels, :self.n_labels])
+
+    @cached_property
+    def kappa(self):
+        """coders x coders Cohen's kappa on each pair's overlapping units (NaN without overlap)."""
+        return self._pair_kappa[0][self._pair_index]
+
+    @cached_property
+    def overlap(self):
+        """coders x coders count of units labelled by both coders."""
+        return self._pair_kappa[1][self._pair_index]
+
+def _pair_counts(codes, n_labels, chunk_size=4096):
+    """pairs i <= j x (L + 1) x (L + 1) counts of PairwiseContingency, one bincount per row chunk."""
+    n_coders = codes.shape[1]
+    rows, cols = np.triu_indices(n_coders)
+    n_slots = n_labels + 1
+    pair_offsets = np.arange(len(rows)) * (n_slots * n_slots)
+    counts = np.zeros(len(rows) * n_slots * n_slots, dtype=np.int64)
+    for start in range(0, codes.shape[0], chunk_size):
+        block = codes[start:start + chunk_size]
+        slots = np.where(block >= 0, block, n_labels)
+        keys = slots[:, rows] * n_slots + slots[:, cols] + pair_offsets
+        counts += np.bincount(keys.ravel(), minlength=counts.size)
+    return counts.reshape(len(rows), n_slots, n_slots)
+
+def _sparse_pair_counts(codes, n_labels):
+    """_pair_counts for SparseCodes: labelled cells from the entry pairs within each unit, missing slots from margins."""
+    n_units, n_coders = codes.shape
+    rows, cols = np.triu_indices(n_coders)
+    n_slots = n_labels + 1
+    pair_index = np.zeros((n_coders, n_coders), dtype=np.intp)
+    pair_index[rows, cols] = np.arange(len(rows))
+    coder_label_counts = np.bincount(codes.indices * n_labels + codes.data,
+                                     minlength=n_coders * n_labels).reshape(n_coders, n_labels)
+    # Entries of a unit are sorted by coder, so an entry and one `offset` places later form a pair i < j.
+    unit_lengths = np.diff(codes.indptr)
+    entries_after = unit_lengths[codes.row_ids] - (np.arange(codes.nnz) - codes.indptr[codes.row_ids]) - 1
+    keys = []
+    for offset in range(1, int(unit_lengths.max(initial=0))):
+        first = np.flatnonzero(entries_after >= offset)
+        second = first + offset
+        pair = pair_index[codes.indices[first], codes.indices[second]]
+        keys.append((pair * n_slots + codes.data[first]) * n_slots + codes.data[second])
+    counts = np.bincount(np.concatenate(keys) if keys else np.zeros(0, dtype=np.intp),
+                         minlength=len(rows) * n_slots * n_slots).reshape(len(rows), n_slots, n_slots)
+    label_idx = np.arange(n_labels)
+    counts[pair_index[np.arange(n_coders), np.arange(n_coders)][:, None], label_idx, label_idx] = coder_label_counts
+    labelled = counts[:, :n_labels, :n_labels]
+    coder_totals = coder_label_counts.sum(axis=1)
+    counts[:, :n_labels, n_labels] = coder_label_counts[rows] - labelled.sum(axis=2)
+    counts[:, n_labels, :n_labels] = coder_label_counts[cols] - labelled.sum(axis=1)
+    counts[:, n_labels, n_labels] = n_units - coder_totals[rows] - coder_totals[cols] + labelled.sum(axis=(1, 2))
+    return counts
+
+def pairwise_cohen_kappa(codes, n_labels, *, chunk_size=4096):
+    """
+    Cohen's kappa for every pair of coders of an integer-coded units x coders array (-1 = missing).
+    Returns (kappa, overlap) as coders x coders arrays from one PairwiseContingency pass;
+    kappa follows cohen_kappa_score on each pair's overlapping units and is NaN without overlap.
+    """
+    contingency = PairwiseContingency.from_codes(codes, n_labels, chunk_size=chunk_size)
+    return contingency.kappa, contingency.overlap
+
+class CoincidenceCounts:
+    """
+    Mergeable counts behind nominal Krippendorff's alpha. For units with m values, by_pairable[m] sums
+    n_u n_u^T - diag(n_u) over the units' label counts n_u, so the coincidence matrix is
+    sum_m by_pairable[m] / (m - 1) over m >= 2. Integer counts add up exactly across shards and edits.
+    label_totals and units_with_values count all values/units, including units that are not pairable.
+    """
+
+    def __init__(self, by_pairable, label_totals, units_with_values):
+        self.by_pairable = np.asarray(by_pairable)
+        self.label_totals = np.asarray(label_totals)
+        self.units_with_values = int(units_with_values)
+
+    @classmethod
+    def from_value_counts(cls, value_counts, max_values):
+        """value_counts: units x labels counts of assigned values; max_values: the number of coders."""
+        value_counts = np.asarray(value_counts, dtype=np.int64)
+        n_labels = value_counts.shape[1]
+        values_per_unit = value_counts.sum(axis=1)
+        by_pairable = np.zeros((max_values + 1, n_labels, n_labels), dtype=np.int64)
+        for m in np.unique(values_per_unit[values_per_unit > 1]):
+            unit_counts = value_counts[values_per_unit == m]
+            by_pairable[m] = unit_counts.T @ unit_counts - np.diag(unit_counts.sum(axis=0))
+        return cls(by_pairable, value_counts.sum(axis=0), int((values_per_unit > 0).sum()))
+
+    def update(self, other, sign=1):
+        """Adds (sign=1) or subtracts (sign=-1) counts over the same labels and coders in place."""
+        self.by_pairable += sign * other.by_pairable
+        self.label_totals += sign * other.label_totals
+        self.units_with_values += sign * other.units_with_values
+
+    def alpha(self):
+        """Nominal alpha; raises ValueError like the krippendorff package for a single label or no pairable unit,
+        and where alpha is undefined (0/0) because the pairable units show a single label between them."""
+        n_labels = self.label_totals.shape[0]
+        if n_labels < 2:
+            raise ValueError("There has to be more than one value in the domain.")
+        if not self.by_pairable[2:].any():
+            raise ValueError("There has to be at least one unit with values assigned by at least two coders.")
+        weights = 1.0 / np.maximum(np.arange(self.by_pairable.shape[0]) - 1, 1)
+        weights[:2] = 0.0
+        coincidences = np.tensordot(weights, self.by_pairable, axes=1)
+        n_v = coincidences.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = (np.outer(n_v, n_v) - np.diag(n_v)) / (n_v.sum() - 1)
+        disagreement = 1.0 - np.eye(n_labels)
+        expected_disagreement = (expected * disagreement).sum()
+        if not np.isfinite(expected_disagreement) or expected_disagreement == 0:
+            raise ValueError("Expected disagreement is zero: the pairable units use a single value.")
+        return float(1 - (coincidences * disagreement).sum() / expected_disagreement)
+
+def krippendorff_alpha_nominal(codes, n_labels):
+    """
+    Krippendorff's alpha (nominal) for an integer-coded units x coders array (-1 = missing).
+    The coincidence matrix is built from per-unit value counts (see CoincidenceCounts); units with
+    fewer than two values are not pairable and are left out, as in the krippendorff package.
+    """
+    if n_labels < 2:
+        raise ValueError("There has to be more than one value in the domain.")
+    codes = np.asarray(codes)
+    n_units = codes.shape[0]
+    valid = codes >= 0
+    unit_idx = np.broadcast_to(np.arange(n_units)[:, None], codes.shape)[valid]
+    value_counts = np.bincount(unit_idx * n_labels + codes[valid], minlength=n_units * n_labels)
+    return CoincidenceCounts.from_value_counts(value_counts.reshape(n_units, n_labels), codes.shape[1]).alpha()
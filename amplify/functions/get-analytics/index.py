@@ -3,232 +3,227 @@ Analytics (Python)
  - Consumes normalized annotation data
  - Produces reliability metrics and per-run evaluations
  - Keep pure/data-oriented; avoid side effects outside logging
+ - The core (ingestion, counts, scalar metrics, partial aggregates) runs on NumPy arrays; pandas is imported
+   only by the functions building DataFrame outputs, so pandas-free requests skip its import time
 """
-import pandas as pd
+from __future__ import annotations
 import numpy as np
 import logging
-from collections import defaultdict
+import os
+import sys
 import itertools
-from fklearn import cohen_kappa_score
-from fklearn import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-from fklearn import precision_recall_fscore_support
-import krippendorff
+import zlib
+from collections import Counter, OrderedDict
+from functools import cached_property
+from fklearn import encode_labels, factorize, index_of, pairwise_cohen_kappa
+from fklearn import ConfusionStats, PairwiseContingency, CoincidenceCounts, batched_confusion_matrices
+from fklearn import cohen_kappa_from_confusion, confusion_triples, top_confusions, SparseCodes
+from annotation_table import AnnotationTable, build_annotation_table, dense_codes, run_column_name
+from annotation_table import run_column_positions, select_latest_annotations
+from view_input import DecodedView, decode_view, is_view_reference, load_view_reference
+from artifacts import TableArtifactWriter, artifact_dir
+from result_cache import ResultCache, cache_key, code_version
+from parallel import analysis_executor
+from profiling import profiled, profiling_active, profiling_requested, record_dimensions, span
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    import pandas as pd
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+RESULT_CACHE = ResultCache.from_environment()
+CODE_VERSION = code_version()
+VIEW_STATISTICS = OrderedDict()
+VIEW_STATISTICS_MAX_VIEWS = 8
 def process_image_annotations(data: dict) -> tuple[pd.DataFrame, list[str]]:
     """Builds wide overview (one row per file) and list of run names.
-    Uses latest annotation per file per run.
+    Uses latest annotation per file per run (see annotation_table.build_annotation_table).
     """
-    if not data or 'result' not in data:
-        logging.error("Invalid data structure: 'result' key missing or data is empty for processing annotations.")
-        return pd.DataFrame(), []
+    table = build_annotation_table(data)
+    return table.to_overview_frame(), table.run_names
 
-    files_data_list = data['result'].get('files', [])
-    classifications_data = data['result'].get('classifications', [])
+MAJORITY_TIE_BREAKS = ('first', 'last', 'abstain')
 
-    if not classifications_data:
-        logging.warning("No 'classifications' (runs/coder annotations) found in 'result.classifications' array.")
+def resolve_majority_tie_break(tie_break: str = None) -> str:
+    """How tied majority votes are decided for majorityTieBreak (default 'first', see majority_codes_from_votes)."""
+    if tie_break is None: return 'first'
+    if tie_break not in MAJORITY_TIE_BREAKS:
+        logging.warning(f"Unknown majorityTieBreak {tie_break!r}, falling back to 'first'.")
+        return 'first'
+    return tie_break
 
-    file_id_to_name = {
-        f['file']['id']: f['file']['name']
-        for f in files_data_list
-        if isinstance(f.get('file'), dict) and f['file'].get('id') and f['file'].get('name')
-    }
-    all_file_ids_from_files_list = set(file_id_to_name.keys())
-    annotations_by_run = defaultdict(dict)
-    unique_run_names = []
-
-    for class_run in classifications_data:
-        run_name = class_run.get('name')
-        if not run_name:
-            logging.warning("A classification run was found without a 'name'. Skipping this run.")
-            continue
-        if run_name not in unique_run_names:
-            unique_run_names.append(run_name)
-        results_in_run = class_run.get('results', [])
-        if not results_in_run: continue
-        current_run_annotations_with_ts = {}
-        for annotation_result in results_in_run:
-            file_id = annotation_result.get('fileId')
-            label_obj = annotation_result.get('label')
-            annotation_ts = annotation_result.get('createdAt')
-            if not all([file_id, label_obj, isinstance(label_obj, dict), label_obj.get('name'), annotation_ts]):
-                logging.warning(f"Skipping incomplete annotation data in run '{run_name}'. Data: {annotation_result}")
-                continue
-            label_name_val = label_obj['name']
-            if file_id in current_run_annotations_with_ts:
-                _, existing_ts = current_run_annotations_with_ts[file_id]
-                if annotation_ts > existing_ts:
-                    current_run_annotations_with_ts[file_id] = (label_name_val, annotation_ts)
-            else:
-                current_run_annotations_with_ts[file_id] = (label_name_val, annotation_ts)
-        for f_id, (lbl, _) in current_run_annotations_with_ts.items():
-            annotations_by_run[run_name][f_id] = lbl
-
-    overview_list = []
-    all_annotated_file_ids_in_runs = set()
-    for run_specific_annotations in annotations_by_run.values():
-        all_annotated_file_ids_in_runs.update(run_specific_annotations.keys())
-    comprehensive_file_ids = sorted(list(all_file_ids_from_files_list.union(all_annotated_file_ids_in_runs)))
-    for file_id in comprehensive_file_ids:
-        row_data = {'file_id': file_id, 'file_name': file_id_to_name.get(file_id, "N/A - Not in main files list")}
-        for run_name in unique_run_names:
-            col_name = f'label_{run_name.replace(" ", "_").replace("-", "_")}'
-            row_data[col_name] = annotations_by_run.get(run_name, {}).get(file_id, np.nan)
-        overview_list.append(row_data)
-    overview_df = pd.DataFrame(overview_list)
-    if not overview_df.empty:
-        label_cols_from_runs = sorted([f'label_{rn.replace(" ", "_").replace("-", "_")}' for rn in unique_run_names if
-label_{rn.replace(" ", "_").replace("-", "_")}' in overview_df.columns])
-        column_order = ['file_id', 'file_name'] + label_cols_from_runs
-        column_order = [col for col in column_order if col in overview_df.columns]
-        overview_df = overview_df[column_order]
-    unique_run_names.sort()
-    return overview_df, unique_run_names
-
-def create_long_format_annotations(overview_df: pd.DataFrame,
-                                   task_name: str = "Primary_Annotation_Task") -> pd.DataFrame:
-    """Converts wide run columns to long format for downstream matrices."""
-    if overview_df.empty: return pd.DataFrame()
-    id_vars = ['file_id', 'file_name']
-    id_vars = [col for col in id_vars if col in overview_df.columns]
-    if not id_vars:
-        logging.warning("Cannot create long format: 'file_id' or 'file_name' missing in overview_df.")
-        return pd.DataFrame()
-    value_vars = [col for col in overview_df.columns if col.startswith('label_')]
-    if not value_vars:
-        logging.warning("No label columns found in overview_df for long format.")
-        return pd.DataFrame()
-    long_df = pd.melt(overview_df, id_vars=id_vars, value_vars=value_vars, var_name='coder_temp', value_name='value')
-    long_df['coder'] = long_df['coder_temp'].str.replace('label_', '', regex=False).str.replace('_', ' ', regex=True)
-    long_df['from_name'] = task_name
-    final_columns = ['file_id', 'file_name', 'coder', 'from_name', 'value']
-    existing_final_columns = [col for col in final_columns if col in long_df.columns]
-    return long_df[existing_final_columns]
-
-def create_inter_coder_style_contingency_matrix(long_format_df: pd.DataFrame,
-                                                identifier_col: str = 'file_id',
-                                                coder_col: str = 'coder',
-                                                value_col: str = 'value') -> pd.DataFrame:
-    """Builds file-by-coder table of labels; one label per file/coder."""
-    if long_format_df.empty or not all(col in long_format_df.columns for col in [identifier_col, coder_col, value_col]):
-        logging.warning("Inter-coder matrix: Input DataFrame is empty or missing required columns.")
-        return pd.DataFrame()
-    try:
-        contingency_matrix = pd.crosstab(index=long_format_df[identifier_col],
-                                         columns=long_format_df[coder_col],
-                                         values=long_format_df[value_col],
-                                         aggfunc='first',
-                                         dropna=False)
-        all_file_ids = sorted(long_format_df[identifier_col].unique())
-        contingency_matrix = contingency_matrix.reindex(all_file_ids).sort_index(axis=1)
-        return contingency_matrix
-    except Exception as e:
-        logging.error(f"Error creating inter-coder style contingency matrix: {e}")
-        return pd.DataFrame()
+def count_label_votes(codes: np.ndarray | SparseCodes, n_labels: int) -> np.ndarray:
+    """Vote-count matrix (rows x labels) for a coded rows x coders array; -1 codes cast no vote."""
+    n_rows = codes.shape[0]
+    if isinstance(codes, SparseCodes):
+        return np.bincount(codes.row_ids * n_labels + codes.data,
+                           minlength=n_rows * n_labels).reshape(n_rows, n_labels)
+    valid = codes >= 0
+    row_idx = np.broadcast_to(np.arange(n_rows)[:, None], codes.shape)[valid]
+    return np.bincount(row_idx * n_labels + codes[valid], minlength=n_rows * n_labels).reshape(n_rows, n_labels)
 
-def calculate_majority_decision(inter_coder_matrix: pd.DataFrame) -> pd.Series:
-    """Row-wise mode; ties resolved by first occurrence."""
-    if inter_coder_matrix.empty: return pd.Series(dtype='object')
-    modes = inter_coder_matrix.mode(axis=1, dropna=True)
-    if modes.empty:
-        return pd.Series(index=inter_coder_matrix.index, dtype='object')
-    majority_decision = modes.iloc[:, 0]
-    majority_decision = majority_decision.reindex(inter_coder_matrix.index)
-    all_nan_rows = inter_coder_matrix.isnull().all(axis=1)
-    majority_decision[all_nan_rows] = np.nan
-    return majority_decision
+def majority_codes_from_votes(vote_counts: np.ndarray, tie_break: str = 'first') -> np.ndarray:
+    """Most voted label code per row; -1 for rows without votes.
+    tie_break: 'first' -> smallest code among the tied labels (as DataFrame.mode, the default),
+    'last' -> largest tied code, 'abstain' -> -1 (no decision) for tied rows.
+    """
+    if tie_break not in MAJORITY_TIE_BREAKS:
+        raise ValueError(f"tie_break must be one of {MAJORITY_TIE_BREAKS}, got {tie_break!r}.")
+    n_rows, n_labels = vote_counts.shape
+    if not n_labels: return np.full(n_rows, -1, dtype=np.intp)
+    if tie_break == 'last':
+        majority_codes = n_labels - 1 - np.argmax(vote_counts[:, ::-1], axis=1)
+    else:
+        majority_codes = np.argmax(vote_counts, axis=1)
+    top_votes = vote_counts[np.arange(n_rows), majority_codes]
+    majority_codes[top_votes == 0] = -1
+    if tie_break == 'abstain':
+        majority_codes[(vote_counts == top_votes[:, None]).sum(axis=1) > 1] = -1
+    return majority_codes
+
+def calculate_majority_codes(codes: np.ndarray, n_labels: int, tie_break: str = 'first') -> np.ndarray:
+    """Most frequent label code per row of a coded files x coders array; -1 for rows without votes.
+    Ties go to the smallest code, i.e. the first label in sort order (as DataFrame.mode), unless tie_break says otherwise.
+    """
+    return majority_codes_from_votes(count_label_votes(codes, n_labels), tie_break)
+
+def leave_one_out_majority_codes(codes: np.ndarray | SparseCodes, vote_counts: np.ndarray,
+                                 tie_break: str = 'first', chunk_size: int = 4096) -> np.ndarray:
+    """
+    Majority decision of the other coders for every cell of a coded rows x coders array, from the rows' vote
+    counts (count_label_votes of codes): rows x coders codes, -1 where the others cast no vote or tie under
+    'abstain'. A coder's own vote can only change the decision where its label is among the row's top-voted
+    labels; elsewhere the others' majority is the row's majority. Those cells are decided together on their
+    vote rows minus the own vote, chunk_size cells at a time.
+    """
+    codes = dense_codes(codes)
+    n_rows, n_coders = codes.shape
+    consensus = np.repeat(majority_codes_from_votes(vote_counts, tie_break)[:, None], n_coders, axis=1)
+    if not n_rows or not vote_counts.shape[1]: return consensus
+    rows, coders = np.nonzero(codes >= 0)
+    own_codes = codes[rows, coders]
+    top_votes = vote_counts.max(axis=1)
+    own_vote_matters = vote_counts[rows, own_codes] == top_votes[rows]
+    rows, coders, own_codes = rows[own_vote_matters], coders[own_vote_matters], own_codes[own_vote_matters]
+    for start in range(0, len(rows), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        other_votes = vote_counts[rows[chunk]]
+        other_votes[np.arange(len(other_votes)), own_codes[chunk]] -= 1
+        consensus[rows[chunk], coders[chunk]] = majority_codes_from_votes(other_votes, tie_break)
+    return consensus
+
+def summarize_votes(vote_counts: np.ndarray) -> dict:
+    """Per-row vote statistics: votes for the top label, total votes, vote share (top / total, NaN
+    without votes) and margin (top minus runner-up votes; 0 on ties)."""
+    n_rows, n_labels = vote_counts.shape
+    total_votes = vote_counts.sum(axis=1)
+    if n_labels >= 2:
+        runner_up_and_top = np.partition(vote_counts, n_labels - 2, axis=1)[:, -2:]
+        runner_up_votes, top_votes = runner_up_and_top[:, 0], runner_up_and_top[:, 1]
+    else:
+        top_votes = vote_counts.max(axis=1) if n_labels else np.zeros(n_rows, dtype=np.intp)
+        runner_up_votes = np.zeros(n_rows, dtype=np.intp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vote_share = np.where(total_votes > 0, top_votes / total_votes, np.nan)
+    return {'majority_votes': top_votes, 'total_votes': total_votes, 'vote_share': vote_share,
+            'vote_margin': top_votes - runner_up_votes}
+
+def majority_decision_frames(table: AnnotationTable, vote_counts: np.ndarray,
+                             majority_codes: np.ndarray) -> tuple[pd.Series, pd.DataFrame]:
+    """Majority decision Series and per-file vote support frame for the overview files.
+    vote_counts/majority_codes are over table.inter_coder_codes rows; both outputs are empty without runs.
+    """
+    import pandas as pd
+    if not table.in_overview.any() or not table.run_columns: return pd.Series(dtype='object'), pd.DataFrame()
+    overview_index = pd.Index(table.file_ids[table.in_overview], name='file_id')
+    majority_s = pd.Series(table.decode(majority_codes), index=overview_index, dtype='object')
+    confidence_df = pd.DataFrame({'majority_label': majority_s, **summarize_votes(vote_counts)}, index=overview_index)
+    return majority_s, confidence_df
+
+def calculate_majority_decision(table: AnnotationTable, tie_break: str = 'first') -> pd.Series:
+    """Row-wise mode over the runs of each overview file; ties resolved by tie_break (label sort order by default)."""
+    vote_counts = count_label_votes(table.inter_coder_codes, table.n_labels)
+    return majority_decision_frames(table, vote_counts, majority_codes_from_votes(vote_counts, tie_break))[0]
 
 def extract_gold_standard_labels(data: dict, file_id_col_name: str = 'file_id',
                                  gold_label_col_name: str = 'Gold_Standard_Label') -> pd.DataFrame:
     """Extracts optional gold labels from input structure if present."""
-    if not data or 'result' not in data or 'files' not in data['result']:
-        logging.warning("Gold standard: 'result' or 'result.files' missing in data.")
-        return pd.DataFrame(columns=[file_id_col_name, gold_label_col_name])
-    gold_labels_list = []
-    for file_info_wrapper in data['result']['files']:
-        file_item = file_info_wrapper.get('file')
-        if not isinstance(file_item, dict):
-            logging.warning(f"Skipping gold file item, expected dict, got {type(file_item)}: {file_info_wrapper}")
-            continue
-        file_id = file_item.get('id')
-        label_data = file_info_wrapper.get('label')
-        if file_id and label_data and isinstance(label_data, dict) and 'name' in label_data:
-            gold_labels_list.append({file_id_col_name: file_id, gold_label_col_name: label_data['name']})
-        elif file_id:
-            gold_labels_list.append({file_id_col_name: file_id, gold_label_col_name: np.nan})
-        else:
-            logging.warning(f"Skipping gold standard entry due to missing file_id: {file_info_wrapper}")
+    return gold_standard_frame(extract_gold_standard_pairs(data), file_id_col_name, gold_label_col_name)
+
+def gold_standard_frame(gold_pairs: list, file_id_col_name: str = 'file_id',
+                        gold_label_col_name: str = 'Gold_Standard_Label') -> pd.DataFrame:
+    import pandas as pd
+    if not gold_pairs: return pd.DataFrame(columns=[file_id_col_name, gold_label_col_name])
+    return pd.DataFrame([{file_id_col_name: file_id, gold_label_col_name: label} for file_id, label in gold_pairs])
+
+def extract_gold_standard_pairs(data: dict | DecodedView) -> list:
+    """(file_id, gold label) per listed file in file order, without pandas; the label is NaN if the file has none."""
+    gold_labels_list = decode_view(data).gold_pairs
     if not gold_labels_list:
         logging.info("No gold standard labels found or extracted.")
-        return pd.DataFrame(columns=[file_id_col_name, gold_label_col_name])
-    return pd.DataFrame(gold_labels_list)
+    return gold_labels_list
+
+def format_pairwise_kappa(kappa_matrix: np.ndarray, overlap_matrix: np.ndarray, rater_names: list,
+                          task_name_for_output: str) -> pd.DataFrame:
+    """One row per rater pair (upper triangle of raters x raters kappa/overlap); Kappa is NaN where overlap < 2."""
+    import pandas as pd
+    raters = pd.Index(rater_names)
+    rows_idx, cols_idx = np.triu_indices(len(raters), k=1)
+    overlap_counts = overlap_matrix[rows_idx, cols_idx]
+    # Pairs where both raters used one and the same label resolve to 1.0 via the p_e == 1 rule.
+    kappas = kappa_matrix[rows_idx, cols_idx]
+    insufficient_overlap = overlap_counts < 2
+    kappas[insufficient_overlap] = np.nan
+    for i in np.flatnonzero(insufficient_overlap):
+        logging.info(
+            f"Skipping Kappa for {raters[rows_idx[i]]} vs {raters[cols_idx[i]]} due to insufficient overlap ({overlap_counts[i]} items).")
+    return pd.DataFrame({
+        "Coder 1": raters[rows_idx], "Coder 2": raters[cols_idx],
+        "Kappa": kappas, "Overlap": overlap_counts,
+        "Coding": task_name_for_output
+    })
+
+def calculate_pairwise_kappa_from_codes(codes: np.ndarray, n_labels: int, rater_names: list,
+                                       task_name_for_output: str) -> pd.DataFrame:
+    """Computes Cohen's Kappa for all pairs of columns of a coded units x raters array where overlap >= 2."""
+    import pandas as pd
+    if codes.shape[0] == 0 or codes.shape[1] < 2:
+        logging.info(f"Kappa: Matrix for '{task_name_for_output}' is empty or has fewer than 2 raters.")
+        return pd.DataFrame()
+    kappa_matrix, overlap_matrix = pairwise_cohen_kappa(codes, n_labels)
+    return format_pairwise_kappa(kappa_matrix, overlap_matrix, rater_names, task_name_for_output)
 
 def calculate_pairwise_kappa(matrix_for_kappa: pd.DataFrame, task_name_for_output: str) -> pd.DataFrame:
-    """Computes Cohen's Kappa for all coder pairs where overlap >= 2."""
+    """Computes Cohen's Kappa for all coder pairs (DataFrame columns) where overlap >= 2."""
+    import pandas as pd
     if matrix_for_kappa.empty or matrix_for_kappa.shape[1] < 2:
         logging.info(f"Kappa: Matrix for '{task_name_for_output}' is empty or has fewer than 2 raters.")
         return pd.DataFrame()
-    raters = matrix_for_kappa.columns
-    kappa_scores = []
-    for i in range(len(raters)):
-        for j in range(i + 1, len(raters)):
-            rater1_name, rater2_name = raters[i], raters[j]
-            pair_data = matrix_for_kappa[[rater1_name, rater2_name]].dropna(how='any')
-            kappa = np.nan
-            overlap_count = len(pair_data)
-            if overlap_count >= 2:
-                series1 = pair_data[rater1_name]
-                series2 = pair_data[rater2_name]
-                try:
-                    if series1.nunique() == 1 and series2.nunique() == 1 and series1.iloc[0] == series2.iloc[0]:
-                        kappa = 1.0
-                    else:
-                        kappa = cohen_kappa_score(series1, series2)
-                except ValueError as ve:
-                    logging.warning(
-ValueError calculating Kappa for {rater1_name} vs {rater2_name} (overlap {overlap_count}): {ve}.")
-                except Exception as e:
-                    logging.error(f"Unexpected error in Kappa for {rater1_name} vs {rater2_name}: {e}")
-            else:
-                logging.info(
-Skipping Kappa for {rater1_name} vs {rater2_name} due to insufficient overlap ({overlap_count} items).")
-            kappa_scores.append({
-Coder 1": rater1_name, "Coder 2": rater2_name,
-Kappa": kappa, "Overlap": overlap_count,
-Coding": task_name_for_output
-            })
-    return pd.DataFrame(kappa_scores)
-
-def convert_to_reliability_data(matrix: pd.DataFrame) -> list:
-    if matrix.empty: return []
-    return [matrix[coder].tolist() for coder in matrix.columns]
-
-def create_run_comparison_contingency_matrix(overview_df: pd.DataFrame, run_name_1: str,
-                                             run_name_2: str) -> pd.DataFrame:
-    """Cross-tab between two runs (labels vs labels)."""
-    col1_sanitized = f'label_{run_name_1.replace(" ", "_").replace("-", "_")}'
-    col2_sanitized = f'label_{run_name_2.replace(" ", "_").replace("-", "_")}'
-    if col1_sanitized not in overview_df.columns:
-        logging.warning(f"Run comparison: Column for run '{run_name_1}' (sanitized: '{col1_sanitized}') not found.")
-        return pd.DataFrame({'error': [f"Data for run '{run_name_1}' not found."]})
-    if col2_sanitized not in overview_df.columns:
-        logging.warning(f"Run comparison: Column for run '{run_name_2}' (sanitized: '{col2_sanitized}') not found.")
-        return pd.DataFrame({'error': [f"Data for run '{run_name_2}' not found."]})
-    series1 = overview_df[col1_sanitized]
-    series2 = overview_df[col2_sanitized]
-    series1.name = run_name_1
-    series2.name = run_name_2
-    common_annotations = overview_df[[col1_sanitized, col2_sanitized]].dropna(how='any')
-    if common_annotations.empty:
+    codes, labels = encode_labels(matrix_for_kappa.to_numpy())
+    return calculate_pairwise_kappa_from_codes(codes, len(labels), list(matrix_for_kappa.columns), task_name_for_output)
+
+def create_run_comparison_contingency_matrix(table: AnnotationTable, run_name_1: str,
+                                             run_name_2: str, sparse: bool = False) -> pd.DataFrame:
+    """Cross-tab between two runs (labels vs labels) over the overview files, read from table.run_pair_contingency.
+    As pd.crosstab(..., dropna=False): rows/columns are the labels each run used, plus NaN if it has gaps.
+    sparse returns the nonzero cells instead, one row each: run_name_1 label, run_name_2 label, 'Count'.
+    """
+    import pandas as pd
+    counts = table.run_pair_contingency.pair(table.run_column_index(run_name_1), table.run_column_index(run_name_2))
+    if not counts[:table.n_labels, :table.n_labels].any():
         logging.info(f"No items commonly annotated by both runs: '{run_name_1}' and '{run_name_2}'.")
         return pd.DataFrame({'status': ["No items commonly annotated by both runs."]})
-    try:
-        return pd.crosstab(series1, series2, dropna=False)
-    except Exception as e:
-        logging.error(f"Crosstab error between '{run_name_1}' and '{run_name_2}': {e}")
-        return pd.DataFrame({'error': [f"Crosstab error: {e}"]})
+    if sparse:
+        rows, cols, cell_counts = confusion_triples(counts)
+        return pd.DataFrame({run_name_1: table.decode(np.where(rows < table.n_labels, rows, -1)),
+                             run_name_2: table.decode(np.where(cols < table.n_labels, cols, -1)),
+                             'Count': cell_counts})
+    rows, cols = np.flatnonzero(counts.sum(axis=1)), np.flatnonzero(counts.sum(axis=0))
+    return pd.DataFrame(counts[np.ix_(rows, cols)],
+                        index=pd.Index(table.decode(np.where(rows < table.n_labels, rows, -1)), name=run_name_1),
+                        columns=pd.Index(table.decode(np.where(cols < table.n_labels, cols, -1)), name=run_name_2))
+
 def format_data_value(val):
     """Coerce numpy/scalar types to JSON-serializable primitives."""
+    import pandas as pd
     if pd.isna(val): return None
     if isinstance(val, (np.integer)): return int(val)
     if isinstance(val, (np.floating)): return float(val)
@@ -236,56 +231,97 @@ def format_data_value(val):
     if isinstance(val, (int, float, bool, str)): return val
     return str(val)
 
-def calculate_ml_metrics_package(y_true: pd.Series, y_pred: pd.Series, true_label_name: str = "True Labels",
-                                 pred_label_name: str = "Predicted Labels") -> dict:
-    """Compute accuracy, per-class metrics and confusion matrix."""
-    results_package = {
-global_metrics_df": pd.DataFrame(),
-per_class_metrics": [],
-confusion_matrix_df": pd.DataFrame(),
-log_messages": []
-    }
+def calculate_ml_metrics_package_from_codes(true_codes: np.ndarray, pred_codes: np.ndarray, labels: list,
+                                            true_label_name: str = "True Labels",
+                                            pred_label_name: str = "Predicted Labels") -> dict:
+    """Compute accuracy, per-class metrics and confusion matrix for two coded label vectors (-1 = missing)."""
+    n_labels = len(labels)
+    both_present = (true_codes >= 0) & (pred_codes >= 0)
+    true_clean, pred_clean = true_codes[both_present], pred_codes[both_present]
+    full_cm = np.bincount(true_clean * n_labels + pred_clean, minlength=n_labels * n_labels).reshape(n_labels, n_labels)
+    return calculate_ml_metrics_package_from_confusion(full_cm, labels, true_label_name, pred_label_name)
 
-    comparison_df = pd.DataFrame({'true': y_true, 'pred': y_pred}).dropna()
-    y_true_clean = comparison_df['true']
-    y_pred_clean = comparison_df['pred']
+CONFUSION_FORMATS = ('auto', 'dense', 'sparse')
+DENSE_CONFUSION_MAX_LABELS_ENV = "ANALYTICS_DENSE_CONFUSION_MAX_LABELS"
+DEFAULT_DENSE_CONFUSION_MAX_LABELS = 50
+DEFAULT_TOP_CONFUSIONS = 10
 
-    if y_true_clean.empty:
-        results_package["log_messages"].append(
-ML Metrics: No overlapping non-missing data for '{true_label_name}' vs '{pred_label_name}'.")
-        return results_package
+def resolve_confusion_format(confusion_format: str, n_labels: int) -> str:
+    """'dense' or 'sparse' confusion output for confusionFormat (default 'auto'); 'auto' is sparse for more than
+    ANALYTICS_DENSE_CONFUSION_MAX_LABELS labels, where L x L tables and per-label entries dominate the response."""
+    confusion_format = confusion_format or 'auto'
+    if confusion_format not in CONFUSION_FORMATS:
+        logging.warning(f"Unknown confusionFormat '{confusion_format}', falling back to 'auto'.")
+        confusion_format = 'auto'
+    if confusion_format != 'auto': return confusion_format
+    max_labels = int(os.environ.get(DENSE_CONFUSION_MAX_LABELS_ENV, DEFAULT_DENSE_CONFUSION_MAX_LABELS))
+    return 'sparse' if n_labels > max_labels else 'dense'
+
+def resolve_top_confusions(top_confusions) -> int:
+    """Number of most frequent confusions to report for topConfusions (default DEFAULT_TOP_CONFUSIONS)."""
+    if top_confusions is None: return DEFAULT_TOP_CONFUSIONS
+    if isinstance(top_confusions, bool) or not isinstance(top_confusions, int) or top_confusions < 0:
+        logging.warning(f"Invalid topConfusions {top_confusions!r}, falling back to {DEFAULT_TOP_CONFUSIONS}.")
+        return DEFAULT_TOP_CONFUSIONS
+    return top_confusions
 
-    all_present_labels = pd.concat([y_true_clean, y_pred_clean]).unique()
-    unique_labels = sorted([label for label in all_present_labels if pd.notna(label)])
+def calculate_ml_metrics_package_from_confusion(full_cm: np.ndarray, labels: list,
+                                                true_label_name: str = "True Labels",
+                                                pred_label_name: str = "Predicted Labels",
+                                                confusion_format: str = 'dense',
+                                                top_k: int = DEFAULT_TOP_CONFUSIONS) -> dict:
+    """Metrics package from an L x L confusion matrix over all labels; labels absent from both sides are dropped.
+    confusion_format 'sparse' leaves per_class_metrics and confusion_matrix_df empty and adds per_class_metrics_df
+    (one row per label), confusion_triples_df (nonzero cells only) and top_confusions_df (the top_k most
+    frequent off-diagonal cells), so the package grows with the labels in use rather than their square.
+    """
+    import pandas as pd
+    sparse = confusion_format == 'sparse'
+    results_package = {
+        "global_metrics_df": pd.DataFrame(),
+        "per_class_metrics": [],
+        "confusion_matrix_df": pd.DataFrame(),
+        "log_messages": []
+    }
 
-    if not unique_labels:
+    if not full_cm.any():
         results_package["log_messages"].append(
-ML Metrics: No unique valid labels after cleaning for '{true_label_name}' vs '{pred_label_name}'.")
+            f"ML Metrics: No overlapping non-missing data for '{true_label_name}' vs '{pred_label_name}'.")
         return results_package
 
-    accuracy = accuracy_score(y_true_clean, y_pred_clean)
+    if sparse:
+        true_idx, pred_idx, counts = confusion_triples(full_cm)
+        present_codes = np.union1d(true_idx, pred_idx)
+        true_idx, pred_idx = np.searchsorted(present_codes, true_idx), np.searchsorted(present_codes, pred_idx)
+        unique_labels = [labels[code] for code in present_codes]
+        stats = ConfusionStats.from_triples(true_idx, pred_idx, counts.astype(int), unique_labels, zero_division=0)
+    else:
+        present_codes = np.flatnonzero(full_cm.sum(axis=0) + full_cm.sum(axis=1))
+        unique_labels = [labels[code] for code in present_codes]
+        stats = ConfusionStats(full_cm[np.ix_(present_codes, present_codes)].astype(int), unique_labels, zero_division=0)
+    accuracy = stats.accuracy
     global_metrics_data = [{'Metric': 'Accuracy', 'Value': format_data_value(accuracy), 'Average/Label': 'N/A'}]
 
     per_class_metrics_list = []
 
-    p_per, r_per, f1_per, s_per = precision_recall_fscore_support(y_true_clean, y_pred_clean, labels=unique_labels,
-                                                                  average=None, zero_division=0)
-    for i, current_label_name in enumerate(unique_labels):
+    p_per, r_per, f1_per, s_per = stats.precision, stats.recall, stats.fscore, stats.support
+    # Sparse packages carry the same values as per_class_metrics_df instead.
+    for i, current_label_name in enumerate(unique_labels if not sparse else []):
         class_metrics_values = {
-precision': format_data_value(p_per[i]),
-recall': format_data_value(r_per[i]),
-f_1_score': format_data_value(f1_per[i]),
-support': format_data_value(s_per[i])
+            'precision': format_data_value(p_per[i]),
+            'recall': format_data_value(r_per[i]),
+            'f_1_score': format_data_value(f1_per[i]),
+            'support': format_data_value(s_per[i])
         }
         per_class_metrics_list.append({
-label_name": str(current_label_name),
-metrics": class_metrics_values
+            "label_name": str(current_label_name),
+            "metrics": class_metrics_values
         })
     results_package["per_class_metrics"] = per_class_metrics_list
 
     if len(unique_labels) == 1:
         results_package["log_messages"].append(
-ML Metrics: Only one unique label ('{unique_labels[0]}') present. Per-class metrics calculated. Accuracy is primary global metric.")
+            f"ML Metrics: Only one unique label ('{unique_labels[0]}') present. Per-class metrics calculated. Accuracy is primary global metric.")
         p, r, f1 = p_per[0], r_per[0], f1_per[0]
         global_metrics_data.append(
             {'Metric': 'Precision (Macro)', 'Value': format_data_value(p), 'Average/Label': 'macro'})
@@ -303,47 +339,112 @@ ML Metrics: Only one unique label ('{unique_labels[0]}') present. Per-class metr
     else:
         if len(unique_labels) == 2:
             results_package["log_messages"].append(
-ML Metrics: Binary classification for labels: {unique_labels}. Per-class and averaged metrics calculated.")
+                f"ML Metrics: Binary classification for labels: {unique_labels}. Per-class and averaged metrics calculated.")
+        elif sparse:
+            results_package["log_messages"].append(
+                f"ML Metrics: Multiclass classification for {len(unique_labels)} labels. Per-class and averaged metrics calculated.")
         else:
             results_package["log_messages"].append(
-ML Metrics: Multiclass classification for labels: {unique_labels}. Per-class and averaged metrics calculated.")
+                f"ML Metrics: Multiclass classification for labels: {unique_labels}. Per-class and averaged metrics calculated.")
 
         for avg in ['macro', 'weighted']:
-            prec_avg = precision_score(y_true_clean, y_pred_clean, labels=unique_labels, average=avg, zero_division=0)
-            rec_avg = recall_score(y_true_clean, y_pred_clean, labels=unique_labels, average=avg, zero_division=0)
-            f1_avg = f1_score(y_true_clean, y_pred_clean, labels=unique_labels, average=avg, zero_division=0)
+            prec_avg, rec_avg, f1_avg, _ = stats.average(avg)
 
             global_metrics_data.append(
                 {'Metric': f'Precision ({avg.capitalize()})', 'Value': format_data_value(prec_avg),
-Average/Label': avg})
+                 'Average/Label': avg})
             global_metrics_data.append(
                 {'Metric': f'Recall ({avg.capitalize()})', 'Value': format_data_value(rec_avg), 'Average/Label': avg})
             global_metrics_data.append(
                 {'Metric': f'F1 Score ({avg.capitalize()})', 'Value': format_data_value(f1_avg), 'Average/Label': avg})
 
     results_package["global_metrics_df"] = pd.DataFrame(global_metrics_data)
-    try:
-        cm = confusion_matrix(y_true_clean, y_pred_clean, labels=unique_labels)
-        results_package["confusion_matrix_df"] = pd.DataFrame(cm,
-                                                              index=pd.Index(unique_labels, name='True Label'),
-                                                              columns=pd.Index(unique_labels, name='Predicted Label'))
-    except ValueError as e:
-        results_package["log_messages"].append(f"Error creating confusion matrix (labels: {unique_labels}): {e}")
+    if sparse:
+        label_names = np.array([str(label) for label in unique_labels], dtype=object)
+        results_package["per_class_metrics_df"] = pd.DataFrame(
+            {'label_name': label_names, 'precision': p_per, 'recall': r_per, 'f_1_score': f1_per, 'support': s_per})
+        results_package["confusion_triples_df"] = pd.DataFrame(
+            {'True Label': label_names[true_idx], 'Predicted Label': label_names[pred_idx], 'Count': counts.astype(int)})
+        top = top_confusions(true_idx, pred_idx, counts, top_k)
+        results_package["top_confusions_df"] = pd.DataFrame(
+            {'True Label': label_names[true_idx[top]], 'Predicted Label': label_names[pred_idx[top]],
+             'Count': counts[top].astype(int), 'Share of True Label': counts[top] / s_per[true_idx[top]]})
+        return results_package
+    results_package["confusion_matrix_df"] = pd.DataFrame(stats.matrix,
+                                                          index=pd.Index(unique_labels, name='True Label'),
+                                                          columns=pd.Index(unique_labels, name='Predicted Label'))
 
     return results_package
-def format_dataframe_for_schema(df: pd.DataFrame):
-    """Convert DataFrame to schema-friendly dict."""
-    if df is None: return None
-    if df.empty:
-        return {"columns": [str(col) for col in df.columns.tolist()], "index": [str(idx) for idx in df.index.tolist()],
-data_rows": []}
 
+def calculate_ml_metrics_package(y_true: pd.Series, y_pred: pd.Series, true_label_name: str = "True Labels",
+                                 pred_label_name: str = "Predicted Labels") -> dict:
+    """Compute accuracy, per-class metrics and confusion matrix from a single ConfusionStats pass."""
+    import pandas as pd
+    comparison_df = pd.DataFrame({'true': y_true, 'pred': y_pred})
+    codes, labels = encode_labels(comparison_df.to_numpy())
+    return calculate_ml_metrics_package_from_codes(codes[:, 0], codes[:, 1], labels, true_label_name, pred_label_name)
+
+RESPONSE_ENCODINGS = ('rows', 'columnar', 'artifacts')
+
+def resolve_response_encoding(response_encoding: str = None) -> str:
+    """responseEncoding to use: unknown values fall back to 'rows', 'artifacts' without artifact storage to 'columnar'."""
+    response_encoding = response_encoding or 'rows'
+    if response_encoding not in RESPONSE_ENCODINGS:
+        logging.warning(f"Unknown responseEncoding '{response_encoding}', falling back to 'rows'.")
+        return 'rows'
+    if response_encoding == 'artifacts' and artifact_dir() is None:
+        logging.warning("responseEncoding 'artifacts' needs ANALYTICS_ARTIFACT_DIR, falling back to 'columnar'.")
+        return 'columnar'
+    return response_encoding
+
+def format_column_values(column: pd.Series) -> list:
+    """Whole-column format_data_value: missing -> None, numpy scalars -> Python natives."""
+    import pandas as pd
+    is_numpy_column = isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biufO'
+    values = column.to_numpy() if is_numpy_column else None
+    if values is None:
+        return [format_data_value(val) for val in column.tolist()]
+    if values.dtype.kind != 'O':
+        formatted = values.astype(object)
+        if values.dtype.kind == 'f': formatted[np.isnan(values)] = None
+        return formatted.tolist()
+    formatted = values.copy()
+    formatted[pd.isna(values)] = None
+    if pd.api.types.infer_dtype(formatted, skipna=True) in ('string', 'empty'):
+        return formatted.tolist()
+    return [format_data_value(val) for val in formatted]
+
+def format_compact_column(column: pd.Series) -> dict:
+    """Columnar cell encoding: string columns as dictionary + codes (-1 = None), others as plain values."""
+    import pandas as pd
+    values = format_column_values(column)
+    if column.dtype.kind == 'O' and pd.api.types.infer_dtype(values, skipna=True) == 'string':
+        codes, dictionary = pd.factorize(np.array(values, dtype=object), use_na_sentinel=True)
+        return {"dictionary": dictionary.tolist(), "codes": codes.tolist()}
+    return {"values": values}
+
+def format_dataframe_for_schema(df: pd.DataFrame, encoding: str = 'rows'):
+    """Convert DataFrame to schema-friendly dict, one column at a time.
+    encoding='columnar' leaves data_rows empty and sends data_columns (see format_compact_column) instead.
+    """
+    if df is None: return None
     columns_as_strings = [str(col) for col in df.columns.tolist()]
     index_as_strings = [str(idx) for idx in df.index.tolist()]
-    data_rows_list = [{"values": [format_data_value(df.iloc[i, col_idx]) for col_idx in range(len(df.columns))]} for i
-                      in range(len(df))]
+    if df.empty:
+        return {"columns": columns_as_strings, "index": index_as_strings, "data_rows": []}
+
+    if encoding == 'columnar':
+        return {"columns": columns_as_strings, "index": index_as_strings, "data_rows": [],
+                "data_columns": [format_compact_column(df.iloc[:, col_idx]) for col_idx in range(len(df.columns))]}
+    column_values = [format_column_values(df.iloc[:, col_idx]) for col_idx in range(len(df.columns))]
+    data_rows_list = [{"values": list(row_values)} for row_values in zip(*column_values)]
     return {"columns": columns_as_strings, "index": index_as_strings, "data_rows": data_rows_list}
 
+def format_dataframe_as_artifact(df: pd.DataFrame, table_name: str, artifacts: TableArtifactWriter) -> dict:
+    """DataFrameStructured summary of a table whose cells go to the response's artifact (see artifacts)."""
+    return artifacts.add_frame(table_name, df, [format_column_values(df.iloc[:, col_idx])
+                                                for col_idx in range(len(df.columns))])
+
 def format_series_for_schema(series: pd.Series):
     """Convert Series to schema-friendly dict."""
     if series is None: return None
@@ -353,133 +454,771 @@ def format_series_for_schema(series: pd.Series):
         return output
 
     output = {"index": [str(idx) for idx in series.index.tolist()],
-data": [format_data_value(val) for val in series.tolist()]}
+              "data": format_column_values(series)}
     if series.name: output["name"] = str(series.name)
     return output
-def run_analysis(annotation_data: dict) -> dict:
-    """End-to-end pipeline from annotations to analytics outputs."""
-    results = {"dataframes": {}, "metrics": {}, "logs": []}
-    if not annotation_data:
-        results["logs"].append("Critical Error: Annotation data is missing or empty in run_analysis.")
-        return results
 
-    overview_df, available_runs = process_image_annotations(annotation_data)
-    if overview_df.empty and not available_runs:
-        results["logs"].append("Warning: Processing annotations yielded an empty overview DataFrame and no run names.")
-    results["dataframes"]["overview_annotations_wide"] = overview_df
-    results["dataframes"]["annotations_long_format"] = create_long_format_annotations(overview_df)
-    inter_coder_matrix = create_inter_coder_style_contingency_matrix(results["dataframes"]["annotations_long_format"])
-    results["dataframes"]["inter_coder_contingency_matrix"] = inter_coder_matrix
-    majority_decision_s = calculate_majority_decision(inter_coder_matrix)
-    results["dataframes"]["majority_decision_annotations"] = majority_decision_s
-    gold_standard_df = extract_gold_standard_labels(annotation_data)
-    results["dataframes"]["gold_standard_labels"] = gold_standard_df
-
-    comparison_table = pd.DataFrame()
-    all_ids_list = []
-    if not overview_df.empty and 'file_id' in overview_df.columns:
-        all_ids_list.extend(overview_df['file_id'].dropna().unique())
-    if not gold_standard_df.empty and 'file_id' in gold_standard_df.columns:
-        all_ids_list.extend(gold_standard_df['file_id'].dropna().unique())
-
-    if not all_ids_list:
-        results["logs"].append("No valid file_ids found in overview_df or gold_standard_df to build comparison table.")
-        results["dataframes"]["combined_comparison_table"] = pd.DataFrame()
-    else:
-        unique_all_ids = sorted(list(set(all_ids_list)))
-        comparison_table = pd.DataFrame(index=pd.Index(unique_all_ids, name='file_id'))
-        if not overview_df.empty and 'file_name' in overview_df.columns and 'file_id' in overview_df.columns:
-            file_names_map = overview_df.drop_duplicates(subset=['file_id']).set_index('file_id')['file_name']
-            comparison_table = comparison_table.join(file_names_map, how='left')
-        if not inter_coder_matrix.empty:
-            comparison_table = comparison_table.join(inter_coder_matrix, how='left')
-        if not majority_decision_s.empty:
-            maj_dec_name = 'Majority_Decision_from_Runs'
-            majority_decision_s_named = majority_decision_s.rename(maj_dec_name)
-            comparison_table = comparison_table.join(majority_decision_s_named, how='left')
-            results["dataframes"]["majority_decision_annotations"] = majority_decision_s_named
-        if not gold_standard_df.empty and 'file_id' in gold_standard_df.columns and 'Gold_Standard_Label' in gold_standard_df.columns:
-            gs_for_join = gold_standard_df.drop_duplicates(subset=['file_id']).set_index('file_id')
-            comparison_table = comparison_table.join(gs_for_join, how='left')
-        results["dataframes"]["combined_comparison_table"] = comparison_table
-
-    results["metrics"]["inter_rater_reliability"] = {}
-    results["metrics"]["model_evaluations"] = {}
-    matrix_for_irr = inter_coder_matrix
-    if not matrix_for_irr.empty and matrix_for_irr.shape[1] >= 2:
-        results["metrics"]["inter_rater_reliability"][
-cohens_kappa_between_annotation_runs"] = calculate_pairwise_kappa(matrix_for_irr,
-AnnotationRunsComparison")
-        k_matrix_for_alpha = matrix_for_irr.dropna(how='all')
-        if not k_matrix_for_alpha.empty and k_matrix_for_alpha.shape[0] >= 1:
-            k_data = convert_to_reliability_data(k_matrix_for_alpha)
-            if k_data and len(k_data) >= 2 and any(len(cr) > 0 for cr in k_data):
-                flat_data_for_check = [item for sublist in k_data for item in sublist if pd.notna(item)]
-                if len(set(flat_data_for_check)) > 1:
-                    try:
-                        alpha_value = krippendorff.alpha(reliability_data=k_data, level_of_measurement='nominal')
-                        results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = alpha_value
-                    except Exception as e:
-                        results["logs"].append(f"Krippendorff alpha calculation error: {e}.")
-                        results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = None
-                else:
-                    results["logs"].append(
-Krippendorff alpha not calculated: Data lacks sufficient variance for calculation.")
-                    results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = None
-            else:
-                results["logs"].append(
-Krippendorff alpha not calculated: Not enough data/coders for reliability_data after processing.")
-                results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = None
+class ViewStatistics:
+    """
+    Sufficient statistics of one view for incremental updates: the AnnotationTable (latest label per
+    run/file), the createdAt watermark of the newest result seen, the per-run result counts before and at
+    the watermark (DecodedView.result_counts; they reveal deleted results), and the counts every metric is derived
+    from (vote counts, pairwise run contingency, alpha coincidence counts, confusion counts of each run
+    column and of the majority against gold). Counts are computed lazily; apply_results keeps the
+    computed ones current in place. The counts are additive over files, so statistics of file shards
+    can be exported with to_partial and merged with from_partials.
+    """
+
+    def __init__(self, table: AnnotationTable, watermark: str, structure_key: str,
+                 column_by_run_name: dict, majority_tie_break: str = 'first', result_counts: tuple = None):
+        self.table = table
+        self.watermark = watermark
+        self.structure_key = structure_key
+        self.column_by_run_name = column_by_run_name
+        self.majority_tie_break = majority_tie_break
+        self.result_counts = result_counts
+
+    @classmethod
+    def from_annotation_data(cls, annotation_data: dict | DecodedView, gold_labels: list = None,
+                             majority_tie_break: str = 'first'):
+        """gold_labels: (file_id, label) pairs as from extract_gold_standard_pairs; None for no gold."""
+        view = decode_view(annotation_data)
+        table = build_annotation_table(view, gold_labels=gold_labels)
+        run_names = [run_name for run_name in view.classification_names if run_name]
+        # Colliding sanitized names share a column, filled by the last such run (as build_annotation_table).
+        source_run_by_column = {run_column_name(run_name): run_name for run_name in run_names}
+        column_by_run_name = {run_name: table.run_columns.index(col) if source_run_by_column[col] == run_name else -1
+                              for run_name in table.run_names for col in [run_column_name(run_name)]}
+        # A name used by several classifications resolves by classification position, not by time.
+        for run_name, count in Counter(run_names).items():
+            if count > 1: column_by_run_name[run_name] = None
+        result_counts = view.result_counts(view.watermark) if view.watermark is not None else None
+        return cls(table, view.watermark, view.structure_key, column_by_run_name, majority_tie_break, result_counts)
+
+    @cached_property
+    def overview_rows(self) -> np.ndarray:
+        """Overview row per table file (-1 for gold-only files)."""
+        overview_rows = np.full(len(self.table.file_ids), -1, dtype=np.intp)
+        overview_rows[self.table.in_overview] = np.arange(int(self.table.in_overview.sum()))
+        return overview_rows
+
+    @cached_property
+    def n_files(self) -> int:
+        return len(self.table.file_ids)
+
+    @cached_property
+    def n_overview_files(self) -> int:
+        return int(self.table.in_overview.sum())
+
+    @cached_property
+    def vote_counts(self) -> np.ndarray:
+        """Overview files x labels vote counts."""
+        return count_label_votes(self.table.overview_codes, self.table.n_labels)
+
+    @cached_property
+    def majority_codes(self) -> np.ndarray:
+        """Majority decision codes over all table files (-1 outside the overview or without votes)."""
+        majority_codes = np.full(len(self.table.file_ids), -1, dtype=np.intp)
+        if self.table.in_overview.any() and self.table.run_columns:
+            majority_codes[self.table.in_overview] = majority_codes_from_votes(self.vote_counts,
+                                                                               self.majority_tie_break)
+        return majority_codes
+
+    @cached_property
+    def gold_confusion_by_column(self) -> np.ndarray:
+        """run columns x labels x labels confusion counts against gold."""
+        return batched_confusion_matrices(self.table.gold_codes, self.table.codes, self.table.n_labels,
+                                          executor=analysis_executor())
+
+    @cached_property
+    def majority_gold_confusion(self) -> np.ndarray:
+        return batched_confusion_matrices(self.table.gold_codes, self.majority_codes[:, None], self.table.n_labels)[0]
+
+    @cached_property
+    def coincidence_counts(self) -> CoincidenceCounts:
+        """Krippendorff's alpha counts over the overview files (units) and run columns (coders)."""
+        return CoincidenceCounts.from_value_counts(self.vote_counts, len(self.table.run_columns))
+
+    def _accumulate_rows(self, file_rows: np.ndarray, sign: int):
+        """Adds (sign=1) or removes (sign=-1) the contribution of the given table rows to every computed count."""
+        table, derived = self.table, self.__dict__
+        overview_rows = self.overview_rows[file_rows]
+        if sign < 0 and 'coincidence_counts' in derived:
+            derived['coincidence_counts'].update(CoincidenceCounts.from_value_counts(
+                derived['vote_counts'][overview_rows], len(table.run_columns)), -1)
+        if sign > 0 and 'vote_counts' in derived:
+            derived['vote_counts'][overview_rows] = count_label_votes(table.row_codes(file_rows), table.n_labels)
+            if 'majority_codes' in derived:
+                derived['majority_codes'][file_rows] = majority_codes_from_votes(derived['vote_counts'][overview_rows],
+                                                                                 self.majority_tie_break)
+            if 'coincidence_counts' in derived:
+                derived['coincidence_counts'].update(CoincidenceCounts.from_value_counts(
+                    derived['vote_counts'][overview_rows], len(table.run_columns)))
+        if 'run_pair_contingency' in table.__dict__:
+            row_counts = PairwiseContingency.from_codes(table.row_codes(file_rows), table.n_labels).counts
+            table.run_pair_contingency.update(sign * row_counts)
+        if 'gold_confusion_by_column' in derived:
+            derived['gold_confusion_by_column'] += sign * batched_confusion_matrices(
+                table.gold_codes[file_rows], table.row_codes(file_rows), table.n_labels)
+        if 'majority_gold_confusion' in derived:
+            derived['majority_gold_confusion'] += sign * batched_confusion_matrices(
+                table.gold_codes[file_rows], self.majority_codes[file_rows, None], table.n_labels)[0]
+
+    def apply_results(self, annotation_data: dict | DecodedView) -> int:
+        """
+        Applies the results of annotation_data at or after the watermark in place; returns the number of
+        changed (run, file) cells. Raises ValueError when the update needs a rebuild instead: changed files,
+        runs or gold labels, deleted results or new ones stamped before the watermark (the per-run result
+        counts differ), new results for unknown files/labels or for a run name used more than once.
+        """
+        view = decode_view(annotation_data)
+        if self.watermark is None or self.result_counts is None or view.structure_key != self.structure_key:
+            raise ValueError("View structure changed since the statistics were built.")
+        older, at_watermark = view.result_counts(self.watermark)
+        # Results at the watermark are applied again, so only fewer of them means one was deleted.
+        if (older != self.result_counts[0]).any() or (at_watermark < self.result_counts[1]).any():
+            raise ValueError("Results before the watermark were added or deleted.")
+        columns, run_names = view.results_since(self.watermark), view.run_names
+        # Of the results stamped at the watermark only those of runs with more of them than before can be new.
+        grown = at_watermark > self.result_counts[1]
+        fresh = (columns['created_at'] != self.watermark) | grown[columns['run']]
+        columns = {name: values[fresh] for name, values in columns.items()}
+        if len(columns['file_id']) == 0: return 0
+        latest = select_latest_annotations(columns)
+        if any(self.column_by_run_name.get(run_names[run_code], -1) is None for run_code in np.unique(latest['run'])):
+            raise ValueError("New results for a run name shared by several classifications.")
+        run_columns = np.array([-1 if self.column_by_run_name.get(run_name) is None else self.column_by_run_name[run_name]
+                                for run_name in run_names], dtype=np.intp)[latest['run']]
+        kept = run_columns >= 0
+        table = self.table
+        file_rows = index_of(latest['file_id'][kept], table.file_ids)
+        new_codes = encode_labels(latest['label'][kept], labels=table.labels)[0]
+        if (file_rows < 0).any() or (new_codes < 0).any() or not table.in_overview[file_rows].all():
+            raise ValueError("New results reference files or labels outside the current statistics.")
+        n_changed = self.replace_cells(file_rows, run_columns[kept], new_codes)
+        self.watermark = max(self.watermark, max(columns['created_at'].tolist()))
+        self.result_counts = view.result_counts(self.watermark)
+        return n_changed
+
+    def replace_cells(self, file_rows: np.ndarray, run_columns: np.ndarray, new_codes: np.ndarray) -> int:
+        """Sets the (file row, run column) cells to new_codes, keeping every computed count current in place;
+        returns the number of cells whose code changed."""
+        table = self.table
+        changed = table.cell_codes(file_rows, run_columns) != new_codes
+        affected_rows = np.unique(file_rows[changed])
+        self._accumulate_rows(affected_rows, -1)
+        table.update_codes(file_rows[changed], run_columns[changed], new_codes[changed])
+        self._accumulate_rows(affected_rows, 1)
+        return int(changed.sum())
+
+    def to_partial(self) -> dict:
+        """JSON-serializable partial aggregate of this view (or a file shard of it) for from_partials."""
+        table, coincidences = self.table, self.coincidence_counts
+        return {
+            "labels": list(table.labels), "run_names": list(table.run_names), "run_columns": list(table.run_columns),
+            "majority_tie_break": self.majority_tie_break, "has_gold": bool(table.has_gold),
+            "n_files": self.n_files, "n_overview_files": self.n_overview_files,
+            "pair_counts": table.run_pair_contingency.counts.tolist(),
+            "coincidence_counts": {"by_pairable": coincidences.by_pairable.tolist(),
+                                   "label_totals": coincidences.label_totals.tolist(),
+                                   "units_with_values": coincidences.units_with_values},
+            "gold_confusion_by_column": self.gold_confusion_by_column.tolist(),
+            "majority_gold_confusion": self.majority_gold_confusion.tolist(),
+        }
+
+    @classmethod
+    def from_partials(cls, partials: list):
+        """
+        Merges partial aggregates of disjoint file shards (see to_partial) into statistics equal to those of
+        the whole view. Labels are remapped onto the sorted union of the shard labels. The merged table has
+        the view's runs and labels but no file rows, so only count-based outputs (REDUCIBLE_OUTPUTS) apply.
+        Raises ValueError for partials of different runs or majority tie-break rules.
+        """
+        if not partials:
+            raise ValueError("At least one partial aggregate is required.")
+        first = partials[0]
+        for partial in partials[1:]:
+            if any(partial[key] != first[key] for key in ('run_names', 'run_columns', 'majority_tie_break')):
+                raise ValueError("Partial aggregates were computed for different runs or majority tie-break rules.")
+        labels = sorted(set().union(*(partial['labels'] for partial in partials)))
+        n_labels, n_columns = len(labels), len(first['run_columns'])
+        empty_files = np.array([], dtype=object)
+        table = AnnotationTable(file_ids=empty_files, file_names=empty_files, in_overview=np.zeros(0, dtype=bool),
+                                run_names=list(first['run_names']), run_columns=list(first['run_columns']),
+                                labels=labels, codes=np.full((0, n_columns), -1, dtype=np.int32),
+                                gold_codes=np.full(0, -1, dtype=np.int32),
+                                has_gold=any(partial['has_gold'] for partial in partials))
+        rows, cols = np.triu_indices(n_columns)
+        pair_counts = np.zeros((len(rows), n_labels + 1, n_labels + 1), dtype=np.int64)
+        coincidences = CoincidenceCounts(np.zeros((n_columns + 1, n_labels, n_labels), dtype=np.int64),
+                                         np.zeros(n_labels, dtype=np.int64), 0)
+        gold_confusion_by_column = np.zeros((n_columns, n_labels, n_labels), dtype=np.int64)
+        majority_gold_confusion = np.zeros((n_labels, n_labels), dtype=np.int64)
+        for partial in partials:
+            codes = index_of(partial['labels'], labels)
+            slots = np.append(codes, n_labels)
+            n_slots, n_codes = len(slots), len(codes)
+            pair_counts[:, slots[:, None], slots] += np.asarray(
+                partial['pair_counts'], dtype=np.int64).reshape(len(rows), n_slots, n_slots)
+            by_pairable = np.zeros_like(coincidences.by_pairable)
+            by_pairable[:, codes[:, None], codes] = np.asarray(
+                partial['coincidence_counts']['by_pairable'], dtype=np.int64).reshape(n_columns + 1, n_codes, n_codes)
+            label_totals = np.zeros(n_labels, dtype=np.int64)
+            label_totals[codes] = partial['coincidence_counts']['label_totals']
+            coincidences.update(CoincidenceCounts(by_pairable, label_totals,
+                                                  partial['coincidence_counts']['units_with_values']))
+            gold_confusion_by_column[:, codes[:, None], codes] += np.asarray(
+                partial['gold_confusion_by_column'], dtype=np.int64).reshape(n_columns, n_codes, n_codes)
+            majority_gold_confusion[codes[:, None], codes] += np.asarray(
+                partial['majority_gold_confusion'], dtype=np.int64).reshape(n_codes, n_codes)
+        table.run_pair_contingency = PairwiseContingency(pair_counts, rows, cols, n_columns, n_labels)
+        statistics = cls(table, None, None, {}, first['majority_tie_break'])
+        statistics.n_files = sum(partial['n_files'] for partial in partials)
+        statistics.n_overview_files = sum(partial['n_overview_files'] for partial in partials)
+        statistics.coincidence_counts = coincidences
+        statistics.gold_confusion_by_column = gold_confusion_by_column
+        statistics.majority_gold_confusion = majority_gold_confusion
+        return statistics
+
+def result_times(view: DecodedView) -> pd.DatetimeIndex:
+    """createdAt of every result as UTC times (NaT where unparseable); each distinct string is parsed once."""
+    import pandas as pd
+    time_codes, distinct_times = factorize(view.columns['created_at'])
+    parsed = pd.to_datetime(distinct_times, utc=True, format='ISO8601', errors='coerce')
+    return pd.DatetimeIndex(parsed[time_codes])
+
+def resolve_replay_checkpoints(times: pd.DatetimeIndex, as_of: list = None, time_bucket: str = None) -> pd.DatetimeIndex:
+    """
+    As-of times (UTC) for agreement_over_time: the sorted distinct as_of timestamps, else the ends of
+    time_bucket-wide buckets (a pandas Timedelta such as '1D' or '6h') from the first result time to the last.
+    Raises ValueError for unparseable timestamps or a non-positive bucket width.
+    """
+    import pandas as pd
+    if as_of:
+        try:
+            checkpoints = pd.to_datetime(list(as_of), utc=True, format='ISO8601')
+        except ValueError:
+            raise ValueError(f"asOf must be ISO 8601 timestamps, got {as_of!r}") from None
+        return pd.DatetimeIndex(checkpoints).sort_values().unique()
+    width = pd.Timedelta(time_bucket)
+    if width <= pd.Timedelta(0):
+        raise ValueError(f"timeBucket must be positive, got {time_bucket!r}")
+    times = times.dropna()
+    if times.empty: return pd.DatetimeIndex([], tz='UTC')
+    start = times.min().floor(width)
+    n_buckets = max(1, int(np.ceil((times.max() - start) / width)))
+    return pd.DatetimeIndex([start + width * (i + 1) for i in range(n_buckets)])
+
+def agreement_over_time_frame(view: DecodedView, table: AnnotationTable, times: pd.DatetimeIndex,
+                              checkpoints: pd.DatetimeIndex, gold_run_positions: list, selected_runs: list,
+                              majority_tie_break: str = 'first') -> pd.DataFrame:
+    """
+    Agreement and accuracy as of each checkpoint, from one sweep over the view's results in createdAt order.
+    The replay starts from table's files, run columns and gold labels with no annotations and applies the
+    results up to each checkpoint through ViewStatistics.replace_cells, so a superseded label is removed from
+    every count when its successor arrives; the latest-label rule is that of select_latest_annotations.
+    Rows are checkpoints (as_of): filled cells, Krippendorff's alpha, Cohen's kappa per coder pair (NaN where
+    overlap < 2) and, with gold labels, accuracy of the majority decision and of each selected run.
+    times are the results' createdAt (see result_times); results with unparseable createdAt are not replayed; the last row equals the full view when it is as of
+    the newest result.
+    """
+    import pandas as pd
+    labels = sorted(set(view.columns['label'].tolist()).union(table.labels))
+    label_codes = index_of(table.labels, labels)
+    n_files, n_columns = len(table.file_ids), len(table.run_columns)
+    # Only labelled gold codes are remapped: -1 would index label_codes, which is empty for a view without labels.
+    gold_codes = np.full(len(table.gold_codes), -1, dtype=np.int32)
+    has_gold_label = table.gold_codes >= 0
+    gold_codes[has_gold_label] = label_codes[table.gold_codes[has_gold_label]]
+    replay_table = AnnotationTable(
+        file_ids=table.file_ids, file_names=table.file_names, in_overview=table.in_overview,
+        run_names=table.run_names, run_columns=table.run_columns, labels=labels,
+        codes=np.full((n_files, n_columns), -1, dtype=np.int32), gold_codes=gold_codes, has_gold=table.has_gold)
+    replay = ViewStatistics(replay_table, None, None, {}, majority_tie_break)
+    # Computing the (empty) counts up front makes replace_cells keep all of them current.
+    for counts in ('vote_counts', 'majority_codes', 'coincidence_counts', 'gold_confusion_by_column',
+                   'majority_gold_confusion'):
+        getattr(replay, counts)
+    getattr(replay_table, 'run_pair_contingency')
+
+    columns = view.columns
+    column_by_run = run_column_positions(view.run_names, table.run_columns)
+    replayed = np.flatnonzero((column_by_run[columns['run']] >= 0) & ~times.isna())
+    order = replayed[np.argsort(times.asi8[replayed], kind='stable')]
+    sorted_times = times.asi8[order]
+    # Classification position of each cell's current label: a later classification of a repeated run name wins.
+    winner_classification = np.full((n_files, n_columns), -1, dtype=np.intp)
+
+    coder_pairs = list(itertools.combinations(table.coder_order, 2)) if n_columns >= 2 else []
+    evaluated_runs = [(run_name, position) for run_name, position in zip(selected_runs, gold_run_positions)
+                      if position >= 0] if table.has_gold else []
+    rows, batch_start = [], 0
+    for checkpoint in checkpoints:
+        batch_end = int(np.searchsorted(sorted_times, checkpoint.value, side='right'))
+        if batch_end > batch_start:
+            batch = order[batch_start:batch_end]
+            latest = select_latest_annotations({name: values[batch] for name, values in columns.items()})
+            file_rows = index_of(latest['file_id'], table.file_ids)
+            run_columns = column_by_run[latest['run']]
+            # Times within a batch are after every earlier batch, so only an earlier classification loses.
+            wins = latest['classification'] >= winner_classification[file_rows, run_columns]
+            file_rows, run_columns = file_rows[wins], run_columns[wins]
+            winner_classification[file_rows, run_columns] = latest['classification'][wins]
+            replay.replace_cells(file_rows, run_columns, encode_labels(latest['label'][wins], labels=labels)[0])
+            batch_start = batch_end
+        rows.append(replay_snapshot(replay, coder_pairs, evaluated_runs))
+    return pd.DataFrame(rows, index=pd.Index([checkpoint.isoformat() for checkpoint in checkpoints], name='as_of'))
+
+def replay_snapshot(replay: ViewStatistics, coder_pairs: list, evaluated_runs: list) -> dict:
+    """One agreement_over_time row from the current counts of a replay."""
+    table = replay.table
+    snapshot = {'Annotations': table.n_annotations}
+    if coder_pairs:
+        coincidences = replay.coincidence_counts
+        alpha = np.nan
+        if coincidences.units_with_values >= 1 and np.count_nonzero(coincidences.label_totals) > 1:
+            try:
+                alpha = coincidences.alpha()
+            except ValueError:
+                pass
+        snapshot['Krippendorff Alpha'] = alpha
+        run_pairs = table.run_pair_contingency
+        for i, j in coder_pairs:
+            kappa = run_pairs.kappa[i, j] if run_pairs.overlap[i, j] >= 2 else np.nan
+            snapshot[f'Kappa ({table.coders[i]} vs {table.coders[j]})'] = kappa
+    if table.has_gold and table.run_columns:
+        snapshot['Accuracy (Majority Decision)'] = confusion_accuracy(replay.majority_gold_confusion)
+        for run_name, position in evaluated_runs:
+            snapshot[f'Accuracy ({run_name})'] = confusion_accuracy(replay.gold_confusion_by_column[position])
+    return snapshot
+
+def confusion_accuracy(confusion: np.ndarray) -> float:
+    """Share of a confusion matrix's counts on the diagonal; NaN when it is empty."""
+    total = confusion.sum()
+    return np.trace(confusion) / total if total else np.nan
+
+ANALYSIS_SECTIONS = {
+    'data_overview': ('overview_annotations_wide', 'annotations_long_format', 'inter_coder_contingency_matrix',
+                      'majority_decision_annotations', 'majority_decision_confidence', 'gold_standard_labels',
+                      'combined_comparison_table', 'pairwise_run_contingency_matrices'),
+    'inter_rater_reliability': ('cohens_kappa_between_annotation_runs', 'krippendorff_alpha',
+                                'cohens_kappa_majority_vs_gold'),
+    'model_evaluations': ('majority_decision_vs_gold_standard', 'annotation_runs_vs_gold_standard'),
+    'temporal': ('agreement_over_time',),
+    'consensus': ('annotation_runs_vs_consensus',),
+}
+ANALYSIS_OUTPUTS = tuple(output for outputs in ANALYSIS_SECTIONS.values() for output in outputs)
+# Outputs computed only when requested by name or section, never by default: agreement_over_time needs
+# asOf or timeBucket, annotation_runs_vs_consensus decides a majority per annotation.
+OPT_IN_OUTPUTS = ANALYSIS_SECTIONS['temporal'] + ANALYSIS_SECTIONS['consensus']
+# Outputs that are plain values rather than DataFrames; requests for only these never import pandas.
+PANDAS_FREE_OUTPUTS = ('krippendorff_alpha',)
+# Outputs derived from counts alone (no per-file rows), so they can be computed from merged partial aggregates.
+REDUCIBLE_OUTPUTS = tuple(output for output in ANALYSIS_OUTPUTS if output not in ANALYSIS_SECTIONS['data_overview']
+                          and output not in OPT_IN_OUTPUTS or output == 'pairwise_run_contingency_matrices')
+# Profiling span per output; lazily shared stages are charged to the first output that needs them.
+OUTPUT_PROFILE_STAGES = {
+    'overview_annotations_wide': 'frames', 'annotations_long_format': 'frames',
+    'inter_coder_contingency_matrix': 'frames', 'majority_decision_annotations': 'majority',
+    'majority_decision_confidence': 'majority', 'gold_standard_labels': 'frames',
+    'combined_comparison_table': 'frames', 'pairwise_run_contingency_matrices': 'crosstabs',
+    'cohens_kappa_between_annotation_runs': 'kappa', 'krippendorff_alpha': 'alpha',
+    'cohens_kappa_majority_vs_gold': 'kappa', 'majority_decision_vs_gold_standard': 'gold_evals',
+    'annotation_runs_vs_gold_standard': 'gold_evals', 'agreement_over_time': 'replay',
+    'annotation_runs_vs_consensus': 'consensus',
+}
+
+def resolve_analysis_sections(sections: list = None) -> list:
+    """Output names for the requested sections (a group name expands to all its outputs), in pipeline order.
+    None requests everything but OPT_IN_OUTPUTS; unknown names are logged and ignored.
+    """
+    if sections is None: return [output for output in ANALYSIS_OUTPUTS if output not in OPT_IN_OUTPUTS]
+    requested = set()
+    for section in sections:
+        if section in ANALYSIS_SECTIONS:
+            requested.update(ANALYSIS_SECTIONS[section])
+        elif section in ANALYSIS_OUTPUTS:
+            requested.add(section)
         else:
-            results["logs"].append(
-Krippendorff alpha not calculated: Matrix for alpha empty after all-NaN rows dropped or not enough valid items.")
-            results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = None
-    else:
-        results["logs"].append(
-Skipping inter-rater reliability (Kappa, Krippendorff): Less than 2 coders/runs or no data in inter_coder_matrix.")
-        results["metrics"]["inter_rater_reliability"]["krippendorff_alpha"] = None
+            logging.warning(f"Unknown analysis section '{section}' ignored.")
+    return [output for output in ANALYSIS_OUTPUTS if output in requested]
 
+class AnalysisStages:
+    """Lazy stage graph of run_analysis over one AnnotationTable.
+    Each output in ANALYSIS_OUTPUTS is a cached property pulling only the stages it depends on.
+    Stages append to logs when first computed; run_analysis touches outputs in pipeline order,
+    so a full run logs in the same order as the eager pipeline did.
+    """
     gs_col_name = 'Gold_Standard_Label'
     maj_dec_col_name = 'Majority_Decision_from_Runs'
-    if not comparison_table.empty and gs_col_name in comparison_table.columns:
-        if maj_dec_col_name in comparison_table.columns:
-            df_kappa_eval_maj_gs = comparison_table[[gs_col_name, maj_dec_col_name]].copy()
-            kappa_maj_gs_df = calculate_pairwise_kappa(df_kappa_eval_maj_gs, "MajorityVsGold")
-            if not kappa_maj_gs_df.empty:
-                results["metrics"]["inter_rater_reliability"]["cohens_kappa_majority_vs_gold"] = kappa_maj_gs_df
+
+    def __init__(self, annotation_data: dict, majority_tie_break: str = 'first', runs: list = None,
+                 statistics: ViewStatistics = None, confusion_format: str = 'auto',
+                 top_confusions: int = DEFAULT_TOP_CONFUSIONS, as_of: list = None, time_bucket: str = None):
+        self.annotation_data = annotation_data
+        self.majority_tie_break = majority_tie_break
+        self.runs = runs
+        self.requested_confusion_format = confusion_format
+        self.top_confusions = top_confusions
+        self.as_of = as_of
+        self.time_bucket = time_bucket
+        self.logs = []
+        if statistics is not None: self.statistics = statistics
+
+    @cached_property
+    def view(self) -> DecodedView:
+        with span('ingestion'):
+            return decode_view(self.annotation_data)
+
+    @cached_property
+    def gold_label_pairs(self) -> list:
+        return extract_gold_standard_pairs(self.view)
+
+    @cached_property
+    def gold_standard_labels(self) -> pd.DataFrame:
+        return gold_standard_frame(self.gold_label_pairs)
+
+    @cached_property
+    def statistics(self) -> ViewStatistics:
+        return ViewStatistics.from_annotation_data(self.view, self.gold_label_pairs, self.majority_tie_break)
+
+    @cached_property
+    def table(self) -> AnnotationTable:
+        table = self.statistics.table
+        if not self.statistics.n_overview_files and not table.run_names:
+            self.logs.append("Warning: Processing annotations yielded an empty overview DataFrame and no run names.")
+        return table
+
+    @cached_property
+    def selected_runs(self) -> list:
+        """Run names in scope: all runs, or only those listed in runs."""
+        if self.runs is None: return self.table.run_names
+        return [run_name for run_name in self.table.run_names if run_name in set(self.runs)]
+
+    @cached_property
+    def confusion_format(self) -> str:
+        """'dense' or 'sparse' for confusion outputs (see resolve_confusion_format)."""
+        return resolve_confusion_format(self.requested_confusion_format, self.table.n_labels)
+
+    @property
+    def has_coded_runs(self) -> bool:
+        """True when the inter-coder matrix is non-empty (overview files and at least one run column)."""
+        return bool(self.statistics.n_overview_files) and bool(self.table.run_columns)
+
+    @cached_property
+    def coder_names(self) -> list:
+        return [self.table.coders[i] for i in self.table.coder_order]
+
+    @cached_property
+    def overview_annotations_wide(self) -> pd.DataFrame:
+        return self.table.to_overview_frame()
+
+    @cached_property
+    def annotations_long_format(self) -> pd.DataFrame:
+        return self.table.to_long_frame()
+
+    @cached_property
+    def inter_coder_contingency_matrix(self) -> pd.DataFrame:
+        return self.table.to_inter_coder_frame()
+
+    @cached_property
+    def _majority_frames(self) -> tuple[pd.Series, pd.DataFrame]:
+        majority_s, confidence_df = majority_decision_frames(self.table, self.statistics.vote_counts,
+                                                             self.majority_codes[self.table.in_overview])
+        if not majority_s.empty: majority_s = majority_s.rename(self.maj_dec_col_name)
+        return majority_s, confidence_df
+
+    @cached_property
+    def majority_decision_annotations(self) -> pd.Series:
+        return self._majority_frames[0]
+
+    @cached_property
+    def majority_decision_confidence(self) -> pd.DataFrame:
+        return self._majority_frames[1]
+
+    @property
+    def majority_codes(self) -> np.ndarray:
+        return self.statistics.majority_codes
+
+    @cached_property
+    def combined_comparison_table(self) -> pd.DataFrame:
+        import pandas as pd
+        table = self.table
+        if len(table.file_ids) == 0:
+            self.logs.append("No valid file_ids found in overview_df or gold_standard_df to build comparison table.")
+            return pd.DataFrame()
+        comparison_columns = {}
+        if table.in_overview.any():
+            comparison_columns['file_name'] = table.file_names
+        if self.has_coded_runs:
+            for coder, column_position in zip(self.coder_names, table.coder_order):
+                comparison_columns[coder] = table.decode(table.column_codes(column_position))
+            comparison_columns[self.maj_dec_col_name] = table.decode(self.majority_codes)
+        if table.has_gold:
+            comparison_columns[self.gs_col_name] = table.decode(table.gold_codes)
+        return pd.DataFrame(comparison_columns, index=pd.Index(table.file_ids, name='file_id'))
+
+    @cached_property
+    def pairwise_run_contingency_matrices(self) -> list:
+        pairwise_matrices_output = []
+        if len(self.selected_runs) >= 2 and self.statistics.n_overview_files:
+            sparse = self.confusion_format == 'sparse'
+            for r1_orig, r2_orig in itertools.combinations(self.selected_runs, 2):
+                cm_df = create_run_comparison_contingency_matrix(self.table, r1_orig, r2_orig, sparse)
+                pairwise_matrices_output.append(
+                    {"run_1_name": r1_orig, "run_2_name": r2_orig,
+                     "contingency_triples_df" if sparse else "contingency_matrix_df": cm_df})
+        return pairwise_matrices_output or None
+
+    @cached_property
+    def irr_applicable(self) -> bool:
+        applicable = self.has_coded_runs and len(self.table.run_columns) >= 2
+        if not applicable:
+            self.logs.append(
+                "Skipping inter-rater reliability (Kappa, Krippendorff): Less than 2 coders/runs or no data in inter_coder_matrix.")
+        return applicable
+
+    @cached_property
+    def cohens_kappa_between_annotation_runs(self) -> pd.DataFrame:
+        if not self.irr_applicable: return None
+        # Same pair counts as the run comparison crosstabs, reordered to inter-coder order.
+        run_pairs = self.table.run_pair_contingency
+        coder_pairs = np.ix_(self.table.coder_order, self.table.coder_order)
+        return format_pairwise_kappa(run_pairs.kappa[coder_pairs], run_pairs.overlap[coder_pairs],
+                                     self.coder_names, "AnnotationRunsComparison")
+
+    @cached_property
+    def krippendorff_alpha(self):
+        if not self.irr_applicable: return None
+        # Units are the overview files with at least one label; all-missing files carry no counts.
+        coincidences = self.statistics.coincidence_counts
+        if coincidences.units_with_values < 1:
+            self.logs.append(
+                "Krippendorff alpha not calculated: Matrix for alpha empty after all-NaN rows dropped or not enough valid items.")
+            return None
+        if np.count_nonzero(coincidences.label_totals) <= 1:
+            self.logs.append("Krippendorff alpha not calculated: Data lacks sufficient variance for calculation.")
+            return None
+        try:
+            return coincidences.alpha()
+        except Exception as e:
+            self.logs.append(f"Krippendorff alpha calculation error: {e}.")
+            return None
+
+    @cached_property
+    def gold_applicable(self) -> bool:
+        applicable = bool(self.statistics.n_files) and self.table.has_gold
+        if not applicable:
+            self.logs.append("Gold Standard Label column not found, skipping evaluations against it.")
+        return applicable
+
+    @cached_property
+    def gold_run_positions(self) -> list:
+        """Table column per selected run for gold and consensus evaluation (runs are matched by coder name), -1 if none."""
+        return [self.table.coder_column_index(run_name_original) if self.has_coded_runs else -1
+                for run_name_original in self.selected_runs]
+
+    @cached_property
+    def gold_confusion(self) -> np.ndarray:
+        """One confusion tensor against gold: slot 0 is the majority decision, then one slot per evaluable run."""
+        evaluated_positions = [position for position in self.gold_run_positions if position >= 0]
+        return np.concatenate([self.statistics.majority_gold_confusion[None],
+                               self.statistics.gold_confusion_by_column[evaluated_positions]])
+
+    @cached_property
+    def _majority_vs_gold(self) -> tuple:
+        """(kappa DataFrame, metrics package) for the majority decision against gold; None where not computed."""
+        if not self.gold_applicable: return None, None
+        if not self.has_coded_runs:
+            self.logs.append(f"'{self.maj_dec_col_name}' column not found for Gold Standard eval.")
+            return None, None
+        kappa, overlap = cohen_kappa_from_confusion(self.gold_confusion[0])
+        kappa_maj_gs_df = format_pairwise_kappa(np.array([[np.nan, kappa], [kappa, np.nan]]),
+                                                np.array([[0, overlap], [overlap, 0]]),
+                                                [self.gs_col_name, self.maj_dec_col_name], "MajorityVsGold")
+        pkg = calculate_ml_metrics_package_from_confusion(self.gold_confusion[0], self.table.labels,
+                                                          "Gold Standard", "Majority Decision",
+                                                          self.confusion_format, self.top_confusions)
+        return kappa_maj_gs_df, pkg
+
+    @cached_property
+    def cohens_kappa_majority_vs_gold(self) -> pd.DataFrame:
+        return self._majority_vs_gold[0]
+
+    @cached_property
+    def majority_decision_vs_gold_standard(self) -> dict:
+        return self._majority_vs_gold[1]
+
+    @cached_property
+    def annotation_runs_vs_gold_standard(self) -> list:
+        if not self.gold_applicable: return None
+        run_evals_list = []
+        run_confusions = iter(self.gold_confusion[1:])
+        for run_name_original, column_position in zip(self.selected_runs, self.gold_run_positions):
+            if column_position >= 0:
+                pkg = calculate_ml_metrics_package_from_confusion(next(run_confusions), self.table.labels,
+                                                                  "Gold Standard", run_name_original,
+                                                                  self.confusion_format, self.top_confusions)
+                run_evals_list.append({"annotation_run_name": run_name_original, "evaluation_metrics": pkg})
             else:
-                results["logs"].append("No Cohen's Kappa calculated for Majority vs Gold.")
-            y_true_maj = comparison_table[gs_col_name]
-            y_pred_maj = comparison_table[maj_dec_col_name]
-            results["metrics"]["model_evaluations"]["majority_decision_vs_gold_standard"] = \
-                calculate_ml_metrics_package(y_true_maj, y_pred_maj, "Gold Standard", "Majority Decision")
-        else:
-            results["logs"].append(f"'{maj_dec_col_name}' column not found for Gold Standard eval.")
+                self.logs.append(f"Run '{run_name_original}' not found for Gold Standard eval.")
+        return run_evals_list or None
+
+    @cached_property
+    def annotation_runs_vs_consensus(self) -> list:
+        """Each selected run against the majority decision of the other runs (leave one run out), with the
+        per-run metrics package of annotation_runs_vs_gold_standard."""
+        if not self.has_coded_runs or len(self.table.run_columns) < 2:
+            self.logs.append("Skipping consensus evaluations: Less than 2 coders/runs or no data in inter_coder_matrix.")
+            return None
+        table, n_labels, n_columns = self.table, self.table.n_labels, len(self.table.run_columns)
+        if n_labels == 0:
+            self.logs.append("Skipping consensus evaluations: No labelled results in the runs yet.")
+            return []
+        own_codes = dense_codes(table.overview_codes)
+        consensus = leave_one_out_majority_codes(own_codes, self.statistics.vote_counts, self.majority_tie_break)
+        # One confusion matrix per run column: consensus of the others (true) against the column's own labels.
+        file_rows, columns = np.nonzero((own_codes >= 0) & (consensus >= 0))
+        confusion_by_column = np.bincount(
+            (columns * n_labels + consensus[file_rows, columns]) * n_labels + own_codes[file_rows, columns],
+            minlength=n_columns * n_labels * n_labels).reshape(n_columns, n_labels, n_labels)
         run_evals_list = []
-        for run_name_original in available_runs:
-            if run_name_original in comparison_table.columns:
-                y_true_run = comparison_table[gs_col_name]
-                y_pred_run = comparison_table[run_name_original]
-                pkg = calculate_ml_metrics_package(y_true_run, y_pred_run, "Gold Standard", run_name_original)
+        for run_name_original, column_position in zip(self.selected_runs, self.gold_run_positions):
+            if column_position >= 0:
+                pkg = calculate_ml_metrics_package_from_confusion(confusion_by_column[column_position], table.labels,
+                                                                  "Consensus of Other Runs", run_name_original,
+                                                                  self.confusion_format, self.top_confusions)
                 run_evals_list.append({"annotation_run_name": run_name_original, "evaluation_metrics": pkg})
             else:
-                results["logs"].append(f"Run '{run_name_original}' not found for Gold Standard eval.")
-        if run_evals_list:
-            results["metrics"]["model_evaluations"]["annotation_runs_vs_gold_standard"] = run_evals_list
-    else:
-        results["logs"].append("Gold Standard Label column not found, skipping evaluations against it.")
-
-    pairwise_matrices_output = []
-    if len(available_runs) >= 2 and not overview_df.empty:
-        for r1_orig, r2_orig in itertools.combinations(available_runs, 2):
-            cm_df = create_run_comparison_contingency_matrix(overview_df, r1_orig, r2_orig)
-            pairwise_matrices_output.append(
-                {"run_1_name": r1_orig, "run_2_name": r2_orig, "contingency_matrix_df": cm_df})
-    if pairwise_matrices_output: results["dataframes"]["pairwise_run_contingency_matrices"] = pairwise_matrices_output
+                self.logs.append(f"Run '{run_name_original}' not found for consensus eval.")
+        return run_evals_list or None
+
+    @cached_property
+    def agreement_over_time(self) -> pd.DataFrame:
+        if not self.as_of and not self.time_bucket:
+            self.logs.append("Agreement over time not calculated: it needs asOf timestamps or a timeBucket.")
+            return None
+        times = result_times(self.view)
+        try:
+            checkpoints = resolve_replay_checkpoints(times, self.as_of, self.time_bucket)
+        except (ValueError, TypeError) as e:
+            self.logs.append(f"Agreement over time not calculated: {e}.")
+            return None
+        return agreement_over_time_frame(self.view, self.table, times, checkpoints, self.gold_run_positions,
+                                         self.selected_runs, self.majority_tie_break)
+
+def run_analysis(annotation_data: dict | DecodedView, majority_tie_break: str = 'first', sections: list = None,
+                 runs: list = None, statistics: ViewStatistics = None, confusion_format: str = 'auto',
+                 top_confusions: int = DEFAULT_TOP_CONFUSIONS, as_of: list = None, time_bucket: str = None) -> dict:
+    """End-to-end pipeline from annotations (normalized payload or its DecodedView) to analytics outputs.
+    All stages work on one AnnotationTable; DataFrames are only materialized for the response.
+    majority_tie_break selects how tied votes are decided (see majority_codes_from_votes).
+    sections limits the outputs (see resolve_analysis_sections); only the stages they need are computed.
+    runs limits per-run gold evaluations and pairwise crosstabs to the listed run names.
+    statistics reuses (incrementally updated) ViewStatistics of the same view instead of rebuilding them;
+    the statistics used are returned under "view_statistics".
+    confusion_format ('auto', 'dense' or 'sparse', see resolve_confusion_format) selects dense L x L confusion
+    tables or their nonzero cells plus the top_confusions most frequent confusions.
+    as_of (timestamps) or time_bucket (bucket width) set the checkpoints of agreement_over_time.
+    """
+    results = {"dataframes": {}, "metrics": {"inter_rater_reliability": {}, "model_evaluations": {}}, "logs": []}
+    if not annotation_data:
+        results["logs"].append("Critical Error: Annotation data is missing or empty in run_analysis.")
+        return results
+
+    stages = AnalysisStages(annotation_data, majority_tie_break, runs, statistics, confusion_format, top_confusions,
+                            as_of, time_bucket)
+    results["view_statistics"] = stages.statistics
+    results["annotation_table"] = stages.table
+    collect_analysis_outputs(stages, resolve_analysis_sections(sections), results)
     return results
-def handler(event, context):
-    """Lambda entrypoint: expects {'prev': <normalized data>} from TS step."""
-    logging.info("Lambda handler started.")
+
+def collect_analysis_outputs(stages: AnalysisStages, outputs: list, results: dict):
+    """Computes the outputs (in pipeline order) into results' dataframes/metrics sections and appends stage logs."""
+    section_by_output = {output: section for section, outputs in ANALYSIS_SECTIONS.items() for output in outputs}
+    for output in outputs:
+        section = section_by_output[output]
+        target = results["dataframes"] if section == 'data_overview' else results["metrics"].setdefault(section, {})
+        with span(OUTPUT_PROFILE_STAGES[output], output=output):
+            value = getattr(stages, output)
+        # krippendorff_alpha is always reported once requested, None when it could not be computed.
+        if value is not None or output == 'krippendorff_alpha': target[output] = value
+    results["logs"].extend(stages.logs)
+
+def shard_annotation_data(annotation_data: dict, n_shards: int) -> list:
+    """
+    Splits a normalized view payload into n_shards payloads with disjoint files (by a stable hash of the
+    file id). Every shard keeps all classifications, each with only the results of its own files, so runs
+    are the same in every shard; entries without a file id go to the first shard.
+    """
+    result = (annotation_data or {}).get('result') or {}
+    def shard_of(file_id) -> int:
+        return zlib.crc32(str(file_id).encode()) % n_shards if file_id else 0
+    shards = [{"result": {"files": [], "classifications": []}} for _ in range(n_shards)]
+    for file_wrapper in result.get('files', []):
+        file_obj = file_wrapper.get('file') if isinstance(file_wrapper.get('file'), dict) else {}
+        shards[shard_of(file_obj.get('id'))]["result"]["files"].append(file_wrapper)
+    for class_run in result.get('classifications', []):
+        shard_runs = [{**class_run, "results": []} for _ in range(n_shards)]
+        for annotation_result in class_run.get('results') or []:
+            shard_runs[shard_of(annotation_result.get('fileId'))]["results"].append(annotation_result)
+        for shard, shard_run in zip(shards, shard_runs):
+            shard["result"]["classifications"].append(shard_run)
+    return shards
+
+def compute_partial_aggregate(annotation_data: dict, majority_tie_break: str = 'first') -> dict:
+    """Map step: JSON-serializable partial aggregate (see ViewStatistics.to_partial) of one shard payload."""
+    view = decode_view(annotation_data)
+    return ViewStatistics.from_annotation_data(view, extract_gold_standard_pairs(view), majority_tie_break).to_partial()
+
+def merge_partial_aggregates(partials: list, sections: list = None, runs: list = None,
+                             confusion_format: str = 'auto', top_confusions: int = DEFAULT_TOP_CONFUSIONS) -> dict:
+    """
+    Reduce step: merges partial aggregates of disjoint shards and computes the requested outputs exactly as
+    run_analysis does on the whole view. Only REDUCIBLE_OUTPUTS are available; per-file outputs need the
+    files themselves and are skipped with a log entry.
+    """
+    results = {"dataframes": {}, "metrics": {"inter_rater_reliability": {}, "model_evaluations": {}}, "logs": []}
+    statistics = ViewStatistics.from_partials(partials)
+    outputs = resolve_analysis_sections(sections)
+    skipped = [output for output in outputs if output not in REDUCIBLE_OUTPUTS]
+    if skipped:
+        results["logs"].append(f"Per-file outputs are not available from partial aggregates: {', '.join(skipped)}.")
+    stages = AnalysisStages(None, statistics.majority_tie_break, runs, statistics, confusion_format, top_confusions)
+    results["view_statistics"] = statistics
+    results["annotation_table"] = stages.table
+    collect_analysis_outputs(stages, [output for output in outputs if output in REDUCIBLE_OUTPUTS], results)
+    return results
+
+def map_handler(event, context):
+    """Lambda entrypoint of the map step: expects {'prev': <normalized shard data>}; returns {'partial': ...}.
+    The optional argument majorityTieBreak (as handler) travels with the partial to the reduce step.
+    """
+    shard_data = event.get('prev') if isinstance(event, dict) else None
+    if not isinstance(shard_data, dict):
+        raise TypeError("The 'prev' key with a dictionary of shard data is required in the event payload.")
+    arguments = event.get('arguments') or {}
+    return {"partial": compute_partial_aggregate(shard_data,
+                                                 resolve_majority_tie_break(arguments.get('majorityTieBreak')))}
+
+def reduce_handler(event, context):
+    """Lambda entrypoint of the reduce step: expects {'partials': [<map_handler partial>, ...]}.
+    Optional arguments: responseEncoding, sections, runs, confusionFormat and topConfusions (as handler);
+    returns the handler response shape.
+    """
+    partials = event.get('partials') if isinstance(event, dict) else None
+    if not isinstance(partials, list) or not partials:
+        raise ValueError("The 'partials' key with a non-empty list is required in the event payload.")
+    arguments = event.get('arguments') or {}
+    response_encoding = resolve_response_encoding(arguments.get('responseEncoding'))
+    analysis_results = merge_partial_aggregates(partials, arguments.get('sections'), arguments.get('runs'),
+                                                arguments.get('confusionFormat'),
+                                                resolve_top_confusions(arguments.get('topConfusions')))
+    return build_response_body(analysis_results, response_encoding)
+
+def annotation_payload(event) -> dict:
+    """Normalized view data (or an input reference, see view_input) under event['prev'];
+    raises TypeError/ValueError for malformed events."""
     if not isinstance(event, dict):
         logging.error("Input event is not a dictionary.")
         raise TypeError("Input event must be a dictionary.")
@@ -490,9 +1229,179 @@ def handler(event, context):
     if not isinstance(actual_annotation_data, dict):
         logging.error(f"Data under 'prev' key is not a dictionary, type found: {type(actual_annotation_data)}")
         raise TypeError(f"Data under 'prev' key must be a dictionary, got {type(actual_annotation_data)}.")
+    return actual_annotation_data
+
+def handler(event, context):
+    """Lambda entrypoint: expects {'prev': <normalized data>} from TS step, or {'prev': {'ref': <path>, 'format':
+    'json'|'ndjson'}} referencing the data in storage for views beyond the payload limit (see view_input).
+    Optional arguments: responseEncoding (table encoding), sections, runs, confusionFormat, topConfusions and
+    majorityTieBreak (see run_analysis), incremental with viewId (keep ViewStatistics of the view across warm invocations and
+    apply only newer results), asOf or timeBucket (adds agreement_over_time at those checkpoints).
+    """
+    logging.info("Lambda handler started.")
+    final_response_body = analyze_view(annotation_payload(event), event.get('arguments') or {})
+    logging.info("Lambda handler finished. Returning data dictionary.")
+    return final_response_body
 
-    analysis_results = run_analysis(actual_annotation_data)
+def batch_handler(event, context):
+    """Lambda entrypoint for several views in one invocation (one cold start, one warm cache for all of them).
+    Expects {'views': [{'viewId': ..., 'prev': <normalized data>, 'arguments': {...}}, ...]}; top-level
+    'arguments' are defaults for every view. Returns {'views': [...]} in input order, each entry holding
+    the viewId and either the handler 'result' or an 'error' message, so one bad view does not fail the batch.
+    """
+    logging.info("Lambda batch handler started.")
+    if not isinstance(event, dict) or not isinstance(event.get('views'), list):
+        raise ValueError("The 'views' key with a list of view payloads is required in the event payload.")
+    shared_arguments = event.get('arguments') or {}
+    view_results = []
+    for view_event in event['views']:
+        view_id = view_event.get('viewId') if isinstance(view_event, dict) else None
+        try:
+            view_data = annotation_payload(view_event)
+            arguments = {**shared_arguments, **(view_event.get('arguments') or {})}
+            if view_id is not None: arguments.setdefault('viewId', view_id)
+            view_results.append({"viewId": view_id, "result": analyze_view(view_data, arguments)})
+        except Exception as e:
+            logging.exception(f"Analytics failed for view {view_id}.")
+            view_results.append({"viewId": view_id, "error": f"{type(e).__name__}: {e}"})
+    logging.info(f"Lambda batch handler finished: {len(view_results)} views.")
+    return {"views": view_results}
+
+def analyze_view(actual_annotation_data: dict, arguments: dict) -> dict:
+    """Response body for one view's normalized data and query arguments (see handler).
+    With arguments.profile (or ANALYTICS_PROFILE set) stage spans and input dimensions are logged as JSON lines;
+    arguments.profile also adds them as the response's profile section and bypasses the result cache.
+    """
+    profile_requested = bool(arguments.get('profile'))
+    with profiled(profiling_requested(profile_requested)) as profiler:
+        with span('total'):
+            final_response_body = compute_view_response(actual_annotation_data, arguments,
+                                                        use_cache=not profile_requested)
+    if profiler is not None and profiler.spans:
+        profiler.log(viewId=arguments.get('viewId'))
+        if profile_requested: final_response_body = {**final_response_body, "profile": profiler.to_dict()}
+    return final_response_body
+
+def compute_view_response(actual_annotation_data: dict, arguments: dict, use_cache: bool = True) -> dict:
+    response_encoding = resolve_response_encoding(arguments.get('responseEncoding'))
+    sections, runs = resolve_analysis_sections(arguments.get('sections')), arguments.get('runs')
+    handler_logs = []
+    if response_encoding == 'artifacts' and 'annotations_long_format' in sections:
+        # The long format is the wide overview melted over its label columns; clients derive it from that table.
+        sections.remove('annotations_long_format')
+        handler_logs.append("annotations_long_format is not sent with responseEncoding 'artifacts'; "
+                            "melt overview_annotations_wide over its label_* columns instead.")
+    confusion_format = arguments.get('confusionFormat')
+    top_confusions = resolve_top_confusions(arguments.get('topConfusions'))
+    majority_tie_break = resolve_majority_tie_break(arguments.get('majorityTieBreak'))
+    as_of, time_bucket = arguments.get('asOf'), arguments.get('timeBucket')
+    if (as_of or time_bucket) and 'agreement_over_time' not in sections:
+        sections.append('agreement_over_time')
+    cache_options = {"responseEncoding": response_encoding, "sections": sections,
+                     "runs": sorted(runs) if runs is not None else None,
+                     "confusionFormat": confusion_format, "topConfusions": top_confusions,
+                     "majorityTieBreak": majority_tie_break, "asOf": as_of, "timeBucket": time_bucket}
+    if is_view_reference(actual_annotation_data):
+        with span('ingestion'):
+            actual_annotation_data = load_view_reference(actual_annotation_data)
+    elif actual_annotation_data:
+        with span('ingestion'):
+            actual_annotation_data = decode_view(actual_annotation_data)
+    use_cache = use_cache and RESULT_CACHE.enabled
+    if use_cache:
+        # Keyed by the decoded view (or a referenced object's content hash), not by re-serializing the payload.
+        key = cache_key(actual_annotation_data, cache_options, CODE_VERSION)
+        cached_body, tier = RESULT_CACHE.get(key)
+        if cached_body is not None:
+            logging.info(f"Lambda handler finished from the {tier} result cache.")
+            return {**cached_body, "logs": cached_body.get("logs", []) + handler_logs + [
+                f"Result cache: {tier} hit ({RESULT_CACHE.summary()})."]}
+
+    if any(output not in PANDAS_FREE_OUTPUTS for output in sections):
+        # DataFrame outputs import pandas anyway; importing it first lets ingestion use its hash tables.
+        import pandas  # noqa: F401
+    view_id = arguments.get('viewId') if arguments.get('incremental') else None
+    statistics = None
+    if view_id in VIEW_STATISTICS:
+        statistics = VIEW_STATISTICS[view_id]
+        try:
+            if statistics.majority_tie_break != majority_tie_break:
+                raise ValueError("majorityTieBreak changed since the statistics were built")
+            with span('incremental_update'):
+                n_changed = statistics.apply_results(actual_annotation_data)
+            handler_logs.append(f"Incremental update: {n_changed} changed annotations applied to the view statistics.")
+        except ValueError as e:
+            statistics = None
+            VIEW_STATISTICS.pop(view_id)
+            handler_logs.append(f"Incremental update: rebuilding view statistics ({e}).")
+
+    analysis_results = run_analysis(actual_annotation_data, majority_tie_break, sections=sections, runs=runs,
+                                    statistics=statistics, confusion_format=confusion_format,
+                                    top_confusions=top_confusions, as_of=as_of, time_bucket=time_bucket)
+    if view_id:
+        VIEW_STATISTICS[view_id] = analysis_results["view_statistics"]
+        VIEW_STATISTICS.move_to_end(view_id)
+        while len(VIEW_STATISTICS) > VIEW_STATISTICS_MAX_VIEWS:
+            VIEW_STATISTICS.popitem(last=False)
+    if profiling_active():
+        table = analysis_results["annotation_table"]
+        record_dimensions(files=len(table.file_ids), runs=len(table.run_names), run_columns=len(table.run_columns),
+                          labels=table.n_labels, annotations=table.n_annotations, code_storage=table.storage)
+    with span('serialization'):
+        final_response_body = build_response_body(analysis_results, response_encoding)
+    if use_cache:
+        RESULT_CACHE.put(key, final_response_body)
+        handler_logs.append(f"Result cache: miss ({RESULT_CACHE.summary()}).")
+    if handler_logs:
+        final_response_body = {**final_response_body, "logs": final_response_body["logs"] + handler_logs}
+    return final_response_body
+
+SPARSE_CONFUSION_OUTPUTS = (("per_class_metrics_df", "per_class_metrics_table"),
+                            ("confusion_triples_df", "confusion_triples"),
+                            ("top_confusions_df", "top_confusions"))
+
+def format_sparse_confusion_outputs(pkg: dict, response_encoding: str, artifacts: TableArtifactWriter = None,
+                                    table_prefix: str = None) -> dict:
+    """Response fields for the sparse confusion frames of a metrics package (none for dense packages);
+    confusion triples go to the artifact when there is one, as they grow with the labels in use."""
+    formatted = {}
+    for source_key, target_key in SPARSE_CONFUSION_OUTPUTS:
+        df = pkg.get(source_key)
+        if df is None: continue
+        if artifacts is not None and target_key == "confusion_triples" and not df.empty:
+            formatted[target_key] = format_dataframe_as_artifact(df, f"{table_prefix}_{target_key}", artifacts)
+        else:
+            formatted[target_key] = format_dataframe_for_schema(df, response_encoding)
+    return formatted
+
+def format_run_evaluations(run_evals: list, response_encoding: str, artifacts: TableArtifactWriter = None,
+                           reference_name: str = "gold") -> list:
+    """AnnotationRunEvaluationResult entries for per-run metrics packages evaluated against reference_name."""
+    formatted_run_evals = []
+    for run_position, run_eval_item in enumerate(run_evals):
+        eval_metrics_pkg = run_eval_item.get("evaluation_metrics", {})
+        formatted_run_eval_dict = {
+            "annotation_run_name": run_eval_item.get("annotation_run_name"),
+            "metrics_summary": format_dataframe_for_schema(eval_metrics_pkg.get("global_metrics_df"), response_encoding),
+            "per_class_metrics": eval_metrics_pkg.get("per_class_metrics", []),
+            "confusion_matrix": format_dataframe_for_schema(eval_metrics_pkg.get("confusion_matrix_df"), response_encoding),
+            "log_messages": eval_metrics_pkg.get("log_messages", [])
+        }
+        formatted_run_eval_dict.update(format_sparse_confusion_outputs(eval_metrics_pkg, response_encoding, artifacts,
+                                                                       f"run_{run_position}_vs_{reference_name}"))
+        formatted_run_evals.append(formatted_run_eval_dict)
+    return formatted_run_evals
+
+def build_response_body(analysis_results: dict, response_encoding: str = 'rows') -> dict:
+    """Schema-shaped response (LambdaAnalyticsOutput) for run_analysis results.
+    response_encoding 'artifacts' puts the cells of the data_overview tables and confusion triples into one
+    artifact (see artifacts) and encodes the remaining (small) tables as 'columnar'.
+    """
+    # Frames only exist if a stage imported pandas, so pandas-free results never load it here.
+    pd = sys.modules.get('pandas')
     final_response_body = {"logs": analysis_results.get("logs", [])}
+    artifacts = TableArtifactWriter(artifact_dir()) if response_encoding == 'artifacts' else None
+    if artifacts is not None: response_encoding = 'columnar'
 
     data_overview_section = {}
     df_keys_for_overview = [
@@ -500,42 +1409,57 @@ def handler(event, context):
         ("annotations_long_format", "annotations_long_format"),
         ("inter_coder_contingency_matrix", "inter_coder_contingency_matrix"),
         ("majority_decision_annotations", "majority_decision_annotations"),
+        ("majority_decision_confidence", "majority_decision_confidence"),
         ("gold_standard_labels", "gold_standard_labels"),
         ("combined_comparison_table", "combined_comparison_table")
     ]
     for source_key, target_key in df_keys_for_overview:
         item = analysis_results["dataframes"].get(source_key)
         formatted_item = None
-        if isinstance(item, pd.DataFrame):
-            formatted_item = format_dataframe_for_schema(item)
+        if pd is None:
+            pass
+        elif artifacts is not None and isinstance(item, pd.DataFrame) and not item.empty:
+            formatted_item = format_dataframe_as_artifact(item, target_key, artifacts)
+        elif artifacts is not None and isinstance(item, pd.Series) and not item.empty:
+            series_summary = format_dataframe_as_artifact(item.to_frame(), target_key, artifacts)
+            formatted_item = {"index": [], "data": [], "artifact": series_summary["artifact"]}
+            if item.name: formatted_item["name"] = str(item.name)
+        elif isinstance(item, pd.DataFrame):
+            formatted_item = format_dataframe_for_schema(item, response_encoding)
         elif isinstance(item, pd.Series):
             formatted_item = format_series_for_schema(item)
         if formatted_item is not None: data_overview_section[target_key] = formatted_item
     pairwise_matrices_list = []
     raw_pairwise_matrices = analysis_results["dataframes"].get("pairwise_run_contingency_matrices", [])
-    for matrix_info in raw_pairwise_matrices:
-        formatted_matrix = format_dataframe_for_schema(matrix_info.get("contingency_matrix_df"))
+    for matrix_position, matrix_info in enumerate(raw_pairwise_matrices):
+        # Sparse confusion output sends the nonzero cells (contingency_triples) in place of the crosstab.
+        matrix_key = "contingency_triples" if "contingency_triples_df" in matrix_info else "contingency_matrix"
+        matrix_df = matrix_info.get(f"{matrix_key}_df")
+        if artifacts is not None and matrix_df is not None:
+            formatted_matrix = format_dataframe_as_artifact(matrix_df, f"pairwise_{matrix_position}", artifacts)
+        else:
+            formatted_matrix = format_dataframe_for_schema(matrix_df, response_encoding)
         pairwise_matrices_list.append({
-compared_runs": f"{matrix_info.get('run_1_name', 'UnknownRun1')} vs {matrix_info.get('run_2_name', 'UnknownRun2')}",
-run_1_name": matrix_info.get('run_1_name'),
-run_2_name": matrix_info.get('run_2_name'),
-contingency_matrix": formatted_matrix
+            "compared_runs": f"{matrix_info.get('run_1_name', 'UnknownRun1')} vs {matrix_info.get('run_2_name', 'UnknownRun2')}",
+            "run_1_name": matrix_info.get('run_1_name'),
+            "run_2_name": matrix_info.get('run_2_name'),
+            matrix_key: formatted_matrix
         })
     if pairwise_matrices_list: data_overview_section["pairwise_run_contingency_matrices"] = pairwise_matrices_list
     if data_overview_section: final_response_body["data_overview"] = data_overview_section
 
     irr_section = {}
     metrics_irr = analysis_results["metrics"].get("inter_rater_reliability", {})
-    k_alpha = metrics_irr.get("krippendorff_alpha")
-    irr_section["krippendorff_alpha"] = k_alpha
+    if "krippendorff_alpha" in metrics_irr:
+        irr_section["krippendorff_alpha"] = metrics_irr["krippendorff_alpha"]
 
     kappa_output = {}
     kappa_maj_vs_gold_df = metrics_irr.get("cohens_kappa_majority_vs_gold")
     if kappa_maj_vs_gold_df is not None:
-        kappa_output["majority_vs_gold"] = format_dataframe_for_schema(kappa_maj_vs_gold_df)
+        kappa_output["majority_vs_gold"] = format_dataframe_for_schema(kappa_maj_vs_gold_df, response_encoding)
     kappa_between_runs_df = metrics_irr.get("cohens_kappa_between_annotation_runs")
     if kappa_between_runs_df is not None:
-        kappa_output["between_annotation_runs"] = format_dataframe_for_schema(kappa_between_runs_df)
+        kappa_output["between_annotation_runs"] = format_dataframe_for_schema(kappa_between_runs_df, response_encoding)
     if kappa_output: irr_section["cohens_kappa"] = kappa_output
 
     if irr_section.get("krippendorff_alpha") is not None or irr_section.get("cohens_kappa"):
@@ -548,33 +1472,34 @@ contingency_matrix": formatted_matrix
     maj_vs_gold_eval_pkg = metrics_model_eval.get("majority_decision_vs_gold_standard")
     if maj_vs_gold_eval_pkg:
         current_eval_output = {
-metrics_summary": format_dataframe_for_schema(maj_vs_gold_eval_pkg.get("global_metrics_df")),
-per_class_metrics": maj_vs_gold_eval_pkg.get("per_class_metrics"),
-confusion_matrix": format_dataframe_for_schema(maj_vs_gold_eval_pkg.get("confusion_matrix_df")),
-log_messages": maj_vs_gold_eval_pkg.get("log_messages", [])
+            "metrics_summary": format_dataframe_for_schema(maj_vs_gold_eval_pkg.get("global_metrics_df"), response_encoding),
+            "per_class_metrics": maj_vs_gold_eval_pkg.get("per_class_metrics"),
+            "confusion_matrix": format_dataframe_for_schema(maj_vs_gold_eval_pkg.get("confusion_matrix_df"), response_encoding),
+            "log_messages": maj_vs_gold_eval_pkg.get("log_messages", [])
         }
         final_maj_eval = {}
         final_maj_eval["metrics_summary"] = current_eval_output["metrics_summary"]
         final_maj_eval["per_class_metrics"] = current_eval_output.get("per_class_metrics", [])
         final_maj_eval["confusion_matrix"] = current_eval_output["confusion_matrix"]
         final_maj_eval["log_messages"] = current_eval_output.get("log_messages", [])
+        final_maj_eval.update(format_sparse_confusion_outputs(maj_vs_gold_eval_pkg, response_encoding, artifacts,
+                                                              "majority_vs_gold"))
         model_eval_section["majority_decision_vs_gold_standard"] = final_maj_eval
 
-    runs_vs_gold_list_output = []
-    raw_runs_vs_gold_list = metrics_model_eval.get("annotation_runs_vs_gold_standard", [])
-    for run_eval_item in raw_runs_vs_gold_list:
-        eval_metrics_pkg = run_eval_item.get("evaluation_metrics", {})
-        formatted_run_eval_dict = {
-annotation_run_name": run_eval_item.get("annotation_run_name"),
-metrics_summary": format_dataframe_for_schema(eval_metrics_pkg.get("global_metrics_df")),
-per_class_metrics": eval_metrics_pkg.get("per_class_metrics", []),
-confusion_matrix": format_dataframe_for_schema(eval_metrics_pkg.get("confusion_matrix_df")),
-log_messages": eval_metrics_pkg.get("log_messages", [])
-        }
-        runs_vs_gold_list_output.append(formatted_run_eval_dict)
-
+    runs_vs_gold_list_output = format_run_evaluations(metrics_model_eval.get("annotation_runs_vs_gold_standard", []),
+                                                      response_encoding, artifacts, "gold")
     if runs_vs_gold_list_output: model_eval_section["annotation_runs_vs_gold_standard"] = runs_vs_gold_list_output
+    runs_vs_consensus_list_output = format_run_evaluations(
+        analysis_results["metrics"].get("consensus", {}).get("annotation_runs_vs_consensus") or [],
+        response_encoding, artifacts, "consensus")
+    if runs_vs_consensus_list_output:
+        model_eval_section["annotation_runs_vs_consensus"] = runs_vs_consensus_list_output
     if model_eval_section: final_response_body["model_evaluations"] = model_eval_section
 
-    logging.info("Lambda handler finished. Returning data dictionary.")
-    return final_response_body
\ No newline at end of file
+    agreement_over_time_df = analysis_results["metrics"].get("temporal", {}).get("agreement_over_time")
+    if agreement_over_time_df is not None:
+        final_response_body["temporal"] = {
+            "agreement_over_time": format_dataframe_for_schema(agreement_over_time_df, response_encoding)}
+    if artifacts is not None: artifacts.write()
+
+    return final_response_body
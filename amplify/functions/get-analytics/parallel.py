@@ -0,0 +1,89 @@
+"""
+Parallel execution (Python)
+ - Optional executor for the count builders behind the per-pair and per-run stages (pairwise run
+   contingency, confusion counts against gold); their counts are additive over files, so row blocks
+   of the shared coded arrays are counted independently and summed
+ - ANALYTICS_EXECUTOR selects 'serial' (default), 'thread' or 'process'; ANALYTICS_WORKERS overrides the
+   worker count (default: available CPUs); inputs below ANALYTICS_PARALLEL_MIN_ROWS rows stay serial
+ - 'process' needs POSIX semaphores (/dev/shm), which AWS Lambda lacks; use 'thread' there
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_ENV = "ANALYTICS_EXECUTOR"
+WORKERS_ENV = "ANALYTICS_WORKERS"
+MIN_ROWS_ENV = "ANALYTICS_PARALLEL_MIN_ROWS"
+EXECUTOR_KINDS = ('serial', 'thread', 'process')
+# Below this many rows pool dispatch costs more than the counting (see benchmarks/bench_executor.py).
+DEFAULT_MIN_ROWS = 50_000
+
+def available_cpus() -> int:
+    """CPUs this process may run on (affinity-aware where supported)."""
+    if hasattr(os, "sched_getaffinity"):
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+class AnalysisExecutor:
+    """
+    Runs a counting function over row blocks of aligned arrays and sums the partial counts.
+    Falls back to a single serial call for the 'serial' kind, one worker, or fewer than min_rows rows.
+    The pool is created on first use and kept for the life of the container.
+    """
+
+    def __init__(self, kind: str = 'serial', max_workers: int = None, min_rows: int = DEFAULT_MIN_ROWS):
+        if kind not in EXECUTOR_KINDS:
+            logging.warning(f"Unknown executor kind '{kind}', falling back to 'serial'.")
+            kind = 'serial'
+        self.kind = kind
+        self.max_workers = max_workers or available_cpus()
+        self.min_rows = min_rows
+        self._pool = None
+
+    @classmethod
+    def from_environment(cls):
+        workers = os.environ.get(WORKERS_ENV)
+        return cls(kind=os.environ.get(EXECUTOR_ENV) or 'serial', max_workers=int(workers) if workers else None,
+                   min_rows=int(os.environ.get(MIN_ROWS_ENV, DEFAULT_MIN_ROWS)))
+
+    @property
+    def parallel(self) -> bool:
+        return self.kind != 'serial' and self.max_workers > 1
+
+    def _get_pool(self):
+        if self._pool is None:
+            pool_class = ThreadPoolExecutor if self.kind == 'thread' else ProcessPoolExecutor
+            self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    def sum_row_blocks(self, count_fn, arrays: tuple, *args):
+        """
+        sum(count_fn(*blocks, *args)) over row blocks of arrays (aligned along axis 0), i.e. count_fn(*arrays, *args)
+        for counts that are additive over rows. count_fn must be a module-level function for the 'process' kind.
+        """
+        n_rows = len(arrays[0])
+        if not self.parallel or n_rows < self.min_rows:
+            return count_fn(*arrays, *args)
+        n_blocks = min(self.max_workers, n_rows)
+        bounds = [n_rows * i // n_blocks for i in range(n_blocks + 1)]
+        pool = self._get_pool()
+        futures = [pool.submit(count_fn, *(array[start:stop] for array in arrays), *args)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        total = futures[0].result()
+        for future in futures[1:]:
+            total = total + future.result()
+        return total
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+_EXECUTOR = None
+
+def analysis_executor() -> AnalysisExecutor:
+    """Process-wide executor configured from the environment on first use."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = AnalysisExecutor.from_environment()
+    return _EXECUTOR
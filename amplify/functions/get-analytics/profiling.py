@@ -0,0 +1,98 @@
+"""
+Stage profiling (Python)
+ - Named spans with wall time, CPU time and peak-RSS growth; tracemalloc peak when tracing is active
+   (e.g. PYTHONTRACEMALLOC=1), since tracing slows every allocation
+ - Input dimensions (files, runs, labels, annotations) next to the spans
+ - Spans attach to the profiler active in the current context; without one, span() is a shared no-op
+"""
+import contextvars
+import json
+import logging
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PROFILE_ENV = "ANALYTICS_PROFILE"
+_ACTIVE = contextvars.ContextVar("analytics_profiler", default=None)
+_NO_SPAN = nullcontext()
+
+def _peak_rss_kb() -> int:
+    """Peak resident set size of this process so far (KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def profiling_requested(requested: bool = False) -> bool:
+    """True if the caller asked for a profile or ANALYTICS_PROFILE is set."""
+    return bool(requested) or os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+class StageProfiler:
+    """Collects spans (in start order, with nesting depth) and input dimensions of one analysis."""
+
+    def __init__(self):
+        self.spans = []
+        self.dimensions = {}
+        self._depth = 0
+        self._tracemalloc_peaks = []
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        record = {"name": name, "depth": self._depth, **attributes}
+        self.spans.append(record)
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            start_traced, peak_so_far = tracemalloc.get_traced_memory()
+            # Keep the enclosing span's peak before this span resets the counter.
+            if self._tracemalloc_peaks: self._tracemalloc_peaks[-1] = max(self._tracemalloc_peaks[-1], peak_so_far)
+            tracemalloc.reset_peak()
+            self._tracemalloc_peaks.append(start_traced)
+        start_rss, start_cpu, start_wall = _peak_rss_kb(), time.process_time(), time.perf_counter()
+        self._depth += 1
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record["wall_s"] = time.perf_counter() - start_wall
+            record["cpu_s"] = time.process_time() - start_cpu
+            record["rss_peak_delta_kb"] = _peak_rss_kb() - start_rss
+            record["tracemalloc_peak_kb"] = None
+            if tracing:
+                # The stack entry carries the largest peak of spans nested in this one.
+                peak = max(tracemalloc.get_traced_memory()[1], self._tracemalloc_peaks.pop())
+                record["tracemalloc_peak_kb"] = (peak - start_traced) // 1024
+                if self._tracemalloc_peaks: self._tracemalloc_peaks[-1] = max(self._tracemalloc_peaks[-1], peak)
+
+    def to_dict(self) -> dict:
+        return {"spans": self.spans, "dimensions": self.dimensions}
+
+    def log(self, **context):
+        """One structured JSON log line per span and one for the dimensions, for log aggregation."""
+        for record in self.spans:
+            logging.info(json.dumps({"event": "analytics_span", **context, **record}))
+        logging.info(json.dumps({"event": "analytics_dimensions", **context, **self.dimensions}))
+
+@contextmanager
+def profiled(enabled: bool):
+    """Activates a StageProfiler for the enclosed code (yields None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    profiler = StageProfiler()
+    token = _ACTIVE.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _ACTIVE.reset(token)
+
+def span(name: str, **attributes):
+    """Span on the active profiler (attributes are copied into its record); a no-op context when profiling is off."""
+    profiler = _ACTIVE.get()
+    return _NO_SPAN if profiler is None else profiler.span(name, **attributes)
+
+def record_dimensions(**dimensions):
+    """Adds input dimensions to the active profiler, if any."""
+    profiler = _ACTIVE.get()
+    if profiler is not None: profiler.dimensions.update(dimensions)
+
+def profiling_active() -> bool:
+    return _ACTIVE.get() is not None
@@ -1,4 +1,5 @@
 import { execSync } from "node:child_process";
+import { cpSync, readdirSync } from "node:fs";
 import * as path from "node:path";
 import { fileURLToPath } from "node:url";
 import { defineFunction } from "@aws-amplify/backend";
@@ -6,6 +7,8 @@ import { DockerImage, Duration } from "aws-cdk-lib";
 import { Code, Function, Runtime } from "aws-cdk-lib/aws-lambda";
 
 const functionDir = path.dirname(fileURLToPath(import.meta.url));
+// Development-only entries of the function directory that are not deployed with the handler
+const bundleExcludes = ["tests", "benchmarks", "__pycache__", ".pytest_cache"];
 
 export const getAnalytics = defineFunction(
     (scope) =>
@@ -14,7 +17,14 @@ export const getAnalytics = defineFunction(
             runtime: Runtime.PYTHON_3_11,
             timeout: Duration.seconds(60), //  default is 3 seconds
             memorySize: 1024,
+            environment: {
+                // Optional on-disk tier of the result cache (see result_cache.py); /tmp survives warm invocations
+                ANALYTICS_CACHE_DIR: "/tmp/analytics-cache",
+                // The pair/run count builders run serially (parallel.py). ANALYTICS_EXECUTOR: "thread" only helps with
+                // more than one vCPU (memorySize >= 1769 MB); enable it once benchmarks/bench_executor.py shows a win there
+            },
             code: Code.fromAsset(functionDir, {
+                exclude: bundleExcludes,
                 bundling: {
                     image: DockerImage.fromRegistry("aws/codebuild/amazonlinux-x86_64-standard:5.0"), // replace with desired image from AWS ECR Public Gallery
                     local: {
@@ -22,7 +32,10 @@ export const getAnalytics = defineFunction(
                             execSync(
                                 `python3.11 -m pip install -r ${path.join(functionDir, "requirements.txt")} -t ${path.join(outputDir)} --platform manylinux2014_x86_64 --only-binary=:all:`
                             );
-                            execSync(`cp -r ${functionDir}/* ${path.join(outputDir)}`);
+                            for (const entry of readdirSync(functionDir)) {
+                                if (bundleExcludes.includes(entry)) continue;
+                                cpSync(path.join(functionDir, entry), path.join(outputDir, entry), { recursive: true });
+                            }
                             return true;
                         },
                     },
@@ -0,0 +1,170 @@
+"""
+Result cache (Python)
+ - Memoizes handler response bodies by a content hash of the decoded view and request options
+ - In-process LRU for warm containers bounded by entries and encoded bytes, plus an optional on-disk tier
+   (e.g. /tmp) with size-based eviction
+ - Keys include a code version (hash of this function's modules and numpy/pandas versions), so deploys invalidate
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from importlib import metadata
+import numpy as np
+
+CACHE_DIR_ENV = "ANALYTICS_CACHE_DIR"
+CACHE_MAX_ENTRIES_ENV = "ANALYTICS_CACHE_MAX_ENTRIES"
+CACHE_MAX_BYTES_ENV = "ANALYTICS_CACHE_MAX_BYTES"
+CACHE_MEMORY_MAX_BYTES_ENV = "ANALYTICS_CACHE_MEMORY_MAX_BYTES"
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_MAX_BYTES = 32 * 1024 * 1024
+_MODULE_FILES = ("index.py", "fklearn.py", "annotation_table.py", "result_cache.py", "parallel.py",
+                 "profiling.py", "view_input.py", "artifacts.py")
+
+def code_version() -> str:
+    """Hash of the analytics modules plus numpy/pandas versions."""
+    # The installed pandas version is read from its metadata, so hashing does not import pandas.
+    digest = hashlib.sha256(f"numpy={np.__version__};pandas={metadata.version('pandas')}".encode())
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    for file_name in _MODULE_FILES:
+        path = os.path.join(module_dir, file_name)
+        if os.path.exists(path):
+            with open(path, "rb") as module_file:
+                digest.update(module_file.read())
+    return digest.hexdigest()[:16]
+
+def cache_key(view, options: dict, version: str) -> str:
+    """
+    Stable content hash of a DecodedView, the request options and the code version. Referenced views are keyed
+    by their source_digest; inline views by their structure_key plus the raw bytes of the result columns,
+    so the payload's dict tree is never serialized again. Anything else (an empty payload) hashes as no input.
+    """
+    digest = hashlib.sha256(version.encode())
+    digest.update(json.dumps(options, sort_keys=True, separators=(",", ":"), default=str).encode())
+    if getattr(view, 'source_digest', None):
+        digest.update(f"source={view.source_digest}".encode())
+    elif hasattr(view, 'structure_key'):
+        digest.update(f"structure={view.structure_key}".encode())
+        for name, values in view.columns.items():
+            digest.update(name.encode())
+            # Object columns hold str (or None); repr of the list is one C-level pass and keeps None apart from 'None'.
+            digest.update(values.tobytes() if values.dtype != object else repr(values.tolist()).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Two-tier LRU of response bodies. The memory tier holds the compact JSON encodings of up to max_entries
+    bodies, at most memory_max_bytes of them (a body larger than that is not kept in memory); the disk tier
+    (enabled by cache_dir) stores gzipped JSON files and evicts least recently used files beyond max_bytes.
+    Counters accumulate over the life of the container.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, cache_dir: str = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, memory_max_bytes: int = DEFAULT_MEMORY_MAX_BYTES):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_bytes = 0
+        self._entries = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @classmethod
+    def from_environment(cls):
+        return cls(max_entries=int(os.environ.get(CACHE_MAX_ENTRIES_ENV, DEFAULT_MAX_ENTRIES)),
+                   cache_dir=os.environ.get(CACHE_DIR_ENV) or None,
+                   max_bytes=int(os.environ.get(CACHE_MAX_BYTES_ENV, DEFAULT_MAX_BYTES)),
+                   memory_max_bytes=int(os.environ.get(CACHE_MEMORY_MAX_BYTES_ENV, DEFAULT_MEMORY_MAX_BYTES)))
+
+    @property
+    def memory_enabled(self) -> bool:
+        return self.max_entries > 0 and self.memory_max_bytes > 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_enabled or bool(self.cache_dir)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def _remember(self, key: str, encoded: str):
+        """Keeps a body's compact JSON encoding in the memory tier."""
+        if not self.memory_enabled: return
+        if key in self._entries:
+            self.memory_bytes -= len(self._entries.pop(key))
+        if len(encoded) > self.memory_max_bytes: return
+        self._entries[key] = encoded
+        self.memory_bytes += len(encoded)
+        while len(self._entries) > self.max_entries or self.memory_bytes > self.memory_max_bytes:
+            self.memory_bytes -= len(self._entries.popitem(last=False)[1])
+
+    def get(self, key: str):
+        """
+        (body, tier) for a cached key, tier being 'memory' or 'disk'; (None, None) on a miss. Both tiers hold
+        encoded bodies, so every hit decodes a fresh body the caller may change without touching the cache.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return json.loads(self._entries[key]), "memory"
+        if self.cache_dir:
+            path = self._path(key)
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as cache_file:
+                    encoded = cache_file.read()
+                body = json.loads(encoded)
+                os.utime(path)
+            except FileNotFoundError:
+                body = None
+            except (OSError, ValueError) as e:
+                logging.warning(f"Result cache: unreadable entry {path} ({e}); ignoring it.")
+                body = None
+            if body is not None:
+                self._remember(key, encoded)
+                self.counters["disk_hits"] += 1
+                return body, "disk"
+        self.counters["misses"] += 1
+        return None, None
+
+    def put(self, key: str, body: dict):
+        if not self.memory_enabled and not self.cache_dir: return
+        try:
+            encoded = json.dumps(body, separators=(",", ":"))
+        except (TypeError, ValueError) as e:
+            logging.warning(f"Result cache: could not encode entry for {key} ({e}).")
+            return
+        self._remember(key, encoded)
+        if not self.cache_dir: return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(key)}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as cache_file:
+                cache_file.write(encoded)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except OSError as e:
+            logging.warning(f"Result cache: could not write entry for {key} ({e}).")
+
+    def _evict(self):
+        """Removes least recently used files until the disk tier fits max_bytes."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json.gz"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def summary(self) -> str:
+        return (f"hits={self.counters['memory_hits'] + self.counters['disk_hits']} "
+                f"(memory={self.counters['memory_hits']}, disk={self.counters['disk_hits']}) "
+                f"misses={self.counters['misses']} memory_bytes={self.memory_bytes}")
@@ -0,0 +1,5 @@
+"""Tests import the function's modules the way the Lambda runtime does: from the function directory."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,31 @@
+"""agreement_over_time (asOf / timeBucket replays) through compute_view_response."""
+import pytest
+from index import compute_view_response
+
+def view(gold_labels, results_by_run):
+    return {'result': {
+        'files': [{'file': {'id': file_id, 'name': f'{file_id}.png'}, 'label': {'name': label} if label else {}}
+                  for file_id, label in gold_labels.items()],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': created_at}
+            for file_id, label, created_at in results]} for run_name, results in results_by_run.items()]}}
+
+def agreement_over_time(payload, arguments):
+    body = compute_view_response(payload, arguments, use_cache=False)
+    frame = body['temporal']['agreement_over_time']
+    return frame, [dict(zip(frame['columns'], row['values'])) for row in frame['data_rows']]
+
+@pytest.mark.parametrize('arguments', [{'asOf': ['2024-01-01T00:00:00Z']}, {'timeBucket': '1D'}])
+def test_view_without_labels(arguments):
+    payload = view({'f1': None, 'f2': None}, {'r1': [], 'r2': []})
+    frame, rows = agreement_over_time(payload, arguments)
+    assert all(row['Annotations'] == 0 for row in rows)
+    assert len(frame['index']) == len(arguments.get('asOf', []))
+
+def test_unlabelled_gold_files_next_to_labelled_ones():
+    payload = view({'f1': 'cat', 'f2': None, 'f3': 'dog'},
+                   {'r1': [('f1', 'cat', '2024-01-01T10:00:00Z'), ('f3', 'cat', '2024-01-02T10:00:00Z')]})
+    frame, rows = agreement_over_time(payload, {'asOf': ['2024-01-01T12:00:00Z', '2024-01-02T12:00:00Z']})
+    assert frame['index'] == ['2024-01-01T12:00:00+00:00', '2024-01-02T12:00:00+00:00']
+    assert [row['Annotations'] for row in rows] == [1, 2]
+    assert [row['Accuracy (r1)'] for row in rows] == [1.0, 0.5]
@@ -0,0 +1,90 @@
+"""responseEncoding 'artifacts': .npz tables round-trip to the response tables and load without pickle."""
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from artifacts import ARTIFACT_DIR_ENV, TableArtifactWriter
+from index import compute_view_response, format_column_values, resolve_response_encoding
+
+def read_table(arrays, table_name: str) -> dict:
+    """Columns, index and cell values (None = null) of one table of a loaded artifact."""
+    columns = arrays[f"{table_name}.columns"].tolist()
+    cells = []
+    for position in range(len(columns)):
+        if f"{table_name}.{position}.values" in arrays:
+            values = arrays[f"{table_name}.{position}.values"]
+            cells.append([None if isinstance(value, float) and np.isnan(value) else value for value in values.tolist()])
+        else:
+            codes = arrays[f"{table_name}.{position}.codes"]
+            dictionary = arrays[f"{table_name}.{position}.dictionary"].tolist()
+            cells.append([None if code < 0 else dictionary[code] for code in codes.tolist()])
+    return {"columns": columns, "index": arrays[f"{table_name}.index"].tolist(), "data_columns": cells}
+
+def load(directory, key):
+    with np.load(os.path.join(directory, key), allow_pickle=False) as artifact:
+        return {name: artifact[name] for name in artifact.files}
+
+FRAME = pd.DataFrame({'label': ['cat', None, 'dog', 'cat'], 'count': [3, 1, 0, 2],
+                      'share': [0.5, np.nan, 0.25, 1.0], 'mixed': ['a', 1, None, 2.5]},
+                     index=pd.Index(['f1', 'f2', 'f3', 'f4']))
+
+def frame_values(df):
+    return [format_column_values(df.iloc[:, position]) for position in range(df.shape[1])]
+
+def test_npz_round_trips_to_the_original_table(tmp_path):
+    writer = TableArtifactWriter(str(tmp_path))
+    summary = writer.add_frame('frame', FRAME, frame_values(FRAME))
+    key = writer.write()
+    assert summary["artifact"] == {"key": key, "format": "npz", "table": "frame", "rows": 4}
+    assert summary["data_rows"] == [] and summary["columns"] == ['label', 'count', 'share', 'mixed']
+    table = read_table(load(tmp_path, key), 'frame')
+    assert table == {"columns": ['label', 'count', 'share', 'mixed'], "index": ['f1', 'f2', 'f3', 'f4'],
+                     "data_columns": [['cat', None, 'dog', 'cat'], [3, 1, 0, 2], [0.5, None, 0.25, 1.0],
+                                      ['a', '1', None, '2.5']]}
+
+def test_identical_tables_share_one_artifact(tmp_path):
+    keys = []
+    for _ in range(2):
+        writer = TableArtifactWriter(str(tmp_path))
+        writer.add_frame('frame', FRAME, frame_values(FRAME))
+        keys.append(writer.write())
+    assert keys[0] == keys[1] and os.listdir(tmp_path) == [keys[0]]
+    assert TableArtifactWriter(str(tmp_path)).write() is None
+
+def view():
+    gold = {'f1': 'a', 'f2': 'b', 'f3': 'c'}
+    results = {'r1': {'f1': 'a', 'f2': 'c', 'f3': 'c'}, 'r2': {'f1': 'a', 'f2': 'b'}}
+    return {'result': {
+        'files': [{'file': {'id': file_id, 'name': f'{file_id}.png'}, 'label': {'name': label}}
+                  for file_id, label in gold.items()],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in run_results.items()]} for run_name, run_results in results.items()]}}
+
+def test_artifact_tables_equal_the_rows_response(tmp_path, monkeypatch):
+    monkeypatch.setenv(ARTIFACT_DIR_ENV, str(tmp_path))
+    rows = compute_view_response(view(), {'responseEncoding': 'rows'}, use_cache=False)['data_overview']
+    offloaded = compute_view_response(view(), {'responseEncoding': 'artifacts'}, use_cache=False)['data_overview']
+    tables = {name: summary for name, summary in offloaded.items() if isinstance(summary, dict) and 'columns' in summary
+              and 'artifact' in summary}
+    assert {'overview_annotations_wide', 'inter_coder_contingency_matrix', 'combined_comparison_table'} <= tables.keys()
+    (key,) = {summary['artifact']['key'] for summary in tables.values()}
+    arrays = load(tmp_path, key)
+    for name, summary in tables.items():
+        expected = rows[name]
+        table = read_table(arrays, summary['artifact']['table'])
+        assert table['columns'] == expected['columns'] == summary['columns'], name
+        assert table['index'] == expected['index'], name
+        expected_columns = [list(column) for column in zip(*(row['values'] for row in expected['data_rows']))]
+        assert table['data_columns'] == expected_columns, name
+
+@pytest.mark.parametrize('unset', [True, False])
+def test_artifacts_fall_back_to_columnar_without_a_directory(monkeypatch, unset):
+    if unset: monkeypatch.delenv(ARTIFACT_DIR_ENV, raising=False)
+    else: monkeypatch.setenv(ARTIFACT_DIR_ENV, '')
+    assert resolve_response_encoding('artifacts') == 'columnar'
+    body = compute_view_response(view(), {'responseEncoding': 'artifacts'}, use_cache=False)
+    overview = body['data_overview']['overview_annotations_wide']
+    assert 'artifact' not in overview and overview['data_columns']
+    assert body == compute_view_response(view(), {'responseEncoding': 'columnar'}, use_cache=False) | {
+        'logs': body['logs']}
@@ -0,0 +1,72 @@
+"""Sparse (SparseCodes) and dense code layouts give identical counts, also after incremental replace_cells."""
+from dataclasses import replace
+import numpy as np
+import pytest
+from annotation_table import CODE_STORAGE_ENV
+from index import ViewStatistics
+from view_input import decode_view
+
+LABELS = ['a', 'b', 'c', 'd']
+
+def random_view(seed=0, n_files=60, n_runs=5, fill=0.3):
+    rng = np.random.default_rng(seed)
+    file_ids = [f'f{i:02d}' for i in range(n_files)]
+    gold = [(file_id, LABELS[rng.integers(len(LABELS))]) for file_id in file_ids[::2]]
+    classifications = []
+    for run in range(n_runs):
+        annotated = [file_id for file_id in file_ids if rng.random() < fill]
+        classifications.append({'name': f'r{run}', 'results': [
+            {'fileId': file_id, 'label': {'name': LABELS[rng.integers(len(LABELS))]},
+             'createdAt': '2024-01-01T00:00:00Z'} for file_id in annotated]})
+    files = [{'file': {'id': file_id, 'name': file_id}, 'label': {'name': label}} for file_id, label in gold]
+    return decode_view({'result': {'files': files, 'classifications': classifications}}), gold
+
+def statistics(monkeypatch, storage, view, gold):
+    monkeypatch.setenv(CODE_STORAGE_ENV, storage)
+    built = ViewStatistics.from_annotation_data(view, gold_labels=gold)
+    assert built.table.storage == storage
+    return built
+
+def counts(built: ViewStatistics) -> dict:
+    coincidences = built.coincidence_counts
+    return {'vote_counts': built.vote_counts, 'majority_codes': built.majority_codes,
+            'pair_counts': built.table.run_pair_contingency.counts,
+            'by_pairable': coincidences.by_pairable, 'label_totals': coincidences.label_totals,
+            'units_with_values': coincidences.units_with_values,
+            'gold_confusion_by_column': built.gold_confusion_by_column,
+            'majority_gold_confusion': built.majority_gold_confusion}
+
+def assert_same_counts(left: dict, right: dict):
+    assert left.keys() == right.keys()
+    for name in left:
+        np.testing.assert_array_equal(left[name], right[name], err_msg=name)
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_sparse_and_dense_counts_are_identical(monkeypatch, seed):
+    view, gold = random_view(seed)
+    sparse, dense = statistics(monkeypatch, 'sparse', view, gold), statistics(monkeypatch, 'dense', view, gold)
+    np.testing.assert_array_equal(sparse.table.codes.to_dense(), dense.table.codes)
+    assert_same_counts(counts(sparse), counts(dense))
+    assert sparse.coincidence_counts.alpha() == pytest.approx(dense.coincidence_counts.alpha(), rel=1e-12)
+
+def test_replace_cells_keeps_sparse_counts_equal_to_dense(monkeypatch):
+    view, gold = random_view(3)
+    sparse, dense = statistics(monkeypatch, 'sparse', view, gold), statistics(monkeypatch, 'dense', view, gold)
+    counts(sparse), counts(dense)  # computed counts are the ones replace_cells keeps current
+    rng = np.random.default_rng(7)
+    n_columns = dense.table.codes.shape[1]
+    overview_rows = np.flatnonzero(dense.table.in_overview)
+    for _ in range(3):
+        # A mix of filled cells (relabelled or unchanged) and empty cells (new annotations).
+        file_rows = rng.choice(overview_rows, size=15, replace=False)
+        run_columns = rng.integers(n_columns, size=15)
+        new_codes = rng.integers(len(dense.table.labels), size=15).astype(dense.table.codes.dtype)
+        assert sparse.replace_cells(file_rows, run_columns, new_codes) == dense.replace_cells(
+            file_rows, run_columns, new_codes)
+        np.testing.assert_array_equal(sparse.table.codes.to_dense(), dense.table.codes)
+        assert_same_counts(counts(sparse), counts(dense))
+    assert sparse.table.storage == 'sparse'
+    # The updated counts also equal those of statistics built from the updated codes.
+    for built in (sparse, dense):
+        rebuilt = ViewStatistics(replace(dense.table, codes=dense.table.codes.copy()), None, None, {})
+        assert_same_counts(counts(built), counts(rebuilt))
@@ -0,0 +1,64 @@
+"""
+Pairwise Cohen's kappa rules of the vectorized code (format_pairwise_kappa / cohen_kappa_from_confusion).
+Expected values are the outputs of the original per-pair DataFrame implementation of calculate_pairwise_kappa:
+NaN below an overlap of 2 units, 1.0 for two raters using one and the same label (p_e == 1).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from fklearn import cohen_kappa_from_confusion, cohen_kappa_score
+from index import calculate_pairwise_kappa
+
+MISSING = np.nan
+RATINGS = pd.DataFrame({
+    'A': ['x', 'x', 'y', 'y', 'x', 'z'],
+    'B': ['x', 'y', 'y', 'y', 'x', 'z'],
+    'C': ['x', 'x', 'x', MISSING, MISSING, MISSING],
+    'D': [MISSING, MISSING, MISSING, MISSING, MISSING, 'x'],
+    'E': ['x', 'x', 'x', MISSING, MISSING, MISSING],
+    'F': ['y', 'y', 'y', MISSING, MISSING, MISSING],
+})
+# (Coder 1, Coder 2, Kappa, Overlap) from the original implementation.
+EXPECTED = [
+    ('A', 'B', 0.7391304347826089, 6), ('A', 'C', 0.0, 3), ('A', 'D', MISSING, 1), ('A', 'E', 0.0, 3),
+    ('A', 'F', 0.0, 3), ('B', 'C', 0.0, 3), ('B', 'D', MISSING, 1), ('B', 'E', 0.0, 3), ('B', 'F', 0.0, 3),
+    ('C', 'D', MISSING, 0), ('C', 'E', 1.0, 3), ('C', 'F', 0.0, 3), ('D', 'E', MISSING, 0),
+    ('D', 'F', MISSING, 0), ('E', 'F', 0.0, 3),
+]
+
+@pytest.fixture(scope='module')
+def kappa_rows():
+    result = calculate_pairwise_kappa(RATINGS, "Test")
+    return {(row['Coder 1'], row['Coder 2']): row for _, row in result.iterrows()}
+
+def test_all_pairs_match_the_original_implementation(kappa_rows):
+    assert list(kappa_rows) == [(coder_1, coder_2) for coder_1, coder_2, _, _ in EXPECTED]
+    for coder_1, coder_2, kappa, overlap in EXPECTED:
+        row = kappa_rows[(coder_1, coder_2)]
+        assert row['Overlap'] == overlap
+        np.testing.assert_allclose(row['Kappa'], kappa, rtol=1e-12, equal_nan=True)
+        assert row['Coding'] == "Test"
+
+def test_normal_pair(kappa_rows):
+    # p_o = 5/6, p_e = 13/36: kappa = 17/23
+    assert kappa_rows[('A', 'B')]['Kappa'] == pytest.approx(17 / 23, rel=1e-12)
+
+def test_insufficient_overlap_is_nan(kappa_rows):
+    assert np.isnan(kappa_rows[('A', 'D')]['Kappa']) and kappa_rows[('A', 'D')]['Overlap'] == 1
+    assert np.isnan(kappa_rows[('C', 'D')]['Kappa']) and kappa_rows[('C', 'D')]['Overlap'] == 0
+
+def test_same_constant_label_is_one(kappa_rows):
+    assert kappa_rows[('C', 'E')]['Kappa'] == 1.0
+    assert kappa_rows[('C', 'F')]['Kappa'] == 0.0
+
+def test_confusion_kernel_rules():
+    matrices = np.array([
+        [[2, 1, 0], [0, 2, 0], [0, 0, 1]],   # normal: A vs B above, labels x, y, z
+        [[3, 0, 0], [0, 0, 0], [0, 0, 0]],   # one shared label: p_e == 1 -> 1.0
+        [[0, 3, 0], [0, 0, 0], [0, 0, 0]],   # two different constant labels: p_e == 0 -> 0.0
+        [[0, 0, 0], [0, 0, 0], [0, 0, 0]],   # no overlap -> NaN
+    ])
+    kappa, overlap = cohen_kappa_from_confusion(matrices)
+    np.testing.assert_allclose(kappa, [17 / 23, 1.0, 0.0, np.nan], rtol=1e-12, equal_nan=True)
+    assert overlap.tolist() == [6, 3, 3, 0]
+    assert kappa[0] == pytest.approx(cohen_kappa_score(RATINGS['A'], RATINGS['B']), rel=1e-12)
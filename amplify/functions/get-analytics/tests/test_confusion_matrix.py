@@ -0,0 +1,62 @@
+"""
+confusion_matrix / batched_confusion_matrices against sklearn.metrics.confusion_matrix. Expected matrices were
+computed with scikit-learn 1.9 (labels passed sorted, as fklearn sorts an explicit labels argument; pairs with a
+missing value dropped first, as sklearn does not accept NaN labels).
+"""
+import numpy as np
+import pytest
+from fklearn import SparseCodes, batched_confusion_matrices, confusion_matrix
+
+Y_TRUE = ['cat', 'dog', 'dog', 'bird', 'cat', 'dog']
+Y_PRED = ['cat', 'cat', 'dog', 'bird', 'bird', 'dog']
+
+def test_matches_sklearn():
+    expected = [[1, 0, 0], [1, 1, 0], [0, 1, 2]]
+    assert confusion_matrix(Y_TRUE, Y_PRED).tolist() == expected
+
+def test_labels_missing_from_data_get_empty_rows_and_columns():
+    expected = [[1, 0, 0, 0], [1, 1, 0, 0], [0, 1, 2, 0], [0, 0, 0, 0]]
+    assert confusion_matrix(Y_TRUE, Y_PRED, labels=['fish', 'dog', 'cat', 'bird']).tolist() == expected
+
+def test_explicit_labels_drop_pairs_with_other_labels():
+    assert confusion_matrix(Y_TRUE, Y_PRED, labels=['cat', 'dog']).tolist() == [[1, 0], [1, 2]]
+    assert confusion_matrix(np.array(Y_TRUE, dtype=object), Y_PRED, labels=np.array(['dog', 'cat'])).tolist() == \
+        [[1, 0], [1, 2]]
+
+def test_pairs_with_missing_values_are_not_counted():
+    y_true = np.array(['a', np.nan, 'b', 'b', 'a', None], dtype=object)
+    y_pred = np.array(['a', 'b', np.nan, 'b', 'b', 'a'], dtype=object)
+    # sklearn on the complete pairs: ['a', 'b', 'a'] vs ['a', 'b', 'b']
+    assert confusion_matrix(y_true, y_pred).tolist() == [[1, 1], [0, 1]]
+
+def test_nan_in_a_string_list_is_a_label():
+    # np.asarray turns a float NaN among strings into the string 'nan' (as in the original loop implementation).
+    assert confusion_matrix(['a', 'b'], ['a', np.nan]).tolist() == [[1, 0, 0], [0, 0, 1], [0, 0, 0]]
+
+def test_numeric_labels_and_empty_input():
+    assert confusion_matrix([1, 2, 2, 3.0], [1, 2, 3, np.nan]).tolist() == [[1, 0, 0], [0, 1, 1], [0, 0, 0]]
+    assert confusion_matrix([], []).shape == (0, 0)
+
+def test_batched_shape_and_values():
+    true_codes = np.array([0, 1, 2, 1, -1, 0])
+    pred_codes = np.array([[0, 1], [1, 1], [2, -1], [0, 1], [1, 2], [-1, 0]])
+    expected = np.array([[[1, 0, 0], [1, 1, 0], [0, 0, 1]],
+                         [[1, 1, 0], [0, 2, 0], [0, 0, 0]]])
+    batched = batched_confusion_matrices(true_codes, pred_codes, 3)
+    assert batched.shape == (2, 3, 3)
+    np.testing.assert_array_equal(batched, expected)
+    sparse = SparseCodes.from_dense(pred_codes)
+    np.testing.assert_array_equal(batched_confusion_matrices(true_codes, sparse, 3), expected)
+
+def test_batched_without_predictors_or_units():
+    assert batched_confusion_matrices(np.array([0, 1]), np.zeros((2, 0), dtype=int), 2).shape == (0, 2, 2)
+    assert batched_confusion_matrices(np.zeros(0, dtype=int), np.zeros((0, 3), dtype=int), 2).tolist() == \
+        np.zeros((3, 2, 2), dtype=int).tolist()
+
+def test_random_inputs_match_sklearn():
+    sklearn_metrics = pytest.importorskip("sklearn.metrics")
+    rng = np.random.default_rng(0)
+    labels = np.array(['a', 'b', 'c', 'd'], dtype=object)
+    y_true, y_pred = labels[rng.integers(0, 4, 500)], labels[rng.integers(0, 3, 500)]
+    np.testing.assert_array_equal(confusion_matrix(y_true, y_pred),
+                                  sklearn_metrics.confusion_matrix(y_true, y_pred, labels=sorted(labels)))
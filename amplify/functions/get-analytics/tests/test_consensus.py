@@ -0,0 +1,25 @@
+"""annotation_runs_vs_consensus (sections=['consensus']) through the handler."""
+from index import compute_view_response, handler
+
+def view(results_by_run, file_ids=('f1', 'f2')):
+    return {'result': {
+        'files': [{'file': {'id': file_id, 'name': f'{file_id}.png'}, 'label': {}} for file_id in file_ids],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in results.items()]} for run_name, results in results_by_run.items()]}}
+
+def test_each_run_against_the_majority_of_the_others():
+    payload = view({'r1': {'f1': 'a', 'f2': 'b'}, 'r2': {'f1': 'a', 'f2': 'b'}, 'r3': {'f1': 'a', 'f2': 'a'}})
+    body = compute_view_response(payload, {'sections': ['consensus']}, use_cache=False)
+    evaluations = {evaluation['annotation_run_name']: evaluation
+                   for evaluation in body['model_evaluations']['annotation_runs_vs_consensus']}
+    # r1 and r2 agree on both files, so r3 is scored against a, b (consensus labels are the rows).
+    r3_matrix = evaluations['r3']['confusion_matrix']
+    assert r3_matrix['index'] == ['a', 'b']
+    assert [row['values'] for row in r3_matrix['data_rows']] == [[1, 0], [1, 0]]
+
+def test_runs_without_labelled_results():
+    payload = view({'r1': {}, 'r2': {}}, file_ids=('f1',))
+    body = handler({'prev': payload, 'arguments': {'sections': ['consensus']}}, None)
+    assert 'annotation_runs_vs_consensus' not in body.get('model_evaluations', {})
+    assert "Skipping consensus evaluations: No labelled results in the runs yet." in body['logs']
@@ -0,0 +1,51 @@
+"""ViewStatistics.apply_results against statistics rebuilt from the updated view."""
+import numpy as np
+import pytest
+from index import ViewStatistics
+from view_input import decode_view
+
+GOLD = [('f1', 'cat'), ('f2', 'dog'), ('f3', 'cat')]
+
+def view(results_by_run):
+    return decode_view({'result': {
+        'files': [{'file': {'id': file_id, 'name': f'{file_id}.png'}, 'label': {'name': label}} for file_id, label in GOLD],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': created_at}
+            for file_id, label, created_at in results]} for run_name, results in results_by_run.items()]}})
+
+BASE = {'r1': [('f1', 'cat', '2024-01-01T00:00:00Z'), ('f2', 'cat', '2024-01-02T00:00:00Z')],
+        'r2': [('f1', 'dog', '2024-01-01T00:00:00Z'), ('f3', 'cat', '2024-01-03T00:00:00Z')]}
+
+def statistics(results_by_run):
+    return ViewStatistics.from_annotation_data(view(results_by_run), gold_labels=GOLD)
+
+def assert_same_counts(updated, rebuilt):
+    np.testing.assert_array_equal(updated.table.codes, rebuilt.table.codes)
+    np.testing.assert_array_equal(updated.vote_counts, rebuilt.vote_counts)
+    np.testing.assert_array_equal(updated.gold_confusion_by_column, rebuilt.gold_confusion_by_column)
+    assert updated.watermark == rebuilt.watermark
+
+def test_newer_results_are_applied():
+    updated = statistics(BASE)
+    updated.vote_counts, updated.gold_confusion_by_column
+    later = {**BASE, 'r1': BASE['r1'] + [('f2', 'dog', '2024-01-04T00:00:00Z'), ('f3', 'cat', '2024-01-04T00:00:00Z')]}
+    assert updated.apply_results(view(later)) == 2
+    assert_same_counts(updated, statistics(later))
+
+def test_result_stamped_at_the_watermark_is_applied():
+    updated = statistics(BASE)
+    updated.vote_counts, updated.gold_confusion_by_column
+    tied = {**BASE, 'r1': BASE['r1'] + [('f3', 'dog', '2024-01-03T00:00:00Z')]}
+    assert updated.apply_results(view(tied)) == 1
+    assert_same_counts(updated, statistics(tied))
+    # Applying the same view again changes nothing.
+    assert updated.apply_results(view(tied)) == 0
+
+@pytest.mark.parametrize('changed_results', [
+    {**BASE, 'r1': BASE['r1'][:1]},
+    {**BASE, 'r2': BASE['r2'][:1]},
+    {**BASE, 'r1': BASE['r1'] + [('f3', 'dog', '2024-01-02T12:00:00Z')]},
+], ids=['deleted-before-watermark', 'deleted-at-watermark', 'added-before-watermark'])
+def test_changed_results_before_the_watermark_force_a_rebuild(changed_results):
+    with pytest.raises(ValueError, match="before the watermark"):
+        statistics(BASE).apply_results(view(changed_results))
@@ -0,0 +1,74 @@
+"""
+Native nominal Krippendorff's alpha (krippendorff_alpha_nominal / CoincidenceCounts) against reference values
+computed with the krippendorff package (krippendorff.alpha(reliability_data=..., level_of_measurement='nominal')),
+which the function no longer depends on.
+"""
+import json
+import numpy as np
+import pytest
+from fklearn import CoincidenceCounts, krippendorff_alpha_nominal
+from index import compute_view_response
+
+MISSING = np.nan
+
+def to_codes(reliability_data):
+    """coders x units values (NaN = missing) -> units x coders codes (-1 = missing) and the number of labels."""
+    data = np.asarray(reliability_data, dtype=float).T
+    labels = np.unique(data[~np.isnan(data)])
+    codes = np.full(data.shape, -1, dtype=np.intp)
+    present = ~np.isnan(data)
+    codes[present] = np.searchsorted(labels, data[present])
+    return codes, len(labels)
+
+# Krippendorff (2011), "Computing Krippendorff's Alpha-Reliability", nominal example with missing values.
+PAPER_EXAMPLE = [[1, 2, 3, 3, 2, 1, 4, 1, 2, MISSING, MISSING, MISSING],
+                 [1, 2, 3, 3, 2, 2, 4, 1, 2, 5, MISSING, 3],
+                 [MISSING, 3, 3, 3, 2, 3, 4, 2, 2, 5, 1, MISSING],
+                 [1, 2, 3, 3, 2, 4, 4, 1, 2, 5, 1, MISSING]]
+
+def test_paper_example_with_missing_values():
+    assert krippendorff_alpha_nominal(*to_codes(PAPER_EXAMPLE)) == pytest.approx(0.743421052631579, rel=1e-12)
+
+def test_sparse_missing_values():
+    data = [[2, 1, 2, 2, 1, MISSING, MISSING, 0, MISSING, MISSING],
+            [0, 2, 2, 0, 1, 2, MISSING, MISSING, MISSING, 1],
+            [MISSING, 0, MISSING, 0, MISSING, MISSING, 2, 1, 1, 1]]
+    assert krippendorff_alpha_nominal(*to_codes(data)) == pytest.approx(0.20588235294117652, rel=1e-12)
+
+def test_units_with_a_single_coder_are_not_pairable():
+    data = [[0, 1, 1, 0, 2],
+            [0, 1, MISSING, MISSING, MISSING],
+            [0, 0, MISSING, MISSING, MISSING]]
+    assert krippendorff_alpha_nominal(*to_codes(data)) == pytest.approx(0.375, rel=1e-12)
+
+def test_only_single_coder_units_raise():
+    with pytest.raises(ValueError, match="at least two coders"):
+        krippendorff_alpha_nominal(*to_codes([[0, 1, MISSING], [MISSING, MISSING, 2]]))
+
+def test_single_label_raises():
+    with pytest.raises(ValueError, match="more than one value"):
+        krippendorff_alpha_nominal(*to_codes([[1, 1, 1], [1, 1, MISSING]]))
+
+def test_single_label_in_pairable_units_raises():
+    # A second label only in a single-coder unit: the expected disagreement is 0 (the package returns NaN).
+    with pytest.raises(ValueError, match="Expected disagreement is zero"):
+        krippendorff_alpha_nominal(*to_codes([[0, 1], [0, MISSING]]))
+
+def test_undefined_alpha_is_reported_as_none():
+    results = {'r1': {'f1': 'a', 'f2': 'b'}, 'r2': {'f1': 'a'}}
+    payload = {'result': {
+        'files': [{'file': {'id': file_id, 'name': file_id}, 'label': {}} for file_id in ('f1', 'f2')],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in run_results.items()]} for run_name, run_results in results.items()]}}
+    body = compute_view_response(payload, {}, use_cache=False)
+    assert body['inter_rater_reliability']['krippendorff_alpha'] is None
+    assert 'NaN' not in json.dumps(body)
+
+def test_merged_counts_equal_whole_counts():
+    codes, n_labels = to_codes(PAPER_EXAMPLE)
+    value_counts = np.stack([np.bincount(row[row >= 0], minlength=n_labels) for row in codes])
+    merged = CoincidenceCounts.from_value_counts(value_counts[:5], codes.shape[1])
+    merged.update(CoincidenceCounts.from_value_counts(value_counts[5:], codes.shape[1]))
+    assert merged.alpha() == pytest.approx(0.743421052631579, rel=1e-12)
+    assert merged.units_with_values == 12
@@ -0,0 +1,49 @@
+"""majorityTieBreak reaches the majority decision through the handler, incremental and map/reduce paths."""
+import pytest
+import index
+from index import compute_view_response, map_handler, reduce_handler, resolve_majority_tie_break
+
+SECTIONS = {'sections': ['majority_decision_annotations']}
+
+def view(results_by_run):
+    return {'result': {
+        'files': [{'file': {'id': file_id, 'name': file_id}, 'label': {'name': 'a'}} for file_id in ('f1', 'f2')],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in results.items()]} for run_name, results in results_by_run.items()]}}
+
+# f1 ties between 'a' and 'b'; f2 is decided.
+TIED = view({'r1': {'f1': 'a', 'f2': 'b'}, 'r2': {'f1': 'b', 'f2': 'b'}})
+
+def majority_decision(body) -> list:
+    return body['data_overview']['majority_decision_annotations']['data']
+
+@pytest.mark.parametrize('tie_break, expected', [(None, ['a', 'b']), ('first', ['a', 'b']), ('last', ['b', 'b']),
+                                                 ('abstain', [None, 'b']), ('unknown', ['a', 'b'])])
+def test_tie_break_argument_decides_ties(tie_break, expected):
+    body = compute_view_response(TIED, {**SECTIONS, 'majorityTieBreak': tie_break}, use_cache=False)
+    assert majority_decision(body) == expected
+
+def test_resolve_majority_tie_break():
+    assert resolve_majority_tie_break(None) == 'first'
+    assert resolve_majority_tie_break('last') == 'last'
+    assert resolve_majority_tie_break('Last') == 'first'
+
+def test_incremental_statistics_are_rebuilt_for_another_tie_break(monkeypatch):
+    monkeypatch.setattr(index, 'VIEW_STATISTICS', type(index.VIEW_STATISTICS)())
+    arguments = {**SECTIONS, 'viewId': 'v1', 'incremental': True}
+    assert majority_decision(compute_view_response(TIED, arguments, use_cache=False)) == ['a', 'b']
+    body = compute_view_response(TIED, {**arguments, 'majorityTieBreak': 'last'}, use_cache=False)
+    assert majority_decision(body) == ['b', 'b']
+    assert any('majorityTieBreak changed' in log for log in body['logs'])
+    assert index.VIEW_STATISTICS['v1'].majority_tie_break == 'last'
+
+def test_map_step_passes_the_tie_break_to_the_reduce_step():
+    arguments = {'sections': ['majority_decision_vs_gold_standard']}
+    bodies = {}
+    for tie_break in ('first', 'abstain'):
+        partial = map_handler({'prev': TIED, 'arguments': {'majorityTieBreak': tie_break}}, None)['partial']
+        bodies[tie_break] = reduce_handler({'partials': [partial], 'arguments': arguments}, None)
+        single_shot = compute_view_response(TIED, {**arguments, 'majorityTieBreak': tie_break}, use_cache=False)
+        assert bodies[tie_break]['model_evaluations'] == single_shot['model_evaluations']
+    assert bodies['first']['model_evaluations'] != bodies['abstain']['model_evaluations']
@@ -0,0 +1,62 @@
+"""reduce_handler over map_handler partials of file shards equals the single-shot handler on the whole view."""
+import itertools
+import json
+import math
+import numpy as np
+import pytest
+from index import REDUCIBLE_OUTPUTS, build_response_body, map_handler, reduce_handler, run_analysis, shard_annotation_data
+
+SECTIONS = list(REDUCIBLE_OUTPUTS)
+
+def view(gold_labels, results_by_run):
+    return {'result': {
+        'files': [{'file': {'id': file_id, 'name': file_id}, 'label': {'name': label}}
+                  for file_id, label in gold_labels.items()],
+        'classifications': [{'name': run_name, 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in results.items()]} for run_name, results in results_by_run.items()]}}
+
+def random_view(seed, n_files=40, runs=('gemini', 'llava', 'b'), labels=('cat', 'dog', 'bird', 'fish')):
+    rng = np.random.default_rng(seed)
+    file_ids = [f'f{i:02d}' for i in range(n_files)]
+    gold = {file_id: labels[rng.integers(len(labels))] for file_id in file_ids if rng.random() < 0.6}
+    return view(gold, {run: {file_id: labels[rng.integers(len(labels))] for file_id in file_ids if rng.random() < 0.7}
+                       for run in runs})
+
+def rounded(value):
+    """Response values with floats rounded (NaN as None), as summed counts may differ in the last bits."""
+    if isinstance(value, float): return None if math.isnan(value) else round(value, 12)
+    if isinstance(value, dict): return {key: rounded(item) for key, item in value.items() if key != 'logs'}
+    if isinstance(value, list): return [rounded(item) for item in value]
+    return value
+
+def single_shot(payload, runs=None):
+    return rounded(build_response_body(run_analysis(payload, sections=SECTIONS, runs=runs), 'rows'))
+
+def reduced(shards, runs=None):
+    # Partials travel as JSON between the map and reduce steps.
+    partials = [json.loads(json.dumps(map_handler({'prev': shard}, None)['partial'])) for shard in shards]
+    return rounded(reduce_handler({'partials': partials, 'arguments': {'sections': SECTIONS, 'runs': runs}}, None))
+
+@pytest.mark.parametrize('n_shards', range(1, 8))
+@pytest.mark.parametrize('runs', [None, ['gemini', 'b']])
+def test_reduce_equals_single_shot(n_shards, runs):
+    payload = random_view(seed=n_shards)
+    expected = single_shot(payload, runs)
+    assert expected.get('inter_rater_reliability') and expected.get('model_evaluations')
+    assert reduced(shard_annotation_data(payload, n_shards), runs) == expected
+
+def test_shards_with_different_label_sets():
+    # (gold labels, results by run) of three shards with disjoint files; from_partials remaps their labels.
+    shard_data = [({'f1': 'a', 'f2': 'b'}, {'r1': {'f1': 'a', 'f2': 'b'}, 'r2': {'f1': 'a', 'f2': 'a'}}),
+                  ({'f3': 'c', 'f4': 'd'}, {'r1': {'f3': 'c', 'f4': 'd'}, 'r2': {'f3': 'd', 'f4': 'd'}}),
+                  ({'f5': 'd'}, {'r1': {'f5': 'a', 'f6': 'e'}, 'r2': {'f6': 'e'}})]
+    shards = [view(gold, results) for gold, results in shard_data]
+    labels = [map_handler({'prev': shard}, None)['partial']['labels'] for shard in shards]
+    assert labels == [['a', 'b'], ['c', 'd'], ['a', 'd', 'e']]
+    whole = view({file_id: label for gold, _ in shard_data for file_id, label in gold.items()},
+                 {run: {file_id: label for _, results in shard_data for file_id, label in results[run].items()}
+                  for run in ('r1', 'r2')})
+    expected = single_shot(whole)
+    for order in itertools.permutations(shards):
+        assert reduced(list(order)) == expected
@@ -0,0 +1,94 @@
+"""Result cache keys from decoded views and resolved request options, and the byte bound of the memory tier."""
+import json
+import pytest
+import index
+from index import ANALYSIS_SECTIONS, RESPONSE_ENCODINGS, resolve_analysis_sections, resolve_response_encoding
+from result_cache import ResultCache, cache_key
+from view_input import decode_view
+
+def options(response_encoding=None, sections=None):
+    """Cache options as compute_view_response resolves them from the request arguments."""
+    return {"responseEncoding": resolve_response_encoding(response_encoding),
+            "sections": resolve_analysis_sections(sections), "runs": None, "confusionFormat": None,
+            "topConfusions": index.resolve_top_confusions(None), "asOf": None, "timeBucket": None}
+
+def payload(labels, file_name='a.png'):
+    return {'result': {
+        'files': [{'file': {'id': 'f1', 'name': file_name}, 'label': {'name': 'cat'}}],
+        'classifications': [{'name': 'run-1', 'results': [
+            {'fileId': f'f{i}', 'label': {'name': label}, 'createdAt': f'2024-01-0{i}T00:00:00Z'}
+            for i, label in enumerate(labels, start=1)]}]}}
+
+def test_cache_key_follows_the_decoded_content():
+    key = cache_key(decode_view(payload(['cat', 'dog'])), options(), 'v1')
+    assert cache_key(decode_view(payload(['cat', 'dog'])), options(), 'v1') == key
+    assert cache_key(decode_view(payload(['cat', 'cat'])), options(), 'v1') != key
+    assert cache_key(decode_view(payload(['cat', 'dog'], file_name='b.png')), options(), 'v1') != key
+    assert cache_key(decode_view(payload(['cat', 'dog'])), options(), 'v2') != key
+
+def test_cache_key_follows_the_resolved_options(monkeypatch):
+    monkeypatch.delenv('ANALYTICS_ARTIFACT_DIR', raising=False)
+    view = decode_view(payload(['cat', 'dog']))
+    keys = {(encoding, section): cache_key(view, options(encoding, [section]), 'v1')
+            for encoding in RESPONSE_ENCODINGS for section in ANALYSIS_SECTIONS}
+    # 'artifacts' without ANALYTICS_ARTIFACT_DIR resolves to 'columnar'.
+    assert len(set(keys.values())) == (len(RESPONSE_ENCODINGS) - 1) * len(ANALYSIS_SECTIONS)
+    # A section group and its outputs listed in another order resolve to the same options.
+    reordered = list(reversed(ANALYSIS_SECTIONS['inter_rater_reliability']))
+    assert cache_key(view, options('rows', reordered), 'v1') == keys[('rows', 'inter_rater_reliability')]
+
+def test_cache_key_of_a_referenced_view_is_its_source_digest():
+    view, same_source = decode_view(payload(['cat']), 'abc'), decode_view(payload(['dog']), 'abc')
+    assert cache_key(view, options(), 'v1') == cache_key(same_source, options(), 'v1')
+
+@pytest.fixture
+def result_cache(monkeypatch):
+    cache = ResultCache(max_entries=10)
+    monkeypatch.setattr(index, 'RESULT_CACHE', cache)
+    return cache
+
+def test_equivalent_requests_hit_the_cache(result_cache):
+    index.compute_view_response(payload(['cat', 'dog']), {'sections': ['inter_rater_reliability']})
+    reordered = list(reversed(ANALYSIS_SECTIONS['inter_rater_reliability']))
+    body = index.compute_view_response(payload(['cat', 'dog']), {'sections': reordered, 'responseEncoding': 'rows'})
+    assert body['logs'][-1].startswith("Result cache: memory hit")
+    assert result_cache.counters == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
+
+def test_hits_do_not_share_the_cached_body(result_cache):
+    first = index.compute_view_response(payload(['cat', 'dog']), {})
+    first['data_overview'].clear()
+    hit = index.compute_view_response(payload(['cat', 'dog']), {})
+    hit['logs'].append('changed by the caller')
+    again = index.compute_view_response(payload(['cat', 'dog']), {})
+    assert again['data_overview'] and 'changed by the caller' not in again['logs']
+    assert again['logs'][-1].startswith("Result cache: memory hit")
+
+def body(n_bytes):
+    return {"logs": [], "data": "x" * n_bytes}
+
+def encoded_size(value):
+    return len(json.dumps(value, separators=(",", ":")))
+
+def test_memory_tier_evicts_by_encoded_bytes():
+    cache = ResultCache(max_entries=10, memory_max_bytes=2 * encoded_size(body(100)))
+    for key in ('a', 'b', 'c'):
+        cache.put(key, body(100))
+    assert cache.get('a') == (None, None)
+    assert cache.get('b')[1] == 'memory' and cache.get('c')[1] == 'memory'
+    assert cache.memory_bytes == 2 * encoded_size(body(100))
+
+def test_memory_tier_skips_bodies_over_the_byte_bound():
+    cache = ResultCache(max_entries=10, memory_max_bytes=encoded_size(body(100)))
+    cache.put('small', body(10))
+    cache.put('large', body(1000))
+    assert cache.get('large') == (None, None)
+    assert cache.get('small')[1] == 'memory'
+    assert cache.memory_bytes == encoded_size(body(10))
+
+def test_disk_hits_refill_the_memory_tier(tmp_path):
+    cache = ResultCache(max_entries=10, cache_dir=str(tmp_path))
+    cache.put('k', body(10))
+    fresh = ResultCache(max_entries=10, cache_dir=str(tmp_path))
+    assert fresh.get('k') == (body(10), 'disk')
+    assert fresh.get('k') == (body(10), 'memory')
+    assert fresh.memory_bytes == encoded_size(body(10))
@@ -0,0 +1,81 @@
+"""Sparse confusion output (confusionFormat / topConfusions) against the dense metrics package."""
+import numpy as np
+import pytest
+from fklearn import top_confusions
+from index import (DEFAULT_DENSE_CONFUSION_MAX_LABELS, DENSE_CONFUSION_MAX_LABELS_ENV,
+                   calculate_ml_metrics_package_from_confusion, compute_view_response, resolve_confusion_format)
+
+LABELS = ['a', 'b', 'c', 'd', 'e']
+# True labels on rows; 'd' never occurs, so both formats drop it.
+MATRIX = np.array([[5, 2, 0, 0, 3],
+                   [1, 4, 3, 0, 0],
+                   [0, 3, 6, 0, 0],
+                   [0, 0, 0, 0, 0],
+                   [0, 0, 1, 0, 2]])
+
+def packages(top_k=10):
+    return (calculate_ml_metrics_package_from_confusion(MATRIX, LABELS, confusion_format='dense'),
+            calculate_ml_metrics_package_from_confusion(MATRIX, LABELS, confusion_format='sparse', top_k=top_k))
+
+def test_per_class_metrics_from_triples_equal_the_dense_ones():
+    dense, sparse = packages()
+    per_class = sparse['per_class_metrics_df']
+    assert per_class['label_name'].tolist() == [entry['label_name'] for entry in dense['per_class_metrics']]
+    for metric in ('precision', 'recall', 'f_1_score', 'support'):
+        np.testing.assert_allclose(per_class[metric].to_numpy(dtype=float),
+                                   [entry['metrics'][metric] for entry in dense['per_class_metrics']], rtol=1e-12)
+    assert sparse['global_metrics_df'].equals(dense['global_metrics_df'])
+    assert sparse['per_class_metrics'] == [] and sparse['confusion_matrix_df'].empty
+
+def test_confusion_triples_hold_only_the_nonzero_cells():
+    dense, sparse = packages()
+    triples = sparse['confusion_triples_df']
+    assert (triples['Count'] > 0).all()
+    cells = {(true, pred): count for true, pred, count in triples.itertuples(index=False)}
+    matrix = dense['confusion_matrix_df']
+    assert cells == {(true, pred): matrix.loc[true, pred] for true in matrix.index for pred in matrix.columns
+                     if matrix.loc[true, pred]}
+
+def test_top_confusions_are_the_largest_off_diagonal_cells():
+    _, sparse = packages(top_k=3)
+    top = sparse['top_confusions_df']
+    # (b, c) and (c, b) tie at 3 with (a, e): ties order by true, then predicted label.
+    assert list(zip(top['True Label'], top['Predicted Label'], top['Count'])) == [
+        ('a', 'e', 3), ('b', 'c', 3), ('c', 'b', 3)]
+    np.testing.assert_allclose(top['Share of True Label'], [3 / 10, 3 / 8, 3 / 9])
+
+def test_top_confusions_skip_the_diagonal_and_cap_at_k():
+    true_idx, pred_idx, counts = np.array([0, 0, 1, 1]), np.array([0, 1, 0, 1]), np.array([9, 1, 2, 9])
+    assert top_confusions(true_idx, pred_idx, counts, 5).tolist() == [2, 1]
+    assert top_confusions(true_idx, pred_idx, counts, 1).tolist() == [2]
+    assert top_confusions(true_idx, pred_idx, counts, 0).tolist() == []
+
+def test_auto_switches_above_the_label_limit(monkeypatch):
+    monkeypatch.delenv(DENSE_CONFUSION_MAX_LABELS_ENV, raising=False)
+    assert resolve_confusion_format(None, DEFAULT_DENSE_CONFUSION_MAX_LABELS) == 'dense'
+    assert resolve_confusion_format('auto', DEFAULT_DENSE_CONFUSION_MAX_LABELS + 1) == 'sparse'
+    monkeypatch.setenv(DENSE_CONFUSION_MAX_LABELS_ENV, '3')
+    assert resolve_confusion_format('auto', 3) == 'dense'
+    assert resolve_confusion_format('auto', 4) == 'sparse'
+    assert resolve_confusion_format('dense', 4) == 'dense'
+    assert resolve_confusion_format('sparse', 2) == 'sparse'
+    assert resolve_confusion_format('unknown', 4) == 'sparse'
+
+@pytest.mark.parametrize('max_labels, expected_keys', [
+    ('3', {'per_class_metrics', 'confusion_matrix'}),
+    ('2', {'per_class_metrics_table', 'confusion_triples', 'top_confusions'})])
+def test_auto_format_in_the_response(monkeypatch, max_labels, expected_keys):
+    monkeypatch.setenv(DENSE_CONFUSION_MAX_LABELS_ENV, max_labels)
+    gold = {'f1': 'a', 'f2': 'b', 'f3': 'c', 'f4': 'a'}
+    predicted = {'f1': 'a', 'f2': 'c', 'f3': 'c', 'f4': 'b'}
+    payload = {'result': {
+        'files': [{'file': {'id': file_id, 'name': file_id}, 'label': {'name': label}} for file_id, label in gold.items()],
+        'classifications': [{'name': 'r1', 'results': [
+            {'fileId': file_id, 'label': {'name': label}, 'createdAt': '2024-01-01T00:00:00Z'}
+            for file_id, label in predicted.items()]}]}}
+    body = compute_view_response(payload, {'sections': ['annotation_runs_vs_gold_standard']}, use_cache=False)
+    evaluation = body['model_evaluations']['annotation_runs_vs_gold_standard'][0]
+    populated = {key for key in ('per_class_metrics', 'confusion_matrix', 'per_class_metrics_table',
+                                 'confusion_triples', 'top_confusions')
+                 if evaluation.get(key) and (not isinstance(evaluation[key], dict) or evaluation[key]['data_rows'])}
+    assert populated == expected_keys
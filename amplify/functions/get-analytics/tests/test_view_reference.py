@@ -0,0 +1,92 @@
+"""Input references: paths stay inside ANALYTICS_INPUT_ROOT, and json/ndjson objects decode like the inline payload."""
+import gzip
+import hashlib
+import json
+import os
+import numpy as np
+import pytest
+from index import compute_view_response
+from view_input import INPUT_ROOT_ENV, decode_view, load_view_reference, resolve_reference_path
+
+PAYLOAD = {'result': {
+    'files': [{'file': {'id': 'f1', 'name': 'a.png'}, 'label': {'name': 'cat'}},
+              {'file': {'id': 'f2', 'name': 'b.png'}, 'label': {}}],
+    'classifications': [
+        {'name': 'r1', 'results': [{'fileId': 'f1', 'label': {'name': 'cat'}, 'createdAt': '2024-01-01T00:00:00Z'},
+                                   {'fileId': 'f2', 'label': {'name': 'dog'}, 'createdAt': '2024-01-02T00:00:00Z'}]},
+        {'name': 'r2', 'results': [{'fileId': 'f1', 'label': {'name': 'dog'}, 'createdAt': '2024-01-03T00:00:00Z'}]}]}}
+
+def ndjson_lines(payload) -> list:
+    result = payload['result']
+    records = [{'kind': 'file', **file_wrapper} for file_wrapper in result['files']]
+    for class_run in result['classifications']:
+        records.append({'kind': 'classification', 'name': class_run['name']})
+        records.extend({'kind': 'result', **annotation_result} for annotation_result in class_run['results'])
+    return [json.dumps(record) + '\n' for record in records]
+
+@pytest.fixture
+def input_root(tmp_path, monkeypatch):
+    root = tmp_path / 'root'
+    root.mkdir()
+    monkeypatch.setenv(INPUT_ROOT_ENV, str(root))
+    return root
+
+def write(path, text: str):
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as stream:
+        stream.write(text)
+
+@pytest.mark.parametrize('ref', ['../outside.json', 'views/../../outside.json', 'file://../outside.json',
+                                 '../root-sibling/view.json'])
+def test_references_outside_the_root_are_rejected(input_root, ref):
+    (input_root.parent / 'root-sibling').mkdir()
+    write(input_root.parent / 'outside.json', json.dumps(PAYLOAD))
+    with pytest.raises(ValueError, match="outside"):
+        resolve_reference_path(ref)
+    with pytest.raises(ValueError, match="outside"):
+        load_view_reference({'ref': ref})
+
+def test_symlinks_out_of_the_root_are_rejected(input_root):
+    write(input_root.parent / 'outside.json', json.dumps(PAYLOAD))
+    os.symlink(input_root.parent / 'outside.json', input_root / 'link.json')
+    with pytest.raises(ValueError, match="outside"):
+        resolve_reference_path('link.json')
+
+def test_absolute_references_resolve_inside_the_root(input_root):
+    assert resolve_reference_path('/views/view.json') == os.path.join(os.path.realpath(input_root), 'views', 'view.json')
+    assert resolve_reference_path('file:///views/view.json') == resolve_reference_path('views/view.json')
+
+@pytest.mark.parametrize('ref', ['s3://bucket/view.json', '', None])
+def test_invalid_references_are_rejected(input_root, ref):
+    with pytest.raises(ValueError):
+        resolve_reference_path(ref)
+
+def test_references_need_the_root(monkeypatch):
+    monkeypatch.delenv(INPUT_ROOT_ENV, raising=False)
+    with pytest.raises(ValueError, match=INPUT_ROOT_ENV):
+        resolve_reference_path('view.json')
+
+def assert_same_view(loaded, inline):
+    for field in ('file_names', 'gold_pairs', 'classification_names', 'run_names', 'structure_key', 'watermark'):
+        assert getattr(loaded, field) == getattr(inline, field), field
+    assert loaded.columns.keys() == inline.columns.keys()
+    for name, values in inline.columns.items():
+        np.testing.assert_array_equal(loaded.columns[name], values, err_msg=name)
+
+@pytest.mark.parametrize('name, input_format', [('view.json', None), ('view.json.gz', 'json'),
+                                                 ('view.ndjson', None), ('view.jsonl.gz', 'ndjson'),
+                                                 ('view.txt', 'ndjson')])
+def test_references_decode_like_the_inline_payload(input_root, name, input_format):
+    text = ''.join(ndjson_lines(PAYLOAD)) if input_format == 'ndjson' or '.ndjson' in name else json.dumps(PAYLOAD)
+    write(input_root / name, text)
+    reference = {'ref': name, **({'format': input_format} if input_format else {})}
+    loaded = load_view_reference(reference)
+    assert_same_view(loaded, decode_view(PAYLOAD))
+    assert loaded.source_digest == hashlib.sha256(text.encode()).hexdigest()
+    inline_body = compute_view_response(PAYLOAD, {}, use_cache=False)
+    assert compute_view_response(reference, {}, use_cache=False) == inline_body
+
+def test_unknown_format_is_rejected(input_root):
+    write(input_root / 'view.json', json.dumps(PAYLOAD))
+    with pytest.raises(ValueError, match="format"):
+        load_view_reference({'ref': 'view.json', 'format': 'csv'})
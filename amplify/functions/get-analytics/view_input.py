@@ -0,0 +1,233 @@
+"""
+View input (Python)
+ - Typed decoding of the normalized view payload: one pass validates and flattens file entries, gold labels
+   and run results into a DecodedView, which is all the analysis reads from its input
+ - Payloads come inline (event['prev'] = {'result': {...}}) or by reference (event['prev'] = {'ref': path,
+   'format': 'json'|'ndjson'}) to an object in storage; the local directory ANALYTICS_INPUT_ROOT stands in
+   for storage. NDJSON objects are decoded line by line, without building the payload's dict tree
+ - JSON text is parsed with orjson when it is installed, else with the json module
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass
+import numpy as np
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+INPUT_ROOT_ENV = "ANALYTICS_INPUT_ROOT"
+REFERENCE_FORMATS = ('json', 'ndjson')
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')
+
+def loads(text):
+    """Parses JSON text (str or bytes)."""
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+@dataclass
+class DecodedView:
+    """
+    Validated, flattened view payload. columns hold the complete run results in input order: run (code into
+    run_names), classification (position in input), file_id, label, created_at. structure_key hashes files and
+    classification names (everything but results); watermark is the newest createdAt of any result.
+    source_digest is the content hash of a referenced object, None for inline payloads.
+    """
+    file_names: dict
+    gold_pairs: list
+    classification_names: list
+    run_names: list
+    columns: dict
+    structure_key: str
+    watermark: str = None
+    source_digest: str = None
+
+    def results_since(self, since: str) -> dict:
+        """columns restricted to results with createdAt at or after since (results stamped exactly at a
+        watermark may be new; applying them again is a no-op for cells that already hold them)."""
+        newer = self.columns['created_at'] >= since
+        return {name: values[newer] for name, values in self.columns.items()}
+
+    def result_counts(self, watermark: str) -> tuple:
+        """(older, at_watermark): results per run code with createdAt before watermark and exactly at it."""
+        created_at, runs, n_runs = self.columns['created_at'], self.columns['run'], len(self.run_names)
+        return (np.bincount(runs[created_at < watermark], minlength=n_runs),
+                np.bincount(runs[created_at == watermark], minlength=n_runs))
+
+class ViewDecoder:
+    """
+    Builds a DecodedView in one pass over the parts of a payload in input order: file entries (result.files[]),
+    classification headers and the results of the most recent classification. Malformed parts are logged and
+    skipped; results of a classification without a name only count towards the watermark.
+    """
+
+    def __init__(self):
+        self.file_names = {}
+        self.gold_pairs = []
+        self.classification_names = []
+        self.run_names = []
+        self.watermark = None
+        self._run_code_by_name = {}
+        self._current_run = None
+        self._columns = {'run': [], 'classification': [], 'file_id': [], 'label': [], 'created_at': []}
+        self._files_digest = hashlib.sha256()
+
+    def add_file(self, file_wrapper: dict):
+        if not isinstance(file_wrapper, dict):
+            logging.warning(f"Skipping file entry, expected dict, got {type(file_wrapper)}: {file_wrapper}")
+            return
+        file_item, label_item = file_wrapper.get('file'), file_wrapper.get('label')
+        file_obj = file_item if isinstance(file_item, dict) else {}
+        label_obj = label_item if isinstance(label_item, dict) else {}
+        file_id, file_name = file_obj.get('id'), file_obj.get('name')
+        self._files_digest.update(repr((file_id, file_name, label_obj.get('name'))).encode())
+        if not isinstance(file_item, dict):
+            logging.warning(f"Skipping gold file item, expected dict, got {type(file_item)}: {file_wrapper}")
+            return
+        if not file_id:
+            logging.warning(f"Skipping gold standard entry due to missing file_id: {file_wrapper}")
+            return
+        if file_name: self.file_names[file_id] = file_name
+        self.gold_pairs.append((file_id, label_obj['name'] if 'name' in label_obj else np.nan))
+
+    def start_classification(self, run_name):
+        self.classification_names.append(run_name)
+        if not run_name:
+            logging.warning("A classification run was found without a 'name'. Skipping this run.")
+            self._current_run = -1
+            return
+        if run_name not in self._run_code_by_name:
+            self._run_code_by_name[run_name] = len(self.run_names)
+            self.run_names.append(run_name)
+        self._current_run = self._run_code_by_name[run_name]
+
+    def add_result(self, annotation_result: dict):
+        self.add_results((annotation_result,))
+
+    def add_results(self, annotation_results):
+        """Results of the current classification; one tight loop, as most of a payload is results."""
+        if self._current_run is None:
+            logging.warning(f"Skipping {len(annotation_results)} annotation results outside a classification run.")
+            return
+        run_code = self._current_run
+        file_ids, labels, timestamps = self._columns['file_id'], self._columns['label'], self._columns['created_at']
+        n_before = len(file_ids)
+        watermark = self.watermark
+        for annotation_result in annotation_results:
+            if not isinstance(annotation_result, dict):
+                logging.warning(f"Skipping annotation result, expected dict, got {type(annotation_result)}: "
+                                f"{annotation_result}")
+                continue
+            annotation_ts = annotation_result.get('createdAt')
+            if annotation_ts and (watermark is None or annotation_ts > watermark): watermark = annotation_ts
+            if run_code < 0: continue
+            file_id = annotation_result.get('fileId')
+            label_obj = annotation_result.get('label')
+            label_name_val = label_obj.get('name') if isinstance(label_obj, dict) else None
+            if not (file_id and label_name_val and annotation_ts):
+                logging.warning(f"Skipping incomplete annotation data in run '{self.run_names[run_code]}'. "
+                                f"Data: {annotation_result}")
+                continue
+            file_ids.append(file_id)
+            labels.append(label_name_val)
+            timestamps.append(annotation_ts)
+        self.watermark = watermark
+        n_added = len(file_ids) - n_before
+        self._columns['run'].extend([run_code] * n_added)
+        self._columns['classification'].extend([len(self.classification_names) - 1] * n_added)
+
+    def add_record(self, record: dict):
+        """One NDJSON record: {'kind': 'file', 'file': {...}, 'label': {...}}, {'kind': 'classification', 'name': ...}
+        or {'kind': 'result', 'fileId': ..., 'label': {...}, 'createdAt': ...}."""
+        kind = record.get('kind') if isinstance(record, dict) else None
+        if kind == 'file':
+            self.add_file(record)
+        elif kind == 'classification':
+            self.start_classification(record.get('name'))
+        elif kind == 'result':
+            self.add_result(record)
+        else:
+            logging.warning(f"Skipping input record of unknown kind: {record}")
+
+    def finish(self, source_digest: str = None) -> DecodedView:
+        structure_digest = self._files_digest.copy()
+        for run_name in self.classification_names:
+            structure_digest.update(repr(('run', run_name)).encode())
+        columns = {
+            'run': np.array(self._columns['run'], dtype=np.intp),
+            'classification': np.array(self._columns['classification'], dtype=np.intp),
+            'file_id': np.array(self._columns['file_id'], dtype=object),
+            'label': np.array(self._columns['label'], dtype=object),
+            'created_at': np.array(self._columns['created_at'], dtype=object),
+        }
+        return DecodedView(file_names=self.file_names, gold_pairs=self.gold_pairs,
+                           classification_names=self.classification_names, run_names=self.run_names,
+                           columns=columns, structure_key=structure_digest.hexdigest(), watermark=self.watermark,
+                           source_digest=source_digest)
+
+def decode_view(data, source_digest: str = None) -> DecodedView:
+    """DecodedView of an inline normalized payload ({'result': {'files', 'classifications'}}); DecodedViews pass through."""
+    if isinstance(data, DecodedView): return data
+    decoder = ViewDecoder()
+    if not data or not isinstance(data.get('result'), dict):
+        logging.error("Invalid data structure: 'result' key missing or data is empty for processing annotations.")
+        return decoder.finish(source_digest)
+    result = data['result']
+    if 'files' not in result:
+        logging.warning("Gold standard: 'result' or 'result.files' missing in data.")
+    for file_wrapper in result.get('files') or []:
+        decoder.add_file(file_wrapper)
+    classifications = result.get('classifications') or []
+    if not classifications:
+        logging.warning("No 'classifications' (runs/coder annotations) found in 'result.classifications' array.")
+    for class_run in classifications:
+        decoder.start_classification(class_run.get('name') if isinstance(class_run, dict) else None)
+        decoder.add_results((class_run.get('results') if isinstance(class_run, dict) else None) or [])
+    return decoder.finish(source_digest)
+
+def is_view_reference(data) -> bool:
+    """True for a {'ref': ...} input reference instead of an inline payload."""
+    return isinstance(data, dict) and 'ref' in data and 'result' not in data
+
+def resolve_reference_path(ref: str) -> str:
+    """Local path of a reference ('file://' prefix optional) inside ANALYTICS_INPUT_ROOT; ValueError otherwise."""
+    root = os.environ.get(INPUT_ROOT_ENV)
+    if not root:
+        raise ValueError(f"Input references need {INPUT_ROOT_ENV} (the storage directory) to be set.")
+    if not isinstance(ref, str) or not ref:
+        raise ValueError(f"Input reference must be a non-empty string, got {ref!r}.")
+    relative_path = ref[len('file://'):] if ref.startswith('file://') else ref
+    if '://' in relative_path:
+        raise ValueError(f"Unsupported input reference scheme: {ref}")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, relative_path.lstrip('/')))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Input reference {ref} points outside {INPUT_ROOT_ENV}.")
+    return path
+
+def load_view_reference(reference: dict) -> DecodedView:
+    """
+    Decodes the object a {'ref': ..., 'format': ...} reference points to (gzip if the name ends in .gz).
+    format defaults by suffix: NDJSON for .ndjson/.jsonl (streamed, one ViewDecoder.add_record per line),
+    else one JSON payload in the inline shape. format 'json' reads the whole object into memory and parses it
+    into the payload's full dict tree before decoding, as an inline payload; only NDJSON avoids both.
+    The DecodedView's source_digest hashes the object's bytes.
+    """
+    path = resolve_reference_path(reference.get('ref'))
+    input_format = reference.get('format') or ('ndjson' if path.endswith(NDJSON_SUFFIXES) else 'json')
+    if input_format not in REFERENCE_FORMATS:
+        raise ValueError(f"Input reference format must be one of {REFERENCE_FORMATS}, got {input_format!r}.")
+    digest = hashlib.sha256()
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as stream:
+        if input_format == 'ndjson':
+            decoder = ViewDecoder()
+            for line in stream:
+                digest.update(line)
+                if line.strip(): decoder.add_record(loads(line))
+            return decoder.finish(digest.hexdigest())
+        raw = stream.read()
+    digest.update(raw)
+    return decode_view(loads(raw), digest.hexdigest())
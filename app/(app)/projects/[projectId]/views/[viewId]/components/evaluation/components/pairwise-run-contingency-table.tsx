@@ -15,7 +15,7 @@ export function PairwiseRunContingencyTable({ entry }: PairwiseRunContingencyTab
     return <p>No pairwise run contingency data available.</p>
   }
 
-  const { compared_runs, run_1_name, run_2_name, contingency_matrix } = entry
+  const { compared_runs, run_1_name, run_2_name, contingency_matrix, contingency_triples } = entry
 
   return (
     <div className="mb-6">
@@ -27,7 +27,11 @@ export function PairwiseRunContingencyTable({ entry }: PairwiseRunContingencyTab
           Run 1: {run_1_name}, Run 2: {run_2_name}
         </p>
       )}
-      <DataFrameTable title="Contingency Matrix" dataFrame={contingency_matrix} />
+      {contingency_triples ? (
+        <DataFrameTable title="Contingency Cells" dataFrame={contingency_triples} />
+      ) : (
+        <DataFrameTable title="Contingency Matrix" dataFrame={contingency_matrix} />
+      )}
     </div>
   )
 }
\ No newline at end of file
@@ -25,7 +25,7 @@ import { ChevronRightIcon } from "lucide-react";
 const client = generateClient<Schema>()
 
 async function getAnalytics(projectId: string, viewId: string) {
-    const { data, errors } = await client.queries.getAnalytics({ projectId, viewId })
+    const { data, errors } = await client.queries.getAnalytics({ projectId, viewId, responseEncoding: "columnar" })
 
     if (errors) {
         console.error("Error fetching analytics:", errors)
@@ -109,6 +109,7 @@ export default function EvaluationResults({ projectId, viewId }: EvaluationResul
                     <h2 className="text-xl font-semibold mb-3">Data Overview</h2>
                     <DataFrameTable title="Inter-coder Contingency Matrix" dataFrame={data_overview.inter_coder_contingency_matrix} />
                     <SeriesStructuredTable title="Majority Decision Annotations" seriesData={data_overview.majority_decision_annotations} />
+                    <DataFrameTable title="Majority Decision Confidence" dataFrame={data_overview.majority_decision_confidence} />
                     <DataFrameTable title="Gold Standard Labels" dataFrame={data_overview.gold_standard_labels} />
                     <DataFrameTable title="Combined Comparison Table" dataFrame={data_overview.combined_comparison_table} />
 
@@ -180,6 +181,12 @@ export default function EvaluationResults({ projectId, viewId }: EvaluationResul
                                 <PerClassMetricsTable title="Per-Class Metrics" data={model_evaluations.majority_decision_vs_gold_standard.per_class_metrics} />
                             )}
                             <ConfusionMatrixTable title="Confusion Matrix" dataFrame={model_evaluations.majority_decision_vs_gold_standard.confusion_matrix} />
+                            {model_evaluations.majority_decision_vs_gold_standard.per_class_metrics_table && (
+                                <DataFrameTable title="Per-Class Metrics" dataFrame={model_evaluations.majority_decision_vs_gold_standard.per_class_metrics_table} />
+                            )}
+                            {model_evaluations.majority_decision_vs_gold_standard.top_confusions && (
+                                <DataFrameTable title="Top Confusions" dataFrame={model_evaluations.majority_decision_vs_gold_standard.top_confusions} />
+                            )}
                             {model_evaluations.majority_decision_vs_gold_standard.log_messages && model_evaluations.majority_decision_vs_gold_standard.log_messages.length > 0 && (
                                 <div className="mt-2">
                                     <h4 className="text-md font-semibold">Log Messages:</h4>
@@ -220,6 +227,12 @@ export default function EvaluationResults({ projectId, viewId }: EvaluationResul
                                             <PerClassMetricsTable title="Per-Class Metrics" data={run_eval.per_class_metrics} />
                                         )}
                                         <ConfusionMatrixTable title="Confusion Matrix" dataFrame={run_eval.confusion_matrix} />
+                                        {run_eval.per_class_metrics_table && (
+                                            <DataFrameTable title="Per-Class Metrics" dataFrame={run_eval.per_class_metrics_table} />
+                                        )}
+                                        {run_eval.top_confusions && (
+                                            <DataFrameTable title="Top Confusions" dataFrame={run_eval.top_confusions} />
+                                        )}
                                         {run_eval.log_messages && run_eval.log_messages.length > 0 && (
                                             <div className="mt-2">
                                                 <h5 className="text-sm font-semibold">Log Messages:</h5>
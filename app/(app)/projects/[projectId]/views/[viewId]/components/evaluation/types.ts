@@ -5,10 +5,38 @@ const DataRowSchema = z.object({
 });
 export type DataRow = z.infer<typeof DataRowSchema>;
 
+const DataColumnSchema = z.object({
+  values: z.array(z.string().nullable()).nullable().optional(),
+  dictionary: z.array(z.string().nullable()).nullable().optional(),
+  codes: z.array(z.number()).nullable().optional().describe("Indices into dictionary, -1 for null"),
+});
+export type DataColumn = z.infer<typeof DataColumnSchema>;
+
+function columnValues(column: DataColumn): Array<string | null> {
+  if (column.codes) return column.codes.map((code) => (code >= 0 ? column.dictionary?.[code] ?? null : null));
+  return column.values ?? [];
+}
+
+export const TableArtifactSchema = z.object({
+  key: z.string(),
+  format: z.string().nullable().optional(),
+  table: z.string().nullable().optional(),
+  rows: z.number().nullable().optional(),
+}).describe("Table cells stored in an artifact (responseEncoding \"artifacts\") instead of inline");
+export type TableArtifact = z.infer<typeof TableArtifactSchema>;
+
 export const DataFrameStructuredSchema = z.object({
   columns: z.array(z.string().nullable()),
   index: z.array(z.string().nullable()),
   data_rows: z.array(DataRowSchema),
+  data_columns: z.array(DataColumnSchema).nullable().optional(),
+  artifact: TableArtifactSchema.nullable().optional(),
+}).transform((dataFrame) => {
+  // Columnar responses (responseEncoding "columnar") are expanded back to data_rows for the tables.
+  if (!dataFrame.data_columns?.length) return dataFrame;
+  const columns = dataFrame.data_columns.map(columnValues);
+  const data_rows = dataFrame.index.map((_, rowIndex) => ({ values: columns.map((values) => values[rowIndex] ?? null) }));
+  return { ...dataFrame, data_rows };
 });
 export type DataFrameStructured = z.infer<typeof DataFrameStructuredSchema>;
 
@@ -16,6 +44,7 @@ export const SeriesStructuredSchema = z.object({
   name: z.string().nullable().optional(),
   index: z.array(z.string().nullable()),
   data: z.array(z.string().nullable()).describe("Array of strings (or nulls)"),
+  artifact: TableArtifactSchema.nullable().optional(),
 });
 export type SeriesStructured = z.infer<typeof SeriesStructuredSchema>;
 
@@ -24,6 +53,7 @@ export const PairwiseRunContingencyEntrySchema = z.object({
   run_1_name: z.string().nullable(),
   run_2_name: z.string().nullable(),
   contingency_matrix: DataFrameStructuredSchema.nullable().optional(),
+  contingency_triples: DataFrameStructuredSchema.nullable().optional(),
 });
 export type PairwiseRunContingencyEntry = z.infer<typeof PairwiseRunContingencyEntrySchema>;
 
@@ -32,6 +62,7 @@ export const DataOverviewSchema = z.object({
   annotations_long_format: DataFrameStructuredSchema.nullable().optional(),
   inter_coder_contingency_matrix: DataFrameStructuredSchema.nullable().optional(),
   majority_decision_annotations: SeriesStructuredSchema.nullable().optional(),
+  majority_decision_confidence: DataFrameStructuredSchema.nullable().optional(),
   gold_standard_labels: DataFrameStructuredSchema.nullable().optional(),
   combined_comparison_table: DataFrameStructuredSchema.nullable().optional(),
   pairwise_run_contingency_matrices: z.array(PairwiseRunContingencyEntrySchema).nullable().optional(),
@@ -69,6 +100,9 @@ export const SingleModelEvaluationResultSchema = z.object({
   per_class_metrics: z.array(PerClassPerformanceEntrySchema),
   confusion_matrix: DataFrameStructuredSchema.nullable(),
   log_messages: z.array(z.string().nullable()),
+  per_class_metrics_table: DataFrameStructuredSchema.nullable().optional(),
+  confusion_triples: DataFrameStructuredSchema.nullable().optional(),
+  top_confusions: DataFrameStructuredSchema.nullable().optional(),
 });
 export type SingleModelEvaluationResult = z.infer<typeof SingleModelEvaluationResultSchema>;
 
@@ -78,19 +112,57 @@ export const AnnotationRunEvaluationResultSchema = z.object({
   per_class_metrics: z.array(PerClassPerformanceEntrySchema),
   confusion_matrix: DataFrameStructuredSchema.nullable(),
   log_messages: z.array(z.string().nullable()),
+  per_class_metrics_table: DataFrameStructuredSchema.nullable().optional(),
+  confusion_triples: DataFrameStructuredSchema.nullable().optional(),
+  top_confusions: DataFrameStructuredSchema.nullable().optional(),
 });
 export type AnnotationRunEvaluationResult = z.infer<typeof AnnotationRunEvaluationResultSchema>;
 
 export const ModelEvaluationsSchema = z.object({
   majority_decision_vs_gold_standard: SingleModelEvaluationResultSchema.nullable().optional(),
   annotation_runs_vs_gold_standard: z.array(AnnotationRunEvaluationResultSchema).nullable().optional(),
+  annotation_runs_vs_consensus: z.array(AnnotationRunEvaluationResultSchema).nullable().optional(),
 });
 export type ModelEvaluations = z.infer<typeof ModelEvaluationsSchema>;
 
+export const TemporalAnalysisSchema = z.object({
+  agreement_over_time: DataFrameStructuredSchema.nullable().optional(),
+});
+export type TemporalAnalysis = z.infer<typeof TemporalAnalysisSchema>;
+
+export const ProfileSpanSchema = z.object({
+  name: z.string(),
+  depth: z.number(),
+  output: z.string().nullable().optional(),
+  wall_s: z.number().nullable().optional(),
+  cpu_s: z.number().nullable().optional(),
+  rss_peak_delta_kb: z.number().nullable().optional(),
+  tracemalloc_peak_kb: z.number().nullable().optional(),
+});
+export type ProfileSpan = z.infer<typeof ProfileSpanSchema>;
+
+export const ProfileDimensionsSchema = z.object({
+  files: z.number().nullable().optional(),
+  runs: z.number().nullable().optional(),
+  run_columns: z.number().nullable().optional(),
+  labels: z.number().nullable().optional(),
+  annotations: z.number().nullable().optional(),
+  results: z.number().nullable().optional(),
+  code_storage: z.string().nullable().optional(),
+});
+
+export const AnalyticsProfileSchema = z.object({
+  spans: z.array(ProfileSpanSchema).nullable().optional(),
+  dimensions: ProfileDimensionsSchema.nullable().optional(),
+});
+export type AnalyticsProfile = z.infer<typeof AnalyticsProfileSchema>;
+
 export const LambdaAnalyticsOutputSchema = z.object({
   data_overview: DataOverviewSchema.nullable().optional(),
   inter_rater_reliability: InterRaterReliabilitySchema.nullable().optional(),
   model_evaluations: ModelEvaluationsSchema.nullable().optional(),
+  temporal: TemporalAnalysisSchema.nullable().optional(),
+  profile: AnalyticsProfileSchema.nullable().optional(),
   logs: z.array(z.string().nullable()),
 });
 export type LambdaAnalyticsOutput = z.infer<typeof LambdaAnalyticsOutputSchema>;